@@ -8,7 +8,6 @@ from django.contrib.auth.models import AbstractUser, UserManager
 from django.conf import settings
 from django.core.files import File
 from io import BytesIO
-from PIL import Image
 from django.contrib.auth.validators import ASCIIUsernameValidator
 
 # QuerySet for Bursary
@@ -50,17 +49,7 @@ class Bursary(models.Model):
         except:
             return settings.MEDIA_URL + "default.png"
     
-    # Picture save
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        try:
-            img = Image.open(self.picture.path)
-            if img.height > 300 or img.width > 300:
-                output_size = (300, 300)
-                img.thumbnail(output_size)
-                img.save(self.picture.path)
-        except:
-            pass
+    # Resized copies are generated after save by main_app.imaging
     
     # Picture delete
     def delete(self, *args, **kwargs):
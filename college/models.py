@@ -1,6 +1,5 @@
 from django.db import models
 from django.conf import settings
-from PIL import Image
 from django.db.models import Q
 
 # QuerySet for CollegeAndUniversities
@@ -41,17 +40,7 @@ class CollegeAndUniversities(models.Model):
         except:
             return settings.MEDIA_URL + "default.png"
     
-    # Picture save
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        try:
-            img = Image.open(self.picture.path)
-            if img.height > 300 or img.width > 300:
-                output_size = (300, 300)
-                img.thumbnail(output_size)
-                img.save(self.picture.path)
-        except:
-            pass
+    # Resized copies are generated after save by main_app.imaging
     
     # Picture delete
     def delete(self, *args, **kwargs):
@@ -15,9 +15,9 @@ from django.contrib.auth.models import BaseUserManager
 from django.conf import settings
 from django.core.files import File
 from io import BytesIO
-from PIL import Image, ImageDraw
 from django.core.validators import MaxValueValidator
 from main_app.models import *
+from main_app.storage_backends import content_addressed_storage
 from django.contrib.auth.hashers import make_password
 from django.dispatch import receiver
 from django.db.models.signals import post_save
@@ -28,6 +28,7 @@ class Upload(models.Model):
     school = models.ForeignKey(School, on_delete=models.CASCADE)
     file = models.FileField(
         upload_to="stream_files/",
+        storage=content_addressed_storage,
         help_text="Valid Files: pdf, docx, doc, xls, xlsx, ppt, pptx, zip, rar, 7zip",
         validators=[
             FileExtensionValidator(
@@ -0,0 +1,25 @@
+# Gunicorn settings, loaded automatically from the project root.
+# SERVER_MODE=asgi (default) serves school.asgi on uvicorn workers so async
+# views can wait on the network without blocking a worker; SERVER_MODE=wsgi
+# keeps the classic sync workers.
+import os
+
+server_mode = os.environ.get('SERVER_MODE', 'asgi')
+
+if server_mode == 'asgi':
+    wsgi_app = 'school.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'school.wsgi:application'
+    worker_class = 'sync'
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = 5
+
+
+def worker_exit(server, worker):
+    # Buffered question paper download counts would be lost with the worker
+    from questpaper.downloads import flush_at_exit
+    flush_at_exit()
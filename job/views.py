@@ -3,8 +3,6 @@ from job.models import *
 from django.contrib.auth.decorators import login_required
 # Create your views here.
 from main_app.forms import *
-import pandas as pd
-import numpy as np
 from django.contrib import messages
 import os
 
@@ -255,6 +253,10 @@ def job_detail(request, job_id):
 
 # upload jobs with ecvell
 def upload_jobs_from_excel(request):
+    # pandas is slow to import, so only the upload path loads it
+    import numpy as np
+    import pandas as pd
+
     if request.method == 'POST':
         form = UploadExcelForm(request.POST, request.FILES)
         if form.is_valid():
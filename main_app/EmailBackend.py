@@ -1,15 +1,104 @@
-from django.contrib.auth.backends import ModelBackend
+"""
+Email login for CustomUser.
+
+Emails are matched case-insensitively through the lower(email) index, so a
+login is one index lookup. Unknown emails and throttled attempts still run
+the password hasher once, so response time does not reveal which emails
+have accounts.
+
+Failed attempts are counted in the cache per email and per IP address
+(LOGIN_FAILURE_LIMITS). Past the limit, logins for that email or address
+are refused until the window passes. A successful login clears the count for
+its email.
+
+get_user, which runs on every authenticated request, keeps the user in the
+cache for AUTH_USER_CACHE_SECONDS. Any save of the user drops the entry; the
+role profile is cached separately by main_app.profiles. Both the counters and
+the user cache rely on the shared CACHES backend, so a password change or a
+deactivation on one worker is seen by all of them and the limits are not
+multiplied by the worker count.
+"""
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db.models.functions import Lower
+from django.db.models.signals import post_delete, post_save
+
+USER_KEY = 'auth:user:{}'
+
+
+#throttling
+def _failure_keys(request, email):
+    from .ai_gateway import client_ip
+
+    limits = getattr(settings, 'LOGIN_FAILURE_LIMITS', {})
+    idents = {'email': (email or '').strip().lower(), 'ip': client_ip(request) if request is not None else None}
+    return [(f'login:fail:{scope}:{ident}', limits[scope]) for scope, ident in idents.items()
+            if ident and scope in limits]
+
+
+def throttled(request, email):
+    """Seconds until this email and address may try again, 0 if they may try now."""
+    for key, (limit, window) in _failure_keys(request, email):
+        if (cache.get(key) or 0) >= limit:
+            return window
+    return 0
+
+
+def record_failure(request, email):
+    for key, (limit, window) in _failure_keys(request, email):
+        if not cache.add(key, 1, window):
+            try:
+                cache.incr(key)
+            except ValueError:  # expired in between
+                cache.set(key, 1, window)
+
+
+def clear_failures(email):
+    cache.delete(f'login:fail:email:{(email or "").strip().lower()}')
 
 
 class EmailBackend(ModelBackend):
-    def authenticate(self, username=None, password=None, **kwargs):
+    def authenticate(self, request, username=None, password=None, **kwargs):
         UserModel = get_user_model()
-        try:
-            user = UserModel.objects.get(email=username)
-        except UserModel.DoesNotExist:
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if not username or password is None:
             return None
-        else:
-            if user.check_password(password):
-                return user
+        email = username.strip()
+
+        user = None
+        if not throttled(request, email):
+            candidates = list(UserModel._default_manager.alias(email_lower=Lower('email'))
+                              .filter(email_lower=email.lower())[:2])
+            # Accounts that differ only in case: the exact match wins
+            user = next((c for c in candidates if c.email == email), candidates[0] if candidates else None)
+
+        if user is None:
+            # Same hashing cost as a real check, so timing does not show whether the email exists
+            UserModel().set_password(password)
+        elif user.check_password(password) and self.user_can_authenticate(user):
+            clear_failures(email)
+            return user
+        record_failure(request, email)
         return None
+
+    def get_user(self, user_id):
+        key = USER_KEY.format(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, getattr(settings, 'AUTH_USER_CACHE_SECONDS', 60))
+        return user
+
+
+def forget_user(sender, instance, **kwargs):
+    cache.delete(USER_KEY.format(instance.pk))
+
+
+def connect_signals():
+    UserModel = get_user_model()
+    post_save.connect(forget_user, sender=UserModel, dispatch_uid='auth_forget_user')
+    post_delete.connect(forget_user, sender=UserModel, dispatch_uid='auth_forget_user_delete')
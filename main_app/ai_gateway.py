@@ -0,0 +1,209 @@
+"""
+Answer cache and logging for the DeepSeek assistant.
+
+The assistant streams its answers (main_app.ai_stream), which is the only
+path upstream; it waits for its turn in ai_limits first. Answers are cached
+by a normalised form of the question (case, punctuation and filler words
+removed), first in a per-process LRU and then in AIChatLog, so the same
+career or bursary question is only sent upstream once per AI_CACHE_SECONDS.
+Identical questions that arrive while the first one is still streaming wait
+for its answer instead of asking again (single flight).
+
+The college and bursary snippets used in prompts are cached and dropped when
+a Bursary or CollegeAndUniversities row changes; the snippet version is part
+of the cache key so answers built on an old list are not served.
+
+Point DEEPSEEK_API_URL at `manage.py mock_ai_server` to work offline.
+"""
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+UNAVAILABLE = "I'm currently unable to process your request. Please try again later."
+
+# Words that do not change what is being asked
+FILLER_WORDS = {
+    'a', 'an', 'the', 'please', 'pls', 'hi', 'hello', 'hey', 'can', 'could', 'would', 'you',
+    'me', 'tell', 'kindly', 'i', 'want', 'to', 'know', 'about', 'thanks', 'thank',
+}
+_PUNCTUATION_RE = re.compile(r'[^\w\s]')
+
+# Question types whose answers do not depend on who asks
+CACHEABLE_TYPES = {'career', 'prospector', 'bursary', 'school', 'general'}
+
+
+def timeouts():
+    return (getattr(settings, 'AI_CONNECT_TIMEOUT', 5), getattr(settings, 'DEEPSEEK_TIMEOUT', 60))
+
+
+#cache keys
+def normalize_question(question):
+    text = unicodedata.normalize('NFKC', question or '').lower()
+    text = _PUNCTUATION_RE.sub(' ', text)
+    return ' '.join(word for word in text.split() if word not in FILLER_WORDS)
+
+
+def prompt_key(question_type, question, model='deepseek-chat', context_version=''):
+    raw = '\x1f'.join([question_type, model, context_version, normalize_question(question)])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class LRUCache:
+    """Small thread-safe LRU with a per-entry time to live."""
+
+    def __init__(self, size=512, ttl=3600):
+        self.size = size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            stored_at, value = item
+            if time.monotonic() - stored_at > self.ttl:
+                del self.items[key]
+                return None
+            self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = (time.monotonic(), value)
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+answers = LRUCache(getattr(settings, 'AI_CACHE_SIZE', 512), getattr(settings, 'AI_CACHE_SECONDS', 24 * 3600))
+
+
+#single flight
+class Flights:
+    """
+    The answer being streamed for each prompt key. Streams run on the server's
+    event loop, so no lock is needed between looking a key up and claiming it.
+    """
+
+    def __init__(self):
+        self.calls = {}
+
+    def join(self, key):
+        """A future for the answer already in flight, or None when the caller should fetch it."""
+        future = self.calls.get(key)
+        if future is None:
+            self.calls[key] = asyncio.get_running_loop().create_future()
+        return future
+
+    def land(self, key, answer):
+        """Hand the leader's answer to its waiters; None sends them to ask for themselves."""
+        future = self.calls.pop(key, None)
+        if future is not None:
+            future.set_result(answer)
+
+
+flights = Flights()
+
+
+#context snippets
+SNIPPET_KEY = 'ai:snippet:{}'
+
+
+def context_snippet(kind):
+    """Short list of college or bursary names for prompts, cached until one changes."""
+    key = SNIPPET_KEY.format(kind)
+    snippet = cache.get(key)
+    if snippet is None:
+        if kind == 'prospector':
+            names = apps.get_model('college', 'CollegeAndUniversities').objects.values_list('title', flat=True)
+            snippet = ', '.join(name for name in names if name)[:500]
+        elif kind == 'bursary':
+            names = apps.get_model('bursary', 'Bursary').objects.order_by('-updated_date').values_list(
+                'title', flat=True)
+            snippet = ', '.join(name for name in names if name)[:300]
+        else:
+            snippet = ''
+        cache.set(key, snippet, getattr(settings, 'AI_SNIPPET_SECONDS', 3600))
+    return snippet
+
+
+def snippet_version(kind):
+    snippet = context_snippet(kind)
+    return hashlib.sha1(snippet.encode()).hexdigest()[:12] if snippet else ''
+
+
+def drop_snippets(sender, **kwargs):
+    kind = 'bursary' if sender._meta.label == 'bursary.Bursary' else 'prospector'
+    cache.delete(SNIPPET_KEY.format(kind))
+
+
+def connect_signals():
+    for label in ('bursary.Bursary', 'college.CollegeAndUniversities'):
+        model = apps.get_model(label)
+        post_save.connect(drop_snippets, sender=model, dispatch_uid=f'ai_snippet_save:{label}')
+        post_delete.connect(drop_snippets, sender=model, dispatch_uid=f'ai_snippet_delete:{label}')
+
+
+#gateway
+def stored_answer(key):
+    """A recent successful answer to the same normalised question from AIChatLog."""
+    since = timezone.now() - timedelta(seconds=answers.ttl)
+    AIChatLog = apps.get_model('main_app', 'AIChatLog')
+    return (AIChatLog.objects.filter(prompt_key=key, created_at__gte=since, cached=False)
+            .exclude(response=UNAVAILABLE).order_by('-created_at')
+            .values_list('response', flat=True).first())
+
+
+def lookup(question, question_type='general', model='deepseek-chat'):
+    """(cache key, cached answer or None) for a learner question."""
+    key = prompt_key(question_type, question, model, snippet_version(question_type))
+    if question_type not in CACHEABLE_TYPES:
+        return key, None
+    answer = answers.get(key)
+    if answer is None:
+        answer = stored_answer(key)
+        if answer is not None:
+            answers.set(key, answer)
+    return key, answer
+
+
+def log_exchange(key, question, question_type, answer, cached, user=None, ip_address=None,
+                 prompt_tokens=0, completion_tokens=0):
+    from .ai_limits import school_for
+
+    if not cached and answer != UNAVAILABLE and question_type in CACHEABLE_TYPES:
+        answers.set(key, answer)
+    return apps.get_model('main_app', 'AIChatLog').objects.create(
+        user=user if user is not None and user.is_authenticated else None,
+        school_id=school_for(user), ip_address=ip_address or '0.0.0.0', question_type=question_type,
+        question=question, response=answer, prompt_key=key, cached=cached,
+        prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+    )
+
+
+def client_ip(request):
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if forwarded:
+        return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
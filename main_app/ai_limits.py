@@ -0,0 +1,269 @@
+"""
+Rate limits, token budgets and fair queueing for AI assistant calls.
+
+Before a question goes upstream, `admit` does three things:
+
+1. Reserves an estimate of its prompt and response tokens against the
+   tenant's daily budget (AI_DAILY_TOKEN_BUDGET). A tenant is the user's
+   school, or the IP address for anonymous users. Once the budget is spent,
+   questions are refused until the next day.
+2. Debits one request from token buckets keyed by user, IP and school
+   (AI_RATE_LIMITS). Buckets live in the shared cache (CACHES), so all
+   workers share them, and each request checks and debits its buckets under
+   one lock. A request over the limit is delayed until its bucket refills
+   rather than rejected. It is refused only if that would take longer than
+   AI_QUEUE_TIMEOUT.
+3. Waits for one of AI_MAX_CONCURRENT upstream slots. Slots are handed out
+   round-robin across tenants, so one busy school lab cannot starve the rest.
+
+`release` then `settle` frees the slot and corrects the
+reservation to the real token count. Cached answers never reach `admit`.
+"""
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Sum
+from django.utils import timezone
+
+# Profiles that belong to a school
+SCHOOL_PROFILES = ('student', 'educator', 'principal', 'parent', 'member')
+
+
+class RateLimited(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class BudgetExceeded(RateLimited):
+    pass
+
+
+def estimate_tokens(text):
+    """Rough token count, about four characters per token for English text."""
+    return max(1, math.ceil(len(text or '') / 4))
+
+
+#tenants
+def school_for(user):
+    """The school id of a user's profile, cached for an hour."""
+    if user is None or not user.is_authenticated:
+        return None
+    key = f'ai:school:{user.pk}'
+    school_id = cache.get(key)
+    if school_id is None:
+        # School accounts log in as the school itself
+        school_id = apps.get_model('main_app', 'School').objects.filter(user_id=user.pk).values_list(
+            'pk', flat=True).first() or 0
+        for name in SCHOOL_PROFILES if not school_id else ():
+            model = apps.get_model('main_app', name)
+            found = model.objects.filter(admin_id=user.pk).values_list('school_id', flat=True).first()
+            if found:
+                school_id = found
+                break
+        cache.set(key, school_id, 3600)
+    return school_id or None
+
+
+def tenant_for(user, ip_address, school_id):
+    if school_id:
+        return f'school:{school_id}'
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    return f'ip:{ip_address}'
+
+
+@contextmanager
+def _cache_lock(keys, wait=0.5, ttl=2):
+    """
+    Mutual exclusion across workers on every key in `keys`, using cache.add.
+    Keys are locked in sorted order so two callers cannot deadlock. Raises
+    RateLimited when a lock is not free within `wait` seconds; a lock is
+    only deleted by the caller that holds it.
+    """
+    token = uuid.uuid4().hex
+    held = []
+    try:
+        for key in sorted(keys):
+            lock = f'{key}:lock'
+            deadline = time.monotonic() + wait
+            while not cache.add(lock, token, ttl):
+                if time.monotonic() >= deadline:
+                    raise RateLimited('The assistant is busy, please try again shortly.', 1)
+                time.sleep(0.005)
+            held.append(lock)
+        yield
+    finally:
+        for lock in held:
+            if cache.get(lock) == token:
+                cache.delete(lock)
+
+
+#token buckets
+def _bucket_wait(key, capacity, per_minute, now, commit):
+    """
+    Seconds to wait before the bucket has a token, kept as a theoretical
+    arrival time (GCRA), so one cache value per bucket is enough.
+    """
+    interval = 60.0 / per_minute
+    burst = interval * (capacity - 1)
+    tat = max(cache.get(key) or now, now)
+    wait = max(0.0, tat - burst - now)
+    if commit:
+        cache.set(key, tat + interval, int(tat + interval - now) + 1)
+    return wait
+
+
+def take(buckets, max_wait):
+    """Debit every bucket, or none of them; return the seconds the caller must wait."""
+    limits = getattr(settings, 'AI_RATE_LIMITS', {})
+    buckets = [(f'ai:bucket:{scope}:{ident}', limits[scope]) for scope, ident in buckets
+               if ident and scope in limits]
+    # Checked and debited under one lock, or concurrent callers would all see wait=0
+    with _cache_lock([key for key, _ in buckets]):
+        now = time.time()
+        wait = max([_bucket_wait(key, limit['capacity'], limit['per_minute'], now, False)
+                    for key, limit in buckets] or [0.0])
+        if wait > max_wait:
+            raise RateLimited('Too many questions, please wait a moment.', math.ceil(wait))
+        for key, limit in buckets:
+            _bucket_wait(key, limit['capacity'], limit['per_minute'], now, True)
+    return wait
+
+
+#daily budgets
+def _budget_key(tenant):
+    return f'ai:budget:{tenant}:{timezone.localdate().isoformat()}'
+
+
+def tokens_used_today(tenant):
+    """Tokens a tenant has used today, rebuilt from AIChatLog when the cache is cold."""
+    key = _budget_key(tenant)
+    used = cache.get(key)
+    if used is None:
+        AIChatLog = apps.get_model('main_app', 'AIChatLog')
+        logs = AIChatLog.objects.filter(created_at__date=timezone.localdate(), cached=False)
+        kind, _, ident = tenant.partition(':')
+        if kind == 'school':
+            logs = logs.filter(school_id=ident)
+        elif kind == 'user':
+            logs = logs.filter(user_id=ident)
+        else:
+            logs = logs.filter(ip_address=ident, user__isnull=True)
+        used = logs.aggregate(total=Sum(F('prompt_tokens') + F('completion_tokens')))['total'] or 0
+        cache.add(key, used, 24 * 3600)
+    return used
+
+
+def _debit(tenant, tokens):
+    key = _budget_key(tenant)
+    tokens_used_today(tenant)
+    try:
+        return cache.incr(key, tokens)
+    except ValueError:  # expired in between
+        cache.set(key, max(tokens, 0), 24 * 3600)
+        return tokens
+
+
+#fair scheduler
+class FairScheduler:
+    """
+    Limits concurrent upstream calls in this process. Waiters are grouped by
+    tenant and served round-robin, one per tenant in turn, so a burst from
+    one school queues behind itself instead of in front of everyone else.
+    """
+
+    def __init__(self, slots):
+        self.slots = slots
+        self.active = 0
+        self.lock = threading.Lock()
+        self.queues = OrderedDict()
+
+    def acquire(self, tenant, timeout):
+        with self.lock:
+            if self.active < self.slots and not self.queues:
+                self.active += 1
+                return True
+            event = threading.Event()
+            self.queues.setdefault(tenant, deque()).append(event)
+        if event.wait(timeout):
+            return True
+        with self.lock:
+            if event.is_set():  # granted while we were giving up
+                return True
+            queue = self.queues.get(tenant)
+            if queue is not None:
+                queue.remove(event)
+                if not queue:
+                    del self.queues[tenant]
+        return False
+
+    def release(self):
+        with self.lock:
+            self.active -= 1
+            if self.queues and self.active < self.slots:
+                tenant, queue = self.queues.popitem(last=False)
+                event = queue.popleft()
+                if queue:
+                    self.queues[tenant] = queue  # back of the line
+                self.active += 1
+                event.set()
+
+    def waiting(self):
+        with self.lock:
+            return {tenant: len(queue) for tenant, queue in self.queues.items()}
+
+
+scheduler = FairScheduler(getattr(settings, 'AI_MAX_CONCURRENT', 4))
+
+
+class Ticket:
+    def __init__(self, tenant, school_id, reserved):
+        self.tenant = tenant
+        self.school_id = school_id
+        self.reserved = reserved
+        self.finished = False
+
+
+def admit(user, ip_address, prompt, max_tokens):
+    """Wait for the caller's turn; raises RateLimited or BudgetExceeded."""
+    school_id = school_for(user)
+    tenant = tenant_for(user, ip_address, school_id)
+    anonymous = user is None or not user.is_authenticated
+    budget = getattr(settings, 'AI_ANON_DAILY_TOKEN_BUDGET' if anonymous else 'AI_DAILY_TOKEN_BUDGET', 0)
+    reserved = estimate_tokens(prompt) + max_tokens
+    if budget and tokens_used_today(tenant) + reserved > budget:
+        raise BudgetExceeded("Today's AI assistant allowance has been used up. Please try again tomorrow.",
+                             3600)
+
+    max_wait = getattr(settings, 'AI_QUEUE_TIMEOUT', 30)
+    started = time.monotonic()
+    user_id = user.pk if not anonymous else None
+    wait = take([('user', user_id), ('ip', ip_address), ('school', school_id)], max_wait)
+    if wait:
+        time.sleep(wait)
+
+    _debit(tenant, reserved)
+    if not scheduler.acquire(tenant, max(max_wait - (time.monotonic() - started), 1)):
+        _debit(tenant, -reserved)
+        raise RateLimited('The assistant is busy, please try again shortly.', 5)
+    return Ticket(tenant, school_id, reserved)
+
+
+def release(ticket):
+    """Give the upstream slot back; cheap and safe to call from async code."""
+    if not ticket.finished:
+        ticket.finished = True
+        scheduler.release()
+
+
+def settle(ticket, used_tokens):
+    """Replace the budget reservation with the tokens really used."""
+    _debit(ticket.tenant, used_tokens - ticket.reserved)
@@ -0,0 +1,146 @@
+"""
+Streaming answers for the AI assistant.
+
+`stream_answer` is an async generator of Server-Sent Events that the
+ai_assistant_stream view hands to a StreamingHttpResponse. Tokens are
+forwarded as the model produces them. The full text is logged to AIChatLog
+(and the gateway cache) only once the stream completes; the same question
+asked meanwhile waits for it and gets the whole answer at once. If the
+browser goes away Django cancels the generator, which closes the upstream
+stream so the model stops generating.
+
+Streaming needs the ASGI server; under WSGI Django collects an async
+iterator in full before sending it. AI_STREAM_BACKEND = "fake" streams a
+canned answer without any network, for tests and offline work.
+"""
+import asyncio
+import json
+import logging
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import ai_gateway, ai_limits
+from .http_client import async_client
+
+logger = logging.getLogger(__name__)
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def deepseek_tokens(prompt, model, max_tokens):
+    payload = {
+        'model': model,
+        'messages': [{'role': 'user', 'content': prompt}],
+        'max_tokens': max_tokens,
+        'temperature': 0.7,
+        'stream': True,
+    }
+    headers = {'Authorization': f'Bearer {settings.DEEPSEEK_API_KEY}'}
+    connect, read = ai_gateway.timeouts()
+    async with async_client().stream('POST', settings.DEEPSEEK_API_URL, json=payload, headers=headers,
+                                     timeout=httpx.Timeout(read, connect=connect)) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith('data:'):
+                continue
+            data = line[5:].strip()
+            if data == '[DONE]':
+                break
+            try:
+                chunk = json.loads(data)
+            except ValueError:
+                continue
+            text = ((chunk.get('choices') or [{}])[0].get('delta') or {}).get('content')
+            if text:
+                yield text
+
+
+async def fake_tokens(prompt, model, max_tokens):
+    """Offline backend: a canned answer, one word at a time."""
+    question = ' '.join(prompt.split()[-30:])
+    for word in f"This is a sample answer to: {question}".split()[:max_tokens]:
+        await asyncio.sleep(getattr(settings, 'AI_FAKE_TOKEN_DELAY', 0.02))
+        yield word + ' '
+
+
+BACKENDS = {
+    'deepseek': deepseek_tokens,
+    'fake': fake_tokens,
+}
+
+
+def _prepare(question, question_type, model):
+    from utils.deepseek_edu import get_education_context
+
+    key, answer = ai_gateway.lookup(question, question_type, model)
+    prompt = None if answer is not None else get_education_context(question_type, question)
+    return key, answer, prompt
+
+
+async def stream_answer(question, question_type='general', user=None, ip_address=None, model='deepseek-chat'):
+    key, answer, prompt = await sync_to_async(_prepare)(question, question_type, model)
+    log = sync_to_async(ai_gateway.log_exchange)
+    yield ': stream open\n\n'  # gets the headers out before the model answers
+
+    # Only answers that do not depend on who asks are shared
+    leading = question_type not in ai_gateway.CACHEABLE_TYPES
+    while answer is None and not leading:
+        flight = ai_gateway.flights.join(key)
+        if flight is None:
+            leading = True
+        else:
+            # Shielded, so a waiter that goes away does not cancel the answer for the others
+            answer = await asyncio.shield(flight)
+
+    if answer == ai_gateway.UNAVAILABLE:
+        yield sse('error', {'message': answer})
+        return
+    if answer is not None:
+        yield sse('token', {'text': answer})
+        await log(key, question, question_type, answer, True, user, ip_address)
+        yield sse('done', {'cached': True})
+        return
+
+    shared = None  # handed to waiting streams; None sends them to ask for themselves
+    try:
+        max_tokens = getattr(settings, 'AI_STREAM_MAX_TOKENS', 2048)
+        try:
+            # Waiting for a turn blocks, so it runs on its own thread
+            ticket = await sync_to_async(ai_limits.admit, thread_sensitive=False)(user, ip_address, prompt,
+                                                                                  max_tokens)
+        except ai_limits.RateLimited as e:
+            yield sse('error', {'message': str(e), 'retry_after': e.retry_after})
+            return
+
+        backend = BACKENDS[getattr(settings, 'AI_STREAM_BACKEND', 'deepseek')]
+        tokens = backend(prompt, model, max_tokens)
+        parts = []
+        try:
+            async for text in tokens:
+                parts.append(text)
+                yield sse('token', {'text': text})
+        except asyncio.CancelledError:
+            logger.info('AI stream cancelled by the client after %d chunks', len(parts))
+            raise
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            logger.warning('DeepSeek stream error: %s', e)
+            # Waiters get the error too, but it is not cached, so the next question tries again
+            shared = ai_gateway.UNAVAILABLE
+            yield sse('error', {'message': ai_gateway.UNAVAILABLE})
+            return
+        finally:
+            ai_limits.release(ticket)
+            # Closes the upstream response if we stopped early
+            await tokens.aclose()
+            used = (ai_limits.estimate_tokens(prompt), ai_limits.estimate_tokens(''.join(parts)))
+            await sync_to_async(ai_limits.settle)(ticket, sum(used))
+
+        await log(key, question, question_type, ''.join(parts), False, user, ip_address, *used)
+        shared = ''.join(parts)
+        yield sse('done', {'cached': False})
+    finally:
+        ai_gateway.flights.land(key, shared)
@@ -0,0 +1,206 @@
+"""
+Circuit analytics cube.
+
+AnalyticsCell holds pre-aggregated sums and counts per measure and per
+(circuit, school, session, subject, grade). There are four measures:
+
+* results: assignment + test + exam per StudentResult
+* attendance: present reports out of all reports, live and archived
+* quizzes: completed Sitting scores (quizzes have no subject)
+* performance: SchoolPerformance running totals
+
+`refresh` folds in source rows changed since the measure's last refresh.
+It finds the (school, session) partitions those rows belong to. Each
+partition's cells are then deleted and re-aggregated with one grouped query
+per source, so edits are counted exactly and never twice. The refresh_analytics
+command runs it on a schedule; --full rebuilds a measure from scratch, which
+also drops rows deleted at the source.
+
+`query` slices (filters on one value), dices (filters on several values)
+and rolls up (sums over the dimensions not grouped by) the cells. The table
+holds one row per school, session, subject and grade, not one per learner,
+so these are small indexed GROUP BYs. Answers are also cached until the
+next refresh. A row that moves to another school or session leaves its
+old partition stale until a --full rebuild.
+
+Terms are not a dimension: results, attendance and quiz sittings do not
+record their term, and Term has no dates to derive it from.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from quiz.models import Sitting
+
+from .models import (AnalyticsCell, AnalyticsRefresh, ArchivedAttendanceReport, AttendanceReport, Circuit,
+                     Grade, School, SchoolPerformance, Session, StudentResult, Subject)
+
+DIMENSIONS = ('circuit', 'school', 'session', 'subject', 'grade')
+
+
+class Source:
+    def __init__(self, model, paths, total, count, changed, where=None):
+        self.model = model
+        # paths: {dimension: ORM path}; a dimension left out is always null for this source
+        self.paths = paths
+        self.total = total
+        self.count = count
+        self.changed = changed
+        self.where = where or Q()
+
+    def rows(self):
+        return self.model.objects.filter(self.where)
+
+    def partitions(self, since):
+        """The (school, session) pairs of rows changed after `since`."""
+        changed = self.rows().filter(**{f'{self.changed}__gt': since})
+        return set(changed.values_list(self.paths['school'], self.paths['session']).distinct())
+
+    def aggregate(self, rows):
+        """{(circuit, school, session, subject, grade): (total, count)} over `rows`."""
+        paths = [self.paths.get(name) for name in DIMENSIONS]
+        grouped = rows.values(*[path for path in paths if path]).annotate(_total=self.total, _count=self.count)
+        cells = {}
+        for row in grouped.order_by():
+            key = tuple(row[path] if path else None for path in paths)
+            cells[key] = (row['_total'] or 0, row['_count'] or 0)
+        return cells
+
+
+STUDENT_PATHS = {'circuit': 'student__school__circuit_id', 'school': 'student__school_id',
+                 'grade': 'student__grade_id'}
+
+MEASURES = {
+    'results': [
+        Source(StudentResult, dict(STUDENT_PATHS, session='student__session_id', subject='subject_id'),
+               Sum(F('assignment') + F('test') + F('exam')), Count('id'), 'updated_at'),
+    ],
+    'attendance': [
+        Source(model, dict(STUDENT_PATHS, session='attendance__session_id', subject='attendance__subject_id',
+                           grade='attendance__grade_id'),
+               Count('id', filter=Q(status=True)), Count('id'), 'updated_at')
+        for model in (AttendanceReport, ArchivedAttendanceReport)
+    ],
+    'quizzes': [
+        Source(Sitting, {'circuit': 'user__student__school__circuit_id', 'school': 'user__student__school_id',
+                         'session': 'user__student__session_id', 'grade': 'user__student__grade_id'},
+               Sum('current_score'), Count('id'), 'end', where=Q(complete=True)),
+    ],
+    'performance': [
+        Source(SchoolPerformance, {'circuit': 'school_record__circuit_id', 'school': 'school_record_id',
+                                   'session': 'session_id', 'subject': 'subject_id', 'grade': 'grade_id'},
+               Sum('total_score'), Sum('num_evaluations'), 'updated_at'),
+    ],
+}
+
+
+#building
+def _partition_filter(pairs, school_field, session_field):
+    condition = Q()
+    for school, session in pairs:
+        condition |= Q(**{school_field: school, session_field: session})
+    return condition
+
+
+def _rebuild(measure, pairs=None):
+    """Replace the cells of `measure` in the (school, session) `pairs`, or all of them; returns the cell count."""
+    cells = {}
+    for source in MEASURES[measure]:
+        rows = source.rows()
+        if pairs is not None:
+            rows = rows.filter(_partition_filter(pairs, source.paths['school'], source.paths['session']))
+        for key, (total, count) in source.aggregate(rows).items():
+            before = cells.get(key, (0, 0))
+            cells[key] = (before[0] + total, before[1] + count)
+
+    existing = AnalyticsCell.objects.filter(measure=measure)
+    if pairs is not None:
+        existing = existing.filter(_partition_filter(pairs, 'school_id', 'session_id'))
+    existing.delete()
+    AnalyticsCell.objects.bulk_create([
+        AnalyticsCell(measure=measure, total=total, count=count,
+                      **{f'{name}_id': value for name, value in zip(DIMENSIONS, key)})
+        for key, (total, count) in cells.items()
+    ], batch_size=1000)
+    return len(cells)
+
+
+def refresh(measure, full=False, batch=500):
+    """Bring one measure up to date; returns (partitions rebuilt or None for a full rebuild, cells written)."""
+    started = time.perf_counter()
+    now = timezone.now()
+    mark = AnalyticsRefresh.objects.filter(measure=measure).first()
+    written = 0
+    if full or mark is None:
+        with transaction.atomic():
+            written = _rebuild(measure)
+        partitions = None
+    else:
+        pairs = set()
+        for source in MEASURES[measure]:
+            pairs |= source.partitions(mark.refreshed_through)
+        partitions = sorted(pairs, key=str)
+        for index in range(0, len(partitions), batch):
+            with transaction.atomic():
+                written += _rebuild(measure, partitions[index:index + batch])
+    # Rows changed while this ran have changed after `now`, so the next refresh picks them up
+    AnalyticsRefresh.objects.update_or_create(measure=measure, defaults={
+        'refreshed_through': now, 'duration_ms': int((time.perf_counter() - started) * 1000)})
+    return (None if partitions is None else len(partitions)), written
+
+
+#reading
+LABELS = {
+    'circuit': lambda ids: dict(Circuit.objects.filter(id__in=ids).values_list('id', 'name')),
+    'school': lambda ids: dict(School.objects.filter(id__in=ids).values_list('id', 'name')),
+    'session': lambda ids: {session.id: str(session) for session in Session.objects.filter(id__in=ids)},
+    'subject': lambda ids: dict(Subject.objects.filter(id__in=ids).values_list('id', 'name')),
+    'grade': lambda ids: dict(Grade.objects.filter(id__in=ids).values_list('id', 'name')),
+}
+
+
+def query(measure, by=(), **filters):
+    """
+    Roll the cells of `measure` up to the dimensions in `by`. `filters` maps a
+    dimension to one id (slice) or a list of ids (dice). Rows have each
+    grouped dimension as {'id', 'name'} plus total, count and average (for
+    attendance, the percentage present).
+    """
+    if measure not in MEASURES or any(name not in DIMENSIONS for name in (*by, *filters)):
+        raise ValueError('Unknown measure or dimension')
+    # Keyed by the refresh time, read from the database so that every worker sees a refresh
+    refreshed = AnalyticsRefresh.objects.filter(measure=measure).values_list('refreshed_through', flat=True).first()
+    fingerprint = hashlib.md5(json.dumps([measure, list(by), filters], sort_keys=True).encode()).hexdigest()
+    key = f'analytics:{refreshed.timestamp() if refreshed else 0}:{fingerprint}'
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    cells = AnalyticsCell.objects.filter(measure=measure)
+    for name, value in filters.items():
+        if value is None or value == []:
+            continue
+        cells = cells.filter(**{f'{name}_id__in' if isinstance(value, (list, tuple)) else f'{name}_id': value})
+    fields = [f'{name}_id' for name in by]
+    grouped = list(cells.values(*fields).annotate(total=Sum('total'), count=Sum('count')).order_by(*fields))
+
+    labels = {name: LABELS[name]({row[f'{name}_id'] for row in grouped} - {None}) for name in by}
+    scale = 100 if measure == 'attendance' else 1
+    result = []
+    for row in grouped:
+        entry = {name: {'id': row[f'{name}_id'], 'name': labels[name].get(row[f'{name}_id'], '—')} for name in by}
+        entry.update(total=row['total'], count=row['count'],
+                     average=round(scale * row['total'] / row['count'], 2) if row['count'] else None)
+        result.append(entry)
+    cache.set(key, result, getattr(settings, 'ANALYTICS_CACHE_SECONDS', 3600))
+    return result
+
+
+def last_refreshed():
+    return dict(AnalyticsRefresh.objects.values_list('measure', 'refreshed_through'))
@@ -7,3 +7,17 @@ class MainAppConfig(AppConfig):
 
     def ready(self):
         import main_app.signals
+        from main_app.imaging import connect_signals
+        connect_signals()
+        from main_app import ai_gateway
+        ai_gateway.connect_signals()
+        from main_app import profiles
+        profiles.connect_signals()
+        from main_app import EmailBackend
+        EmailBackend.connect_signals()
+        from main_app import attendance_archive
+        attendance_archive.connect_signals()
+        from main_app import performance
+        performance.connect_signals()
+        from main_app import timetables
+        timetables.connect_signals()
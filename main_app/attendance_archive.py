@@ -0,0 +1,139 @@
+"""
+Session-based archiving of attendance.
+
+Attendance and AttendanceReport hold the sessions still in use.
+`archive_session` moves a finished session's rows into ArchivedAttendance
+and ArchivedAttendanceReport, and `restore_session` moves them back. Both
+copy rows with INSERT ... SELECT in batches and keep ids and timestamps. The
+hot tables, and their indexes, then only grow with the sessions being
+worked on, however many years of history exist.
+
+Native Postgres partitioning was not used because AttendanceReport has its
+own id primary key and is referenced by id. A partitioned table would need
+the session in every key and unique constraint, and the archive tables also
+work on SQLite in development.
+
+Reads: `Attendance.objects.current()` and `AttendanceReport.objects.current()`
+give the current session. The report views use `reports()`, which adds the
+archived rows only when asked (include_archive). Archived rows have the
+same field names, so templates render them unchanged. The paginated data
+tables read one session at a time through `session_reports()`.
+"""
+from itertools import chain
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+
+from .models import (ArchivedAttendance, ArchivedAttendanceReport, Attendance, AttendanceReport,
+                     Session, Term)
+
+CURRENT_SESSION_KEY = 'attendance:current_session'
+
+
+def current_session_id():
+    """The session of the current term, else the latest session; cached until a Term or Session changes."""
+    session_id = cache.get(CURRENT_SESSION_KEY)
+    if session_id is None:
+        session_id = (Term.objects.filter(is_current=True, session__isnull=False)
+                      .values_list('session_id', flat=True).first()
+                      or Session.objects.order_by('-start_year').values_list('id', flat=True).first() or 0)
+        cache.set(CURRENT_SESSION_KEY, session_id, 3600)
+    return session_id or None
+
+
+def forget_current_session(sender, **kwargs):
+    cache.delete(CURRENT_SESSION_KEY)
+
+
+def connect_signals():
+    for model in (Term, Session):
+        post_save.connect(forget_current_session, sender=model, dispatch_uid=f'current_session_save:{model.__name__}')
+        post_delete.connect(forget_current_session, sender=model,
+                            dispatch_uid=f'current_session_delete:{model.__name__}')
+
+
+#reads
+def reports(include_archive=False, **filters):
+    """
+    AttendanceReport rows of the current session matching `filters`. With
+    include_archive, every session, archived ones included (as a list).
+    """
+    if not include_archive:
+        return AttendanceReport.objects.current().filter(**filters)
+    live = AttendanceReport.objects.filter(**filters).select_related('attendance')
+    archived = ArchivedAttendanceReport.objects.filter(**filters).select_related('attendance')
+    return list(chain(live, archived))
+
+
+def session_reports(session_id=None):
+    """AttendanceReport rows of one session (default: the current one), from whichever table holds it."""
+    session_id = session_id or current_session_id()
+    if ArchivedAttendance.objects.filter(session_id=session_id).exists():
+        return ArchivedAttendanceReport.objects.filter(session_id=session_id)
+    return AttendanceReport.objects.filter(session_id=session_id)
+
+
+def requested_session(request):
+    """The ?session= id of a report request, None (the current session) if missing or not a number."""
+    session = request.GET.get('session', '')
+    return int(session) if session.isdigit() else None
+
+
+def wants_archive(request):
+    """The explicit opt-in: ?archive=1 on the query string or in the form."""
+    return (request.GET.get('archive') or request.POST.get('archive')) in ('1', 'true', 'on')
+
+
+#moving rows
+def _columns(model):
+    return ', '.join(connection.ops.quote_name(field.column) for field in model._meta.concrete_fields)
+
+
+def _copy(source, target, key, ids):
+    """INSERT INTO target SELECT the rows of source whose `key` is in ids; returns the row count."""
+    quote = connection.ops.quote_name
+    columns = _columns(source)
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {quote(target._meta.db_table)} ({columns}) '
+                       f'SELECT {columns} FROM {quote(source._meta.db_table)} '
+                       f'WHERE {quote(key)} IN ({", ".join(["%s"] * len(ids))})', ids)
+        return cursor.rowcount
+
+
+def _delete(model, key, ids):
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {quote(model._meta.db_table)} '
+                       f'WHERE {quote(key)} IN ({", ".join(["%s"] * len(ids))})', ids)
+
+
+def _transfer(session_id, days_from, days_to, reports_from, reports_to, batch_size):
+    """Move one session between the live and archive tables, a batch of attendance days at a time."""
+    days = rows = 0
+    while True:
+        ids = list(days_from.objects.filter(session_id=session_id).order_by('pk')
+                   .values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return days, rows
+        # Parents are copied before and deleted after their reports, so every reference stays valid
+        with transaction.atomic():
+            days += _copy(days_from, days_to, 'id', ids)
+            rows += _copy(reports_from, reports_to, 'attendance_id', ids)
+            _delete(reports_from, 'attendance_id', ids)
+            _delete(days_from, 'id', ids)
+
+
+def archive_session(session_id, batch_size=500):
+    """Move a session's attendance to the archive tables; returns (days, report rows) moved."""
+    # Reports saved before the session column existed, or with bulk_create
+    AttendanceReport.objects.filter(session__isnull=True, attendance__session_id=session_id).update(
+        session_id=session_id)
+    return _transfer(session_id, Attendance, ArchivedAttendance, AttendanceReport, ArchivedAttendanceReport,
+                     batch_size)
+
+
+def restore_session(session_id, batch_size=500):
+    """Move an archived session back, e.g. to correct its registers; returns (days, report rows)."""
+    return _transfer(session_id, ArchivedAttendance, Attendance, ArchivedAttendanceReport, AttendanceReport,
+                     batch_size)
@@ -4,17 +4,22 @@ from django.http import HttpResponse, JsonResponse
 from django.shortcuts import (get_object_or_404, redirect, render)
 from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
+from . import analytics, attendance_archive, exports
+from .datatables import ATTENDANCE_TABLE, RESULTS_TABLE
 from .forms import *
 from .models import *
+from .profiles import request_profile
 
 # Circuit Manager Home View
 def circuit_manager_home(request):
-    circuit_manager = get_object_or_404(Circuit_Manager, admin=request.user)
+    circuit_manager = request_profile(request, Circuit_Manager)
     items = NewsAndEvents.objects.all().order_by("-updated_date")
-    total_students = Student.objects.filter(course=circuit_manager.course).count()
+    # Circuit managers have a circuit, not a course
+    total_students = Student.objects.filter(school__circuit_id=circuit_manager.circuit_id).count()
     total_educators = Educator.objects.count()
     total_subjects = Subject.objects.count()
-    total_attendance = AttendanceReport.objects.filter(student__course=circuit_manager.course).count()
+    total_attendance = AttendanceReport.objects.current().filter(
+        student__school__circuit_id=circuit_manager.circuit_id).count()
 
     context = {
         'page_title': 'Circuit Manager Dashboard',
@@ -87,15 +92,22 @@ def delete_post(request, pk):
 
 # Managing Attendance Reports
 def circuit_manager_view_attendance_reports(request):
-    circuit_manager = get_object_or_404(Circuit_Manager, admin=request.user)
-    attendance_reports = AttendanceReport.objects.filter(student__course=circuit_manager.course)
-
+    # The rows come page by page from circuit_manager_attendance_data
     context = {
         'page_title': 'View Attendance Reports',
-        'attendance_reports': attendance_reports,
+        'table': ATTENDANCE_TABLE.describe(reverse('circuit_manager_attendance_data')),
+        'export_url': reverse('circuit_manager_export_data', args=['attendance']),
+        'sessions': Session.objects.order_by('-start_year'),
     }
     return render(request, 'circuit_manager_template/view_attendance_reports.html', context)
 
+def circuit_manager_attendance_data(request):
+    circuit_manager = request_profile(request, Circuit_Manager)
+    if circuit_manager.circuit_id is None:
+        return HttpResponse("Not allowed", status=403)
+    reports = attendance_archive.session_reports(attendance_archive.requested_session(request))
+    return ATTENDANCE_TABLE.page(reports.filter(student__school__circuit_id=circuit_manager.circuit_id), request.GET)
+
 def circuit_manager_add_attendance_report(request):
     if request.method == 'POST':
         student_id = request.POST.get('student_id')
@@ -383,7 +395,7 @@ def circuit_manager_delete_term(request, term_id):
 
 # Managing Students and Results as before
 def circuit_manager_view_students(request):
-    circuit_manager = get_object_or_404(Circuit_Manager, admin=request.user)
+    circuit_manager = request_profile(request, Circuit_Manager)
     students = Student.objects.filter(course=circuit_manager.course)
 
     context = {
@@ -393,20 +405,61 @@ def circuit_manager_view_students(request):
     return render(request, 'circuit_manager_template/view_students.html', context)
 
 def circuit_manager_view_results(request):
-    circuit_manager = get_object_or_404(Circuit_Manager, admin=request.user)
-    results = StudentResult.objects.filter(student__course=circuit_manager.course)
-
     context = {
         'page_title': 'View Results',
-        'results': results,
+        'table': RESULTS_TABLE.describe(reverse('circuit_manager_results_data')),
+        'export_url': reverse('circuit_manager_export_data', args=['results']),
     }
     return render(request, 'circuit_manager_template/view_results.html', context)
 
+def circuit_manager_results_data(request):
+    circuit_manager = request_profile(request, Circuit_Manager)
+    if circuit_manager.circuit_id is None:
+        return HttpResponse("Not allowed", status=403)
+    results = StudentResult.objects.filter(student__school__circuit_id=circuit_manager.circuit_id)
+    return RESULTS_TABLE.page(results, request.GET)
+
+def circuit_manager_export_data(request, name):
+    # Always the manager's own circuit
+    circuit_manager = request_profile(request, Circuit_Manager)
+    return exports.download(request, name, circuit=circuit_manager.circuit_id)
+
+# Circuit analytics
+def circuit_manager_analytics(request):
+    # The figures come from circuit_manager_analytics_data
+    context = {
+        'page_title': 'Circuit Analytics',
+        'measures': AnalyticsCell.MEASURES,
+        'dimensions': [name for name in analytics.DIMENSIONS if name != 'circuit'],
+        'sessions': Session.objects.order_by('-start_year'),
+        'grades': Grade.objects.order_by('name'),
+        'refreshed': analytics.last_refreshed(),
+    }
+    return render(request, 'circuit_manager_template/analytics.html', context)
+
+def circuit_manager_analytics_data(request):
+    circuit_manager = request_profile(request, Circuit_Manager)
+    if circuit_manager.circuit_id is None:
+        return HttpResponse("Not allowed", status=403)
+    by = [name for name in request.GET.get('by', 'school').split(',') if name]
+    filters = {}
+    for name in ('school', 'session', 'subject', 'grade'):
+        ids = [int(value) for value in request.GET.getlist(name) if value.isdigit()]
+        if ids:
+            # One value slices the cube, several dice it
+            filters[name] = ids[0] if len(ids) == 1 else ids
+    try:
+        rows = analytics.query(request.GET.get('measure', 'results'), by, circuit=circuit_manager.circuit_id,
+                               **filters)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'rows': rows})
+
 # Continue with managing parents and members as in the previous implementation...
 
 # Managing Parents
 def circuit_manager_manage_parents(request):
-    circuit_manager = get_object_or_404(Circuit_Manager, admin=request.user)
+    circuit_manager = request_profile(request, Circuit_Manager)
     parents = Parent.objects.filter(student__course=circuit_manager.course)
 
     context = {
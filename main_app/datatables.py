@@ -0,0 +1,158 @@
+"""
+Server-side data tables for the report pages.
+
+A `Table` names the columns a page shows (as ORM paths), the filters and
+sort orders it accepts from the query string, and its default order.
+`Table.page` answers one request with one query:
+
+* rows come from `.values_list()` over the declared columns, so the student's
+  name, subject and school arrive through joins in the same SELECT instead
+  of a query per row;
+* pagination is by keyset: the `next` cursor holds the sort value and id of
+  the last row, and the next page starts with WHERE (sort, id) > cursor.
+  Unlike OFFSET, page 1000 costs the same as page 1, and there is no
+  COUNT(*) over the whole circuit.
+
+Query string: `sort` (a sortable column, `-` for descending), `limit`
+(capped at DATATABLE_MAX_PAGE_SIZE), `after` (the cursor from the previous
+page), `q` (the search column, prefix match) and one parameter per filter.
+Sortable columns must not be null, or rows with nulls would be skipped by
+the keyset comparison.
+"""
+import base64
+import datetime
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import JsonResponse
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    Keeps datetimes and times at full precision. DjangoJSONEncoder cuts them
+    to milliseconds, and the keyset comparison would then skip the rows that
+    share the last row's millisecond.
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _encode(values):
+    raw = json.dumps(values, cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, pk = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValidationError('Invalid cursor')
+    return value, pk
+
+
+class Table:
+    def __init__(self, columns, filters=None, sorts=None, default_sort='-id', search=None):
+        # columns: {name in the JSON: ORM path}; filters: {query parameter: lookup}
+        self.columns = dict(columns, id='id')
+        self.filters = filters or {}
+        self.sorts = dict(sorts or {}, id='id')
+        self.default_sort = default_sort
+        self.search = search
+
+    def describe(self, url):
+        """What the page template needs to build the table and its controls."""
+        return {'url': url, 'columns': [name for name in self.columns if name != 'id'],
+                'filters': list(self.filters), 'sorts': list(self.sorts), 'default_sort': self.default_sort,
+                'search': bool(self.search)}
+
+    def _sort(self, params):
+        sort = params.get('sort') or self.default_sort
+        descending = sort.startswith('-')
+        name = sort.lstrip('-')
+        if name not in self.sorts:
+            raise ValidationError(f'Cannot sort by {name}')
+        return self.sorts[name], descending
+
+    def rows(self, queryset, params):
+        """One page of rows as dicts, and the cursor of the next page (None on the last page)."""
+        default_size = getattr(settings, 'DATATABLE_PAGE_SIZE', 50)
+        try:
+            limit = max(1, min(int(params.get('limit') or default_size),
+                               getattr(settings, 'DATATABLE_MAX_PAGE_SIZE', 200)))
+        except ValueError:
+            raise ValidationError('limit must be a number')
+
+        for name, lookup in self.filters.items():
+            value = params.get(name)
+            if value not in (None, ''):
+                queryset = queryset.filter(**{lookup: value})
+        if self.search and params.get('q'):
+            queryset = queryset.filter(**{f'{self.search}__istartswith': params['q'].strip()})
+
+        field, descending = self._sort(params)
+        if params.get('after'):
+            value, pk = _decode(params['after'])
+            op = 'lt' if descending else 'gt'
+            if field == 'id':
+                queryset = queryset.filter(**{f'id__{op}': pk})
+            else:
+                queryset = queryset.filter(Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'id__{op}': pk}))
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(f'{prefix}{field}', f'{prefix}id')
+
+        # values_list, not values(): names such as "status" would clash with the model's own fields
+        names, paths = zip(*self.columns.items())
+        found = list(queryset.values_list(*paths, field)[:limit + 1])
+        cursor = None
+        if len(found) > limit:
+            found = found[:limit]
+            last = found[-1]
+            cursor = _encode([last[-1], last[names.index('id')]])
+        rows = [dict(zip(names, row)) for row in found]
+        return rows, cursor
+
+    def page(self, queryset, params):
+        """The JsonResponse for one page; bad parameters give a 400 with the reason."""
+        try:
+            rows, cursor = self.rows(queryset, params)
+        except (ValidationError, ValueError) as e:
+            message = e.messages[0] if isinstance(e, ValidationError) else str(e)
+            return JsonResponse({'error': message}, status=400)
+        return JsonResponse({'rows': rows, 'next': cursor}, encoder=DjangoJSONEncoder)
+
+
+#the report tables
+STUDENT_COLUMNS = {
+    'first_name': 'student__admin__first_name',
+    'last_name': 'student__admin__last_name',
+    'school': 'student__school__name',
+    'grade': 'student__grade__name',
+}
+STUDENT_FILTERS = {'student': 'student_id', 'school': 'student__school_id', 'grade': 'student__grade_id'}
+
+# Runs over AttendanceReport or ArchivedAttendanceReport, which have the same fields
+ATTENDANCE_TABLE = Table(
+    columns=dict(STUDENT_COLUMNS, date='attendance__date', subject='attendance__subject__name', status='status'),
+    filters=dict(STUDENT_FILTERS, subject='attendance__subject_id', status='status',
+                 date_from='attendance__date__gte', date_to='attendance__date__lte'),
+    sorts={'date': 'attendance__date', 'last_name': 'student__admin__last_name', 'status': 'status'},
+    default_sort='-date',
+    search='student__admin__last_name',
+)
+
+RESULTS_TABLE = Table(
+    columns=dict(STUDENT_COLUMNS, subject='subject__name', assignment='assignment', test='test', exam='exam',
+                 updated='updated_at'),
+    filters=dict(STUDENT_FILTERS, subject='subject_id', exam_min='exam__gte', exam_max='exam__lte'),
+    sorts={'last_name': 'student__admin__last_name', 'subject': 'subject__name', 'exam': 'exam',
+           'updated': 'updated_at'},
+    default_sort='-updated',
+    search='student__admin__last_name',
+)
@@ -1,27 +1,156 @@
+import random
+import time
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+# Per request (or per task) routing state
+_forced_db = ContextVar('forced_db', default=None)
+_replica_reads = ContextVar('replica_reads', default=False)
+_wrote = ContextVar('wrote', default=False)
+
+# alias -> (checked_at, lag in seconds)
+_lag_cache = {}
+
+
+def replica_weights():
+    """{alias: weight} for the replicas configured in settings.DATABASES."""
+    replicas = getattr(settings, 'DATABASE_REPLICAS', {})
+    return {alias: weight for alias, weight in replicas.items() if alias in settings.DATABASES and weight > 0}
+
+
+def replica_lag(alias):
+    """Replication lag of `alias` in seconds, cached for REPLICA_LAG_CHECK_SECONDS."""
+    now = time.monotonic()
+    checked = _lag_cache.get(alias)
+    if checked and now - checked[0] < getattr(settings, 'REPLICA_LAG_CHECK_SECONDS', 5):
+        return checked[1]
+
+    connection = connections[alias]
+    lag = 0.0
+    if connection.vendor == 'postgresql':
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT CASE WHEN pg_is_in_recovery() THEN "
+                    "COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+                    "ELSE 0 END"
+                )
+                lag = float(cursor.fetchone()[0])
+        except Exception:
+            lag = float('inf')  # unreachable replicas are skipped until the next check
+    _lag_cache[alias] = (now, lag)
+    return lag
+
+
+def choose_replica():
+    """Weighted random pick among replicas that are within REPLICA_MAX_LAG_SECONDS."""
+    max_lag = getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 10)
+    healthy = {alias: weight for alias, weight in replica_weights().items() if replica_lag(alias) <= max_lag}
+    if not healthy:
+        return None
+    aliases = list(healthy)
+    return random.choices(aliases, weights=[healthy[alias] for alias in aliases])[0]
+
+
+class use_database(ContextDecorator):
+    """
+    Force every query in the block to one database, e.g. read from the primary
+    straight after a write:
+
+        with use_database('default'):
+            ...
+
+        @use_database('default')
+        def view(request): ...
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def __enter__(self):
+        self.token = _forced_db.set(self.alias)
+        return self
+
+    def __exit__(self, *exc):
+        _forced_db.reset(self.token)
+        return False
+
+
+class use_replica(ContextDecorator):
+    """Send reads in the block to a replica (writes still go to the primary)."""
+
+    def __enter__(self):
+        self.token = _replica_reads.set(True)
+        return self
+
+    def __exit__(self, *exc):
+        _replica_reads.reset(self.token)
+        return False
+
+
+def replica_view(view_func):
+    """Mark a view as a heavy read-only report that may be served from a replica."""
+    view_func.use_replica = True
+    return view_func
+
+
+def wrote_to_primary():
+    return _wrote.get()
+
+
 class RailwayRouter:
     """
     A router to control all database operations on models in specific apps.
     Use 'railway' database for specific apps or as a backup.
+
+    Reads inside `use_replica` (set per request by ReplicaRoutingMiddleware for
+    reporting views) go to a healthy replica from DATABASE_REPLICAS. Once a
+    request writes, its reads stay on the primary, and the middleware keeps the
+    user pinned to the primary for REPLICA_PIN_SECONDS (read-your-writes).
     """
 
     # Example: route models in 'analytics' app to Railway
     route_app_labels = {'analytics', 'backup'}
 
+    # Writes to these apps do not pin the user to the primary
+    pin_ignore_app_labels = {'sessions', 'django_cache'}
+
+    # Always on the primary: the database cache and sessions must read what was
+    # just written (a session is only loaded once the view has switched to a replica)
+    primary_app_labels = {'django_cache', 'sessions'}
+
     def db_for_read(self, model, **hints):
         """Point read operations."""
         if model._meta.app_label in self.route_app_labels:
             return 'railway'
+        if model._meta.app_label in self.primary_app_labels:
+            return 'default'
+        forced = _forced_db.get()
+        if forced:
+            return forced
+        if _replica_reads.get() and not _wrote.get():
+            return choose_replica()
         return None  # Use default
 
     def db_for_write(self, model, **hints):
         """Point write operations."""
         if model._meta.app_label in self.route_app_labels:
             return 'railway'
-        return None  # Use default
+        if model._meta.app_label not in self.pin_ignore_app_labels:
+            _wrote.set(True)
+        forced = _forced_db.get()
+        if forced and forced not in replica_weights():
+            return forced
+        # Not None: Django would then fall back to instance._state.db and save
+        # an object read from a replica back to that replica
+        return 'default'
 
     def allow_relation(self, obj1, obj2, **hints):
         """Allow relations if both objects are in same DB."""
-        db_list = ('default', 'railway')
+        db_list = ('default', 'railway', *replica_weights())
         if obj1._state.db in db_list and obj2._state.db in db_list:
             return True
         return None
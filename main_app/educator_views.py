@@ -7,18 +7,22 @@ from django.views.decorators.csrf import csrf_exempt
 from questpaper.models import *
 from questpaper.forms import *
 # Import your form for editing the educator
+from . import attendance_archive
+from .attendance_archive import wants_archive
+from .datatables import RESULTS_TABLE
 from .forms import *
 from .models import *
+from .profiles import request_profile
 
 def educator_home(request):
-    educator = get_object_or_404(Educator, admin=request.user)
+    educator = request_profile(request, Educator)
     
     # Statistics
     total_students = Student.objects.filter(course=educator.course).count()
     total_grades = Grade.objects.filter(educator=educator).count()
     total_course = Course.objects.count()
     total_subjects = Subject.objects.count()
-    total_attendance = AttendanceReport.objects.filter(student__course=educator.course).count()
+    total_attendance = AttendanceReport.objects.current().filter(student__course=educator.course).count()
     total_parents = Parent.objects.count()
     items = NewsAndEvents.objects.all().order_by("-updated_date")
 
@@ -81,7 +85,7 @@ def educator_home(request):
 
 
 def upload_question_paper(request):
-    educator = get_object_or_404(Educator, admin=request.user)
+    educator = request_profile(request, Educator)
 
     if request.method == 'POST':
         form = QuestionPaperUploadForm(request.POST, request.FILES)
@@ -107,7 +111,7 @@ def upload_question_paper(request):
 
 
 def educator_view_students(request):
-    educator = get_object_or_404(Educator, admin=request.user)
+    educator = request_profile(request, Educator)
     students = Student.objects.filter(course=educator.course)
     
     context = {
@@ -120,7 +124,7 @@ def educator_view_students(request):
 
 def educator_take_attendance(request):
     try:
-        educator = get_object_or_404(Educator, admin=request.user)
+        educator = request_profile(request, Educator)
         # Get subjects taught by the educator
         subjects = Subject.objects.filter(educator=educator)
         
@@ -140,7 +144,7 @@ def educator_take_attendance(request):
 
 def submit_educator_attendance(request):
     if request.method == 'POST':
-        educator = get_object_or_404(Educator, admin=request.user)
+        educator = request_profile(request, Educator)
         subject_id = request.POST.get('subject')
         session_id = request.POST.get('session')
         status = request.POST.get('status') == 'present'  # True if 'present', False if 'absent'
@@ -175,7 +179,7 @@ def submit_educator_attendance(request):
     return redirect('educator_take_attendance')
 
 def educator_view_attendance(request):
-    educator = get_object_or_404(Educator, admin=request.user)
+    educator = request_profile(request, Educator)
     if request.method != 'POST':
         subjects = Subject.objects.filter(educator=educator)
         context = {
@@ -208,21 +212,23 @@ def educator_view_attendance(request):
             return None
 
 def educator_view_results(request):
-    educator = get_object_or_404(Educator, admin=request.user)
-    results = StudentResult.objects.filter(student__course=educator.course)
-    
+    # The rows come page by page from educator_results_data
     context = {
         'page_title': 'View Results',
-        'results': results
+        'table': RESULTS_TABLE.describe(reverse('educator_results_data')),
     }
     return render(request, 'educator_template/view_results.html', context)
 
+def educator_results_data(request):
+    educator = request_profile(request, Educator)
+    return RESULTS_TABLE.page(StudentResult.objects.filter(student__course=educator.course), request.GET)
+
 
 @csrf_exempt
 def fetch_student_attendance(request):
     try:
         # Get the educator who is logged in
-        educator = get_object_or_404(Educator, admin=request.user)
+        educator = request_profile(request, Educator)
 
         # Fetch student ID from POST request
         student_id = request.POST.get('student_id')
@@ -235,7 +241,7 @@ def fetch_student_attendance(request):
             return HttpResponse('Error: This student is not under your supervision.', status=403)
 
         # Fetch attendance data for the student
-        attendance_data = AttendanceReport.objects.filter(student_id=student_id)
+        attendance_data = attendance_archive.reports(wants_archive(request), student_id=student_id)
 
         # Format attendance data for response
         attendance_list = [
@@ -255,7 +261,7 @@ def fetch_student_attendance(request):
 @csrf_exempt
 def fetch_student_results(request):
     try:
-        educator = get_object_or_404(Educator, admin=request.user)  # Ensure the user is an educator
+        educator = request_profile(request, Educator)  # Ensure the user is an educator
         subject_id = request.POST.get('subject_id')  # Subject ID from the request
 
         # Verify that the subject belongs to the educator
@@ -280,7 +286,7 @@ def fetch_student_results(request):
 def educator_add_subject(request):
     try:
         # Ensure the user is an educator
-        educator = get_object_or_404(Educator, admin=request.user)
+        educator = request_profile(request, Educator)
 
         if request.method == 'POST':
             form = SubjectForm(request.POST)
@@ -313,7 +319,7 @@ def educator_add_subject(request):
 
 def educator_manage_subjects(request):
     try:
-        educator = get_object_or_404(Educator, admin=request.user)
+        educator = request_profile(request, Educator)
         subjects = Subject.objects.filter(educator=educator)  # Fetch only subjects the educator manages
 
         context = {
@@ -328,7 +334,7 @@ def educator_manage_subjects(request):
 
 def educator_edit_subject(request, subject_id):
     try:
-        educator = get_object_or_404(Educator, admin=request.user)
+        educator = request_profile(request, Educator)
         subject = get_object_or_404(Subject, id=subject_id, educator=educator)  # Only allow editing subjects assigned to the educator
 
         if request.method == 'POST':
@@ -355,7 +361,7 @@ def educator_edit_subject(request, subject_id):
 
 def educator_delete_subject(request, subject_id):
     try:
-        educator = get_object_or_404(Educator, admin=request.user)
+        educator = request_profile(request, Educator)
         subject = get_object_or_404(Subject, id=subject_id, educator=educator)  # Only allow deletion of subjects assigned to the educator
 
         subject.delete()
@@ -0,0 +1,284 @@
+"""
+Bulk enrollment of learners, educators and parents from a spreadsheet.
+
+`enroll` validates every row up front, resolving schools, grades, courses
+and circuits with one query per table. It then inserts the users and their
+role rows with bulk_create inside one transaction. bulk_create sends no
+post_save, so the per-user profile receivers never run and each batch costs
+two INSERTs instead of four queries per row.
+
+Accounts get their credentials in one of two ways:
+
+* "link": the password is left unusable and the report lists a one-time
+  link (the password reset link) where each user picks a password. Nothing
+  is hashed, so this is the fast choice for a whole school.
+* "password": the row's password, or a generated one, is hashed with the
+  configured PBKDF2 hasher. The hashing is spread over a process pool
+  (ENROLLMENT_HASH_WORKERS), because it is CPU bound and holds the GIL.
+
+The result is one report row per input row, with the credentials or the
+errors, which `report_csv` turns into a download.
+"""
+import csv
+import io
+import os
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.tokens import default_token_generator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from .models import Circuit, Course, CustomUser, Educator, Grade, Parent, School, Session, Student
+
+LINK = 'link'
+PASSWORD = 'password'
+MODES = ((LINK, 'Activation links'), (PASSWORD, 'Passwords'))
+
+# role: (user_type, profile model)
+ROLES = {
+    'student': ('3', Student),
+    'educator': ('5', Educator),
+    'parent': ('7', Parent),
+}
+
+BATCH_SIZE = 500
+
+# Spreadsheet headings people use for the same column
+ALIASES = {
+    'name': 'first_name', 'first name': 'first_name', 'firstname': 'first_name',
+    'surname': 'last_name', 'last name': 'last_name', 'lastname': 'last_name',
+    'email address': 'email', 'e-mail': 'email',
+    'school_emis': 'school', 'emis': 'school',
+    'learner_emails': 'learners', 'student_emails': 'learners', 'children': 'learners',
+}
+GENDERS = {'m': 'M', 'male': 'M', 'f': 'F', 'female': 'F'}
+
+
+#reading
+def _clean(value):
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        if value != value:  # NaN from an empty Excel cell
+            return ''
+        if value.is_integer():
+            return str(int(value))  # EMIS numbers come back from Excel as 1234.0
+    return str(value).strip()
+
+
+def _heading(column):
+    column = str(column).strip().lower()
+    return ALIASES.get(column, column.replace(' ', '_'))
+
+
+def read_rows(upload):
+    """Rows of a .csv or Excel upload as dicts with normalised headings."""
+    name = getattr(upload, 'name', '') or ''
+    if name.lower().endswith('.csv'):
+        text = upload.read()
+        if isinstance(text, bytes):
+            text = text.decode('utf-8-sig')
+        records = list(csv.DictReader(io.StringIO(text)))
+    else:
+        import pandas as pd
+
+        records = pd.read_excel(upload, dtype=object).to_dict('records')
+    return [{_heading(key): _clean(value) for key, value in record.items() if key is not None}
+            for record in records]
+
+
+#lookups
+class Lookups:
+    """Reference rows by name, loaded once per upload instead of once per row."""
+
+    def __init__(self):
+        self.schools = {}
+        for school in School.objects.only('id', 'emis', 'name', 'circuit_id'):
+            self.schools[school.emis.lower()] = school
+            if school.name:
+                self.schools.setdefault(school.name.lower(), school)
+        self.grades = {name.lower(): pk for pk, name in Grade.objects.values_list('id', 'name')}
+        self.circuits = {name.lower(): pk for pk, name in Circuit.objects.values_list('id', 'name')}
+        self.courses = {}
+        for pk, name, school_id in Course.objects.values_list('id', 'name', 'school_id'):
+            self.courses[(name.lower(), school_id)] = pk
+            self.courses.setdefault((name.lower(), None), pk)
+        self.session_id = Session.objects.order_by('-start_year').values_list('id', flat=True).first()
+
+    def find(self, table, value, errors, label):
+        if not value:
+            return None
+        found = table.get(value.lower())
+        if found is None:
+            errors.append(f"Unknown {label} '{value}'")
+        return found
+
+    def course(self, value, school_id, errors):
+        if not value:
+            return None
+        found = self.courses.get((value.lower(), school_id)) or self.courses.get((value.lower(), None))
+        if found is None:
+            errors.append(f"Unknown course '{value}'")
+        return found
+
+
+def _profile_fields(role, row, lookups, default_school, errors):
+    school = lookups.find(lookups.schools, row.get('school'), errors, 'school') or default_school
+    fields = {'school_id': school.pk if school else None}
+    if role in ('student', 'educator'):
+        circuit_id = lookups.find(lookups.circuits, row.get('circuit'), errors, 'circuit')
+        fields.update(
+            grade_id=lookups.find(lookups.grades, row.get('grade'), errors, 'grade'),
+            course_id=lookups.course(row.get('course'), fields['school_id'], errors),
+            circuit_id=circuit_id or (school.circuit_id if school else None),
+            session_id=lookups.session_id,
+        )
+    elif role == 'parent':
+        relationship = row.get('relationship', '').lower()
+        if relationship and relationship not in dict(Parent.RELATIONSHIP_CHOICES):
+            errors.append(f"Unknown relationship '{row['relationship']}'")
+        fields.update(relationship=relationship or 'other', occupation=row.get('occupation') or None)
+    return fields
+
+
+#hashing
+def hash_passwords(passwords, workers=None):
+    """make_password for each password, in a process pool when there are enough of them."""
+    workers = workers or getattr(settings, 'ENROLLMENT_HASH_WORKERS', 0) or os.cpu_count() or 1
+    if workers <= 1 or len(passwords) < 2 * workers:
+        return [make_password(password) for password in passwords]
+    # spawn, not fork: the web worker has threads and open connections
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn')) as pool:
+        return list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+def activation_link(user, base_url=''):
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    token = default_token_generator.make_token(user)
+    return base_url.rstrip('/') + reverse('password_reset_confirm', args=[uid, token])
+
+
+#enrollment
+def enroll(rows, role, mode=LINK, school=None, base_url='', workers=None):
+    """
+    Create an account and role row for each valid row. Rows with errors are
+    skipped and reported; the rest are created together or not at all.
+    Returns the report, one dict per input row.
+    """
+    user_type, profile_model = ROLES[role]
+    lookups = Lookups()
+    emails = [CustomUser.objects.normalize_email(row.get('email', '')) for row in rows]
+    taken = set(CustomUser.objects.annotate(email_lower=Lower('email'))
+                .filter(email_lower__in=[email.lower() for email in emails if email])
+                .values_list('email_lower', flat=True))
+
+    report, pending, seen = [], [], set()
+    for number, (row, email) in enumerate(zip(rows, emails), start=2):  # row 1 is the heading
+        errors = []
+        entry = {'row': number, 'email': email, 'first_name': row.get('first_name', ''),
+                 'last_name': row.get('last_name', ''), 'status': 'error', 'password': '',
+                 'activation_link': '', 'error': ''}
+        report.append(entry)
+        for field in ('first_name', 'last_name', 'email'):
+            if not row.get(field):
+                errors.append(f'{field} is required')
+        if email:
+            try:
+                validate_email(email)
+            except ValidationError:
+                errors.append('invalid email')
+            if email.lower() in taken:
+                errors.append('email already registered')
+            elif email.lower() in seen:
+                errors.append('email repeated in this file')
+            seen.add(email.lower())
+        gender = row.get('gender', '')
+        if gender and gender.lower() not in GENDERS:
+            errors.append(f"Unknown gender '{gender}'")
+        profile = _profile_fields(role, row, lookups, school, errors)
+        if errors:
+            entry['error'] = '; '.join(errors)
+            continue
+
+        password = row.get('password') or (secrets.token_urlsafe(8) if mode == PASSWORD else None)
+        user = CustomUser(
+            email=email, first_name=row['first_name'], last_name=row['last_name'], user_type=user_type,
+            gender=GENDERS.get(gender.lower(), ''), address=row.get('address', ''),
+        )
+        pending.append((entry, user, profile, password, row.get('learners', '')))
+
+    if mode == PASSWORD:
+        hashes = hash_passwords([password for _, _, _, password, _ in pending], workers)
+    else:
+        hashes = [make_password(None)] * len(pending)
+
+    with transaction.atomic():
+        users = [user for _, user, _, _, _ in pending]
+        for user, hashed in zip(users, hashes):
+            user.password = hashed
+        CustomUser.objects.bulk_create(users, batch_size=BATCH_SIZE)
+        if any(user.pk is None for user in users):  # backends that do not return ids
+            ids = dict(CustomUser.objects.filter(email__in=[user.email for user in users])
+                       .values_list('email', 'pk'))
+            for user in users:
+                user.pk = ids[user.email]
+        profiles = profile_model.objects.bulk_create(
+            [profile_model(admin_id=user.pk, **profile) for _, user, profile, _, _ in pending],
+            batch_size=BATCH_SIZE,
+        )
+        if role == 'parent':
+            _link_learners(pending, profiles, report)
+
+    for entry, user, _, password, _ in pending:
+        entry['status'] = 'created'
+        if mode == PASSWORD:
+            entry['password'] = password
+        else:
+            entry['activation_link'] = activation_link(user, base_url)
+    return report
+
+
+def _link_learners(pending, parents, report):
+    """Parent to learner links from a column of learner emails separated by ; or spaces."""
+    wanted = {}
+    for (entry, _, _, _, learners), parent in zip(pending, parents):
+        for email in learners.replace(',', ';').replace(' ', ';').split(';'):
+            if email:
+                wanted.setdefault(parent, []).append((entry, email.lower()))
+    if not wanted:
+        return
+    students = dict(Student.objects.annotate(email_lower=Lower('admin__email'))
+                    .filter(email_lower__in={email for links in wanted.values() for _, email in links})
+                    .values_list('email_lower', 'pk'))
+    if any(parent.pk is None for parent in wanted):
+        ids = dict(Parent.objects.filter(admin_id__in=[parent.admin_id for parent in wanted])
+                   .values_list('admin_id', 'pk'))
+        for parent in wanted:
+            parent.pk = ids[parent.admin_id]
+    through = Parent.student.through
+    links = []
+    for parent, emails in wanted.items():
+        for entry, email in emails:
+            if email in students:
+                links.append(through(parent_id=parent.pk, student_id=students[email]))
+            else:
+                entry['error'] = '; '.join(filter(None, [entry['error'], f"learner {email} not found"]))
+    through.objects.bulk_create(links, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+REPORT_FIELDS = ['row', 'email', 'first_name', 'last_name', 'status', 'password', 'activation_link', 'error']
+
+
+def report_csv(report, handle):
+    writer = csv.DictWriter(handle, fieldnames=REPORT_FIELDS)
+    writer.writeheader()
+    writer.writerows(report)
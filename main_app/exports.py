@@ -0,0 +1,212 @@
+"""
+Bulk exports of attendance, results, informal results and quiz sittings.
+
+Each `Export` lists its columns as ORM paths and the filters it accepts
+(circuit, school, grade, session). Only attendance records its session;
+results, informal results and quiz sittings do not, and filtering them by
+the student's *current* session would drop or misfile earlier years, so
+those exports ignore `session`. Rows are read with values_list in
+chunks of EXPORT_CHUNK_SIZE, ordered by id: through a server-side cursor
+(`.iterator(chunk_size=...)`), or, where server-side cursors are disabled
+(pgbouncer), with one `id > last` query per chunk. Either way only one
+chunk is in memory at a time, whatever the number of rows.
+
+* CSV is streamed as it is read, EXPORT_CHUNK_SIZE rows per chunk.
+* XLSX is written by XlsxWriter in constant_memory mode (each row goes to
+  disk once written) into a temporary file, which is then streamed.
+  Sheets roll over at Excel's row limit.
+
+Under ASGI, Django would collect a plain iterator in full before sending
+it, so the response pulls the chunks from a worker thread one at a time
+instead (`_aiterate`), one thread hop per chunk rather than per row. Reads go to a replica when one is configured.
+"""
+import csv
+import tempfile
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+
+from quiz.models import Sitting
+
+from . import attendance_archive
+from .db_routers import use_replica
+from .models import InformalStudentResult, StudentResult
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+FILTERS = ('circuit', 'school', 'grade', 'session')
+XLSX_MAX_ROWS = 1048576
+
+
+class Export:
+    def __init__(self, name, columns, filters, queryset):
+        self.name = name
+        self.headers, self.paths = zip(*columns)
+        # filters: {'circuit': lookup, ...}; queryset: session id (or None) -> the rows to export
+        self.filters = filters
+        self.queryset = queryset
+
+    def rows_queryset(self, params):
+        queryset = self.queryset(params.get('session'))
+        for name, lookup in self.filters.items():
+            if params.get(name) is not None:
+                queryset = queryset.filter(**{lookup: params[name]})
+        with use_replica():
+            # Pin every chunk to the same database, chosen once
+            return queryset.using(queryset.db).order_by('id')
+
+
+def _student_lookups(prefix):
+    return {'circuit': f'{prefix}circuit_id', 'school': f'{prefix}school_id', 'grade': f'{prefix}grade_id'}
+
+
+def _all_sessions(model):
+    # These rows do not record their session, so ?session= does not apply to them
+    def queryset(session):
+        return model.objects.all()
+    return queryset
+
+
+STUDENT_COLUMNS = [
+    ('Surname', 'student__admin__last_name'),
+    ('First name', 'student__admin__first_name'),
+    ('Circuit', 'student__circuit__name'),
+    ('School', 'student__school__name'),
+    ('Grade', 'student__grade__name'),
+]
+
+EXPORTS = {export.name: export for export in [
+    # The session picks the table: the current session is live, older ones may be archived
+    Export('attendance', STUDENT_COLUMNS + [
+        ('Date', 'attendance__date'), ('Subject', 'attendance__subject__name'), ('Present', 'status'),
+    ], _student_lookups('student__'), attendance_archive.session_reports),
+    Export('results', STUDENT_COLUMNS + [
+        ('Subject', 'subject__name'), ('Assignment', 'assignment'), ('Test', 'test'), ('Exam', 'exam'),
+        ('Updated', 'updated_at'),
+    ], _student_lookups('student__'), _all_sessions(StudentResult)),
+    Export('informal_results', STUDENT_COLUMNS + [
+        ('Subject', 'subject__name'), ('Informal test', 'informaltest'), ('Updated', 'updated_at'),
+    ], _student_lookups('student__'), _all_sessions(InformalStudentResult)),
+    Export('quiz_sittings', [
+        ('Surname', 'user__last_name'), ('First name', 'user__first_name'), ('Email', 'user__email'),
+        ('Circuit', 'user__student__circuit__name'), ('School', 'user__student__school__name'),
+        ('Grade', 'user__student__grade__name'), ('Quiz', 'quiz__title'), ('Course', 'course__name'),
+        ('Score', 'current_score'), ('Complete', 'complete'), ('Started', 'start'), ('Finished', 'end'),
+    ], _student_lookups('user__student__'), _all_sessions(Sitting)),
+]}
+
+
+def params_from(query):
+    """The circuit/school/grade/session ids in a query string; anything else is ignored."""
+    return {name: int(query[name]) for name in FILTERS if str(query.get(name, '')).isdigit()}
+
+
+#reading
+def rows(queryset, paths, chunk_size=None):
+    """Yield the values of `paths` for every row, holding one chunk in memory."""
+    chunk_size = chunk_size or getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+    if not connections[queryset.db].settings_dict.get('DISABLE_SERVER_SIDE_CURSORS'):
+        yield from queryset.values_list(*paths).iterator(chunk_size=chunk_size)
+        return
+    last = 0
+    while True:
+        chunk = list(queryset.filter(id__gt=last).values_list('id', *paths)[:chunk_size])
+        if not chunk:
+            return
+        for row in chunk:
+            yield row[1:]
+        last = chunk[-1][0]
+
+
+#writing
+class _Echo:
+    """File-like object for csv.writer that hands each line back instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_chunks(export, params, chunk_size=None):
+    """The CSV as strings of `chunk_size` rows each."""
+    chunk_size = chunk_size or getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+    writer = csv.writer(_Echo())
+    lines = ['\ufeff' + writer.writerow(export.headers)]  # BOM, so Excel reads the file as UTF-8
+    for row in rows(export.rows_queryset(params), export.paths, chunk_size):
+        lines.append(writer.writerow(row))
+        if len(lines) >= chunk_size:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def write_xlsx(export, params, handle, chunk_size=None):
+    """Write the export as a workbook to the open binary file `handle`; returns the row count."""
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(handle, {
+        'constant_memory': True,
+        'remove_timezone': True,
+        'default_date_format': 'yyyy-mm-dd',
+    })
+    bold = workbook.add_format({'bold': True})
+    sheet, line, count = None, XLSX_MAX_ROWS, 0
+    for row in rows(export.rows_queryset(params), export.paths, chunk_size):
+        if line == XLSX_MAX_ROWS:
+            sheet = workbook.add_worksheet(f'{export.name[:24]} {len(workbook.worksheets()) + 1}')
+            sheet.write_row(0, 0, export.headers, bold)
+            line = 1
+        sheet.write_row(line, 0, row)
+        line += 1
+        count += 1
+    if sheet is None:
+        workbook.add_worksheet(export.name[:31]).write_row(0, 0, export.headers, bold)
+    workbook.close()
+    return count
+
+
+def xlsx_chunks(export, params, chunk_size=None):
+    with tempfile.TemporaryFile() as handle:
+        write_xlsx(export, params, handle, chunk_size)
+        handle.seek(0)
+        while block := handle.read(64 * 1024):
+            yield block
+
+
+async def _aiterate(iterator):
+    """Pull a sync iterator one chunk at a time on the sync thread, so ASGI streams it instead of buffering it."""
+    done = object()
+    while (chunk := await sync_to_async(next)(iterator, done)) is not done:
+        yield chunk
+
+
+def response(export, fmt, params):
+    """StreamingHttpResponse with the export as an attachment."""
+    chunks = (csv_chunks if fmt == 'csv' else xlsx_chunks)(export, params)
+    if getattr(settings, 'SERVER_MODE', 'wsgi') == 'asgi':
+        chunks = _aiterate(chunks)
+    suffix = ''.join(f'_{name}{params[name]}' for name in FILTERS if name in params)
+    streamed = StreamingHttpResponse(chunks, content_type=FORMATS[fmt])
+    streamed['Content-Disposition'] = f'attachment; filename="{export.name}{suffix}.{fmt}"'
+    streamed['Cache-Control'] = 'no-store'
+    streamed['X-Accel-Buffering'] = 'no'
+    return streamed
+
+
+def download(request, name, **scope):
+    """
+    The export `name` as ?format=csv or xlsx, filtered by the query string.
+    `scope` (e.g. the principal's school) overrides the query string.
+    """
+    export = EXPORTS.get(name)
+    fmt = request.GET.get('format', 'csv')
+    if export is None or fmt not in FORMATS:
+        raise Http404("Unknown export")
+    if any(value is None for value in scope.values()):
+        # A profile without its school or circuit must not fall through to everything
+        return HttpResponse("Not allowed", status=403)
+    return response(export, fmt, dict(params_from(request.GET), **scope))
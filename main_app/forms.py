@@ -595,6 +595,19 @@ class TimetableForm(forms.ModelForm):
             'educators': forms.SelectMultiple(attrs={'size': 5}),
         }
 
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start_time'), cleaned_data.get('end_time')
+        if start and end and cleaned_data.get('day'):
+            if start >= end:
+                raise forms.ValidationError("The end time must be after the start time.")
+            from .timetables import clashes
+            found = clashes(cleaned_data['day'], start, end, cleaned_data.get('grade'), cleaned_data.get('course'),
+                            cleaned_data.get('educators') or (), exclude=self.instance.pk)
+            if found:
+                raise forms.ValidationError(found)
+        return cleaned_data
+
 #messages
 class MessageForm(forms.ModelForm):
     class Meta:
@@ -620,6 +633,10 @@ class SchoolPerformanceForm(forms.ModelForm):
             'school_principal', 'performance_score', 'comments'
         ]
 
+    def validate_unique(self):
+        # Each submission is one more evaluation of an existing row (performance.record_evaluation)
+        pass
+
 #reply contact
 class ReplyContactForm(forms.Form):
     subject = forms.CharField(max_length=255, widget=forms.TextInput(attrs={'class': 'form-control'}))
@@ -663,4 +680,17 @@ class CourseExcelUploadForm(forms.Form):
     excel_file = forms.FileField(
         label='Excel File',
         widget=forms.FileInput(attrs={'class': 'form-control'})
-    )
\ No newline at end of file
+    )
+
+#bulk enrollment
+class BulkEnrollForm(forms.Form):
+    file = forms.FileField(label='Spreadsheet (.csv, .xls or .xlsx)',
+                           widget=forms.FileInput(attrs={'class': 'form-control'}))
+    role = forms.ChoiceField(choices=[('student', 'Learners'), ('educator', 'Educators'), ('parent', 'Parents')],
+                             widget=forms.Select(attrs={'class': 'form-control'}))
+    mode = forms.ChoiceField(label='Credentials',
+                             choices=[('link', 'Activation links (fastest)'), ('password', 'Passwords')],
+                             widget=forms.Select(attrs={'class': 'form-control'}))
+    school = forms.ModelChoiceField(queryset=School.objects.all(), required=False,
+                                    help_text='Used for rows without a school column',
+                                    widget=forms.Select(attrs={'class': 'form-control'}))
@@ -2,7 +2,7 @@ import json
 import requests
 from django.contrib import messages
 from django.core.files.storage import FileSystemStorage
-from django.http import HttpResponse, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import (HttpResponse, HttpResponseRedirect,
                               get_object_or_404, redirect, render)
 from django.templatetags.static import static
@@ -10,10 +10,18 @@ from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import UpdateView
 from django.db.models import Count
-import pandas as pd
-import numpy as np
+from django.conf import settings
 from .forms import *
 from .models import *
+from .http_client import async_client
+from . import attendance_archive, exports, performance, profiles
+from .profiles import request_profile, role_required
+
+
+def _counts(queryset, field):
+    """{value of `field`: number of rows} for `queryset`, in one grouped query."""
+    return dict(queryset.order_by().values(field).annotate(count=Count('pk')).values_list(field, 'count'))
+
 
 def admin_home(request):
     # Aggregate counts for primary entities
@@ -33,8 +41,11 @@ def admin_home(request):
     subjects = Subject.objects.all()
     attendance_list = []
     subject_list = []
+    # Grouped counts: a fixed number of queries however many subjects, schools or students
+    session_id = attendance_archive.current_session_id()
+    attendance_by_subject = _counts(Attendance.objects.current(session_id), 'subject_id')
     for subject in subjects:
-        attendance_count = Attendance.objects.filter(subject=subject).count()
+        attendance_count = attendance_by_subject.get(subject.id, 0)
         subject_list.append(subject.name[:7])  # First 7 characters of subject name
         attendance_list.append(attendance_count)
     
@@ -44,13 +55,13 @@ def admin_home(request):
     subject_count_list = []
     student_count_list_in_course = []
     educator_count_list_in_course = []
+    students_by_course = _counts(Student.objects.all(), 'course_id')
+    educators_by_course = _counts(Educator.objects.all(), 'course_id')
     
     for course in course_all:
-        student_count = Student.objects.filter(course_id=course.id).count()
-        educator_count = Educator.objects.filter(course_id=course.id).count()
         course_name_list.append(course.name)
-        student_count_list_in_course.append(student_count)
-        educator_count_list_in_course.append(educator_count)
+        student_count_list_in_course.append(students_by_course.get(course.id, 0))
+        educator_count_list_in_course.append(educators_by_course.get(course.id, 0))
     
     # Total grades and subjects in each school
     school_all = School.objects.all()
@@ -68,37 +79,33 @@ def admin_home(request):
     
     # School statistics for subjects, courses,
     #  grades, educators, etc.
-    school_count_list_in_course = []
-    school_count_list_in_grade = []
-    school_count_list_in_educator = []
-    school_count_list_in_student = []
-    school_count_list_in_parent = []
-    school_count_list_in_principal = []
-    
-    for school in school_all:
-        course_count = Course.objects.filter(id=school.id).count()
-        educator_count = Educator.objects.filter(id=school.id).count()
-        student_count = Student.objects.filter(id=school.id).count()
-        parent_count = Parent.objects.filter(id=school.id).count()
-        principal_count = Principal.objects.filter(id=school.id).count()
-        
-        school_count_list_in_course.append(course_count)
-        school_count_list_in_grade.append(grade_count)
-        school_count_list_in_educator.append(educator_count)
-        school_count_list_in_student.append(student_count)
-        school_count_list_in_parent.append(parent_count)
-        school_count_list_in_principal.append(principal_count)
+    courses_by_school = _counts(Course.objects.all(), 'school_id')
+    educators_by_school = _counts(Educator.objects.all(), 'school_id')
+    students_by_school = _counts(Student.objects.all(), 'school_id')
+    parents_by_school = _counts(Parent.objects.all(), 'school_id')
+    principals_by_school = _counts(Principal.objects.all(), 'school_id')
+    school_ids = [school.id for school in school_all]
+    school_count_list_in_course = [courses_by_school.get(pk, 0) for pk in school_ids]
+    school_count_list_in_grade = grade_count_list_in_school
+    school_count_list_in_educator = [educators_by_school.get(pk, 0) for pk in school_ids]
+    school_count_list_in_student = [students_by_school.get(pk, 0) for pk in school_ids]
+    school_count_list_in_parent = [parents_by_school.get(pk, 0) for pk in school_ids]
+    school_count_list_in_principal = [principals_by_school.get(pk, 0) for pk in school_ids]
     
     # Student attendance and leave records
     student_attendance_present_list = []
     student_attendance_leave_list = []
     student_name_list = []
     
-    students = Student.objects.all()
+    current_reports = AttendanceReport.objects.current(session_id)
+    present_by_student = _counts(current_reports.filter(status=True), 'student_id')
+    absent_by_student = _counts(current_reports.filter(status=False), 'student_id')
+    leave_by_student = _counts(LeaveReportStudent.objects.filter(status=1), 'student_id')
+    students = Student.objects.select_related('admin')
     for student in students:
-        attendance = AttendanceReport.objects.filter(student_id=student.id, status=True).count()
-        absent = AttendanceReport.objects.filter(student_id=student.id, status=False).count()
-        leave = LeaveReportStudent.objects.filter(student_id=student.id, status=1).count()
+        attendance = present_by_student.get(student.id, 0)
+        absent = absent_by_student.get(student.id, 0)
+        leave = leave_by_student.get(student.id, 0)
         student_attendance_present_list.append(attendance)
         student_attendance_leave_list.append(leave + absent)
         student_name_list.append(student.admin.first_name)
@@ -262,17 +269,19 @@ def add_student(request):
                 passport_url = fs.url(filename)
 
             try:
-                user = CustomUser.objects.create_user(
-                    email=email,
-                    password=password,
-                    user_type=3,
-                    first_name=first_name,
-                    last_name=last_name,
-                    profile_pic=passport_url
-                )
-                user.gender = gender
-                user.address = address
-                user.save()
+                # The Student row is built below, so skip the automatic empty one
+                with profiles.disabled():
+                    user = CustomUser.objects.create_user(
+                        email=email,
+                        password=password,
+                        user_type=3,
+                        first_name=first_name,
+                        last_name=last_name,
+                        profile_pic=passport_url
+                    )
+                    user.gender = gender
+                    user.address = address
+                    user.save()
 
                 # Now create the Student instance
                 student = Student.objects.create(
@@ -296,6 +305,41 @@ def add_student(request):
     return render(request, 'hod_template/add_student_template.html', context)
 
 
+@role_required('1')
+def bulk_enroll(request):
+    from .enrollment import enroll, read_rows, report_csv
+
+    form = BulkEnrollForm(request.POST or None, request.FILES or None)
+    context = {'form': form, 'page_title': 'Bulk Enrollment'}
+    if request.method == 'POST' and form.is_valid():
+        try:
+            rows = read_rows(form.cleaned_data['file'])
+        except Exception as e:
+            messages.error(request, f"Could not read the spreadsheet: {e}")
+            return render(request, 'hod_template/bulk_enroll.html', context)
+        if not rows:
+            messages.error(request, "The spreadsheet has no rows")
+            return render(request, 'hod_template/bulk_enroll.html', context)
+
+        report = enroll(rows, form.cleaned_data['role'], form.cleaned_data['mode'],
+                        school=form.cleaned_data['school'], base_url=request.build_absolute_uri('/'))
+        created = sum(1 for entry in report if entry['status'] == 'created')
+        messages.success(request, f"{created} of {len(report)} accounts created")
+
+        # The report holds passwords or login links, so it is never cached
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="enrollment_{form.cleaned_data["role"]}.csv"'
+        response['Cache-Control'] = 'no-store'
+        report_csv(report, response)
+        return response
+    return render(request, 'hod_template/bulk_enroll.html', context)
+
+
+@role_required('1')
+def export_data(request, name):
+    return exports.download(request, name)
+
+
 def add_principal(request):
     principal_form = PrincipalForm(request.POST or None, request.FILES or None)
     context = {'form': principal_form, 'page_title': 'Add Principal'}
@@ -373,17 +417,18 @@ def add_educator(request):
                     profile_pic_url = fs.url(filename)
 
                 # Create CustomUser
-                user = CustomUser.objects.create_user(
-                    email=email,
-                    password=password,
-                    user_type=5,
-                    first_name=first_name,
-                    last_name=last_name,
-                    profile_pic=profile_pic_url
-                )
-                user.gender = gender
-                user.address = address
-                user.save()
+                with profiles.disabled():
+                    user = CustomUser.objects.create_user(
+                        email=email,
+                        password=password,
+                        user_type=5,
+                        first_name=first_name,
+                        last_name=last_name,
+                        profile_pic=profile_pic_url
+                    )
+                    user.gender = gender
+                    user.address = address
+                    user.save()
 
                 # Create Educator instance
                 educator = Educator.objects.create(
@@ -1417,7 +1462,7 @@ def get_admin_attendance(request):
 
 
 def admin_view_profile(request):
-    admin = get_object_or_404(Admin, admin=request.user)
+    admin = request_profile(request, Admin)
     form = AdminForm(request.POST or None, request.FILES or None,
                      instance=admin)
     context = {'form': form,
@@ -1469,55 +1514,50 @@ def admin_notify_student(request):
     return render(request, "hod_template/student_notification.html", context)
 
 
+async def _send_fcm(token, message, click_action):
+    """Push a notification through FCM without holding up a worker while it waits."""
+    body = {
+        'notification': {
+            'title': "Student Management System",
+            'body': message,
+            'click_action': click_action,
+            'icon': static('dist/img/AdminLTELogo.png')
+        },
+        'to': token
+    }
+    headers = {'Authorization':
+               'key=AAAA3Bm8j_M:APA91bElZlOLetwV696SoEtgzpJr2qbxBfxVBfDWFiopBWzfCfzQp2nRyC7_A2mlukZEHV4g1AmyC6P_HonvSkY2YyliKt5tT3fe_1lrKod2Daigzhb2xnYQMxUWjCAIQcUexAMPZePB',
+               'Content-Type': 'application/json'}
+    return await async_client().post("https://fcm.googleapis.com/fcm/send", content=json.dumps(body), headers=headers)
+
+
 @csrf_exempt
-def send_student_notification(request):
+async def send_student_notification(request):
     id = request.POST.get('id')
     message = request.POST.get('message')
-    student = get_object_or_404(Student, admin_id=id)
     try:
-        url = "https://fcm.googleapis.com/fcm/send"
-        body = {
-            'notification': {
-                'title': "Student Management System",
-                'body': message,
-                'click_action': reverse('student_view_notification'),
-                'icon': static('dist/img/AdminLTELogo.png')
-            },
-            'to': student.admin.fcm_token
-        }
-        headers = {'Authorization':
-                   'key=AAAA3Bm8j_M:APA91bElZlOLetwV696SoEtgzpJr2qbxBfxVBfDWFiopBWzfCfzQp2nRyC7_A2mlukZEHV4g1AmyC6P_HonvSkY2YyliKt5tT3fe_1lrKod2Daigzhb2xnYQMxUWjCAIQcUexAMPZePB',
-                   'Content-Type': 'application/json'}
-        data = requests.post(url, data=json.dumps(body), headers=headers)
-        notification = NotificationStudent(student=student, message=message)
-        notification.save()
+        student = await Student.objects.select_related('admin').aget(admin_id=id)
+    except Student.DoesNotExist:
+        raise Http404("No Student matches the given query.")
+    try:
+        await _send_fcm(student.admin.fcm_token, message, reverse('student_view_notification'))
+        await NotificationStudent.objects.acreate(student=student, message=message)
         return HttpResponse("True")
     except Exception as e:
         return HttpResponse("False")
 
 
 @csrf_exempt
-def send_staff_notification(request):
+async def send_staff_notification(request):
     id = request.POST.get('id')
     message = request.POST.get('message')
-    staff = get_object_or_404(Staff, admin_id=id)
     try:
-        url = "https://fcm.googleapis.com/fcm/send"
-        body = {
-            'notification': {
-                'title': "Student Management System",
-                'body': message,
-                'click_action': reverse('staff_view_notification'),
-                'icon': static('dist/img/AdminLTELogo.png')
-            },
-            'to': staff.admin.fcm_token
-        }
-        headers = {'Authorization':
-                   'key=AAAA3Bm8j_M:APA91bElZlOLetwV696SoEtgzpJr2qbxBfxVBfDWFiopBWzfCfzQp2nRyC7_A2mlukZEHV4g1AmyC6P_HonvSkY2YyliKt5tT3fe_1lrKod2Daigzhb2xnYQMxUWjCAIQcUexAMPZePB',
-                   'Content-Type': 'application/json'}
-        data = requests.post(url, data=json.dumps(body), headers=headers)
-        notification = NotificationStaff(staff=staff, message=message)
-        notification.save()
+        staff = await Staff.objects.select_related('admin').aget(admin_id=id)
+    except Staff.DoesNotExist:
+        raise Http404("No Staff matches the given query.")
+    try:
+        await _send_fcm(staff.admin.fcm_token, message, reverse('staff_view_notification'))
+        await NotificationStaff.objects.acreate(staff=staff, message=message)
         return HttpResponse("True")
     except Exception as e:
         return HttpResponse("False")
@@ -1613,39 +1653,43 @@ def register_selection(request):
 
 #school perfomance
 #To view and calculate the school grade perfomance
+@role_required('1', '4')
 def school_performance_view(request):
     # Handle form submission
     if request.method == 'POST':
         form = SchoolPerformanceForm(request.POST)
         if form.is_valid():
-            form.save()
+            performance.record_evaluation(**form.cleaned_data)
             return redirect('school_performance_view')  # Redirect to the same view after saving
     else:
         form = SchoolPerformanceForm()
 
-    # Fetch all performance records and calculate average performance score for graph
-    performances = SchoolPerformance.objects.all()
-    performance_data = (
-        performances
-        .values('grade')
-        .annotate(avg_performance=Avg('performance_score'))
-        .order_by('grade')
-    )
+    session_id = request.GET.get('session', '')
+    session = Session.objects.filter(id=session_id).first() if session_id.isdigit() else None
+    performances = SchoolPerformance.objects.select_related('school_record', 'session', 'subject', 'grade')
+    if session:
+        performances = performances.filter(session=session)
 
-    # Data for the bar graph
-    grades = [item['grade'] for item in performance_data]
-    avg_scores = [float(item['avg_performance']) for item in performance_data]
+    # Data for the bar graph, from the cached summary
+    chart = performance.summary(session)
 
     context = {
         'form': form,
-        'performances': performances,
-        'grades': grades,
-        'avg_scores': avg_scores,
+        'performances': performances.order_by('-updated_at')[:100],
+        'sessions': Session.objects.order_by('-start_year'),
+        'session': session,
+        'grades': chart['grades'],
+        'avg_scores': chart['averages'],
+        'improvements': chart['improvements'],
     }
     return render(request, 'school_performance.html', context)
 
 
 def upload_courses_from_excel(request):
+    # pandas is slow to import, so only the upload path loads it
+    import numpy as np
+    import pandas as pd
+
     if request.method == 'POST':
         form = CourseExcelUploadForm(request.POST, request.FILES)
         if form.is_valid():
@@ -1729,4 +1773,53 @@ def upload_courses_from_excel(request):
     else:
         form = CourseExcelUploadForm()
     
-    return render(request, 'courses/upload_excel.html', {'form': form})
\ No newline at end of file
+    return render(request, 'courses/upload_excel.html', {'form': form})
+
+
+#query profile
+@role_required('1')
+def query_profile_view(request):
+    from .profiling import endpoint_stats
+    if request.method == 'POST':
+        endpoint_stats.clear()
+        messages.success(request, "Query profile cleared")
+        return redirect('query_profile')
+    context = {
+        'endpoints': endpoint_stats.slowest(),
+        'enabled': getattr(settings, 'QUERY_PROFILER', False),
+        'page_title': 'Query Profile (slowest endpoints)',
+    }
+    return render(request, 'hod_template/query_profile.html', context)
+
+
+@role_required('1')
+def ai_usage_view(request):
+    from datetime import timedelta
+    from django.db.models import Q, Sum
+    from django.utils import timezone
+    from .ai_limits import scheduler
+
+    try:
+        days = max(1, min(int(request.GET.get('days', 7)), 90))
+    except ValueError:
+        days = 7
+    since = timezone.now() - timedelta(days=days)
+    schools = (AIChatLog.objects.filter(created_at__gte=since)
+               .values('school__id', 'school__name')
+               .annotate(requests=Count('id'), cached=Count('id', filter=Q(cached=True)),
+                         users=Count('user', distinct=True), ips=Count('ip_address', distinct=True),
+                         prompt_tokens=Sum('prompt_tokens'), completion_tokens=Sum('completion_tokens'))
+               .order_by('-requests'))
+    rows = []
+    for row in schools:
+        row['tokens'] = (row['prompt_tokens'] or 0) + (row['completion_tokens'] or 0)
+        row['hit_rate'] = 100 * row['cached'] / row['requests'] if row['requests'] else 0
+        rows.append(row)
+    context = {
+        'rows': rows,
+        'days': days,
+        'daily_budget': getattr(settings, 'AI_DAILY_TOKEN_BUDGET', 0),
+        'waiting': scheduler.waiting(),
+        'page_title': 'AI Assistant Usage by School',
+    }
+    return render(request, 'hod_template/ai_usage.html', context)
@@ -0,0 +1,25 @@
+"""
+Shared httpx client for outbound calls made from async views.
+
+An AsyncClient belongs to the event loop it was created on. Under uvicorn that
+is one loop per worker, so connections are reused across requests; async views
+served by WSGI get a fresh loop per request, so clients are kept per loop.
+"""
+import asyncio
+import weakref
+
+import httpx
+from django.conf import settings
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def async_client():
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = httpx.AsyncClient(
+            timeout=httpx.Timeout(getattr(settings, 'OUTBOUND_HTTP_TIMEOUT', 15), connect=5),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+    return client
@@ -0,0 +1,255 @@
+"""
+Image derivatives (thumbnails and WebP variants) for uploaded pictures.
+
+Derivatives are generated after the upload is committed, in a small background
+thread pool, and are written next to the original through the field's storage
+so they work the same on S3 and on local disk:
+
+    news_images/25/10/30/photo.jpg
+    news_images/25/10/30/photo__320.jpg
+    news_images/25/10/30/photo__320.webp
+
+The widths that were produced are recorded on ImageDerivative and cached, which
+is what the `derivative_url` / `responsive_image` template tags read. Galleries
+resolve a whole page at once with the `image_variants` tag.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_WIDTHS = getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', (160, 320, 640, 1280))
+JPEG_QUALITY = 82
+WEBP_QUALITY = 78
+CACHE_TIMEOUT = 60 * 60 * 24
+
+# Image fields that get derivatives, as "app_label.ModelName": [field names]
+IMAGE_FIELDS = getattr(settings, 'IMAGE_DERIVATIVE_FIELDS', {
+    'bursary.Bursary': ['picture'],
+    'college.CollegeAndUniversities': ['picture'],
+    'photo.Photo': ['image'],
+    'job.Job': ['image'],
+    'main_app.NewsAndEvents': ['image'],
+    'main_app.Video': ['thumbnail'],
+})
+
+# Files shared by many rows are never processed or deleted
+SKIP_NAMES = {'default.png'}
+
+executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2),
+    thread_name_prefix='image-derivatives',
+)
+
+
+def cache_key(name):
+    return f'imgderiv:{name}'
+
+
+def derivative_name(name, width, fmt):
+    root, ext = os.path.splitext(name)
+    if fmt == 'webp':
+        ext = '.webp'
+    elif ext.lower() not in ('.jpg', '.jpeg', '.png'):
+        ext = '.jpg'
+    return f'{root}__{width}{ext}'
+
+
+#generation
+def _encode(img, fmt, original_format):
+    buffer = BytesIO()
+    if fmt == 'webp':
+        img.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+    elif original_format == 'PNG':
+        img.save(buffer, 'PNG', optimize=True)
+    else:
+        img.convert('RGB').save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def _write(storage, name, data):
+    # Derivative names are deterministic, replace any stale copy
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, ContentFile(data))
+
+
+def generate_derivatives(storage, name):
+    """Create every derivative of `name` and return {width: {format: stored name}}."""
+    from PIL import Image, ImageOps
+
+    from main_app.models import ImageDerivative
+
+    with storage.open(name, 'rb') as source:
+        original = Image.open(source)
+        original_format = original.format
+        original = ImageOps.exif_transpose(original)
+        original.load()
+
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'A' in original.getbands() else 'RGB')
+
+    variants = {}
+    for width in DERIVATIVE_WIDTHS:
+        if width >= original.width:
+            continue
+        height = round(original.height * width / original.width)
+        resized = original.resize((width, height), Image.LANCZOS)
+        variants[str(width)] = {
+            'original': _write(storage, derivative_name(name, width, 'original'),
+                               _encode(resized, 'original', original_format)),
+            'webp': _write(storage, derivative_name(name, width, 'webp'), _encode(resized, 'webp', original_format)),
+        }
+
+    ImageDerivative.objects.update_or_create(
+        source=name,
+        defaults={'width': original.width, 'height': original.height, 'variants': variants},
+    )
+    cache.set(cache_key(name), variants, CACHE_TIMEOUT)
+    return variants
+
+
+def _run(storage, name):
+    # Runs in an executor thread, which Django's request signals never clean up
+    close_old_connections()
+    try:
+        generate_derivatives(storage, name)
+    except Exception:
+        logger.exception("Could not generate image derivatives for %s", name)
+    finally:
+        close_old_connections()
+
+
+def schedule_derivatives(field_file):
+    """Queue derivative generation once the current transaction commits."""
+    if not field_file or field_file.name in SKIP_NAMES:
+        return
+    storage, name = field_file.storage, field_file.name
+    transaction.on_commit(lambda: executor.submit(_run, storage, name))
+
+
+def delete_derivatives(field_file):
+    from main_app.models import ImageDerivative
+
+    if not field_file or field_file.name in SKIP_NAMES:
+        return
+    record = ImageDerivative.objects.filter(source=field_file.name).first()
+    if record is None:
+        return
+    for formats in record.variants.values():
+        for stored in formats.values():
+            try:
+                field_file.storage.delete(stored)
+            except Exception:
+                logger.warning("Could not delete image derivative %s", stored)
+    record.delete()
+    cache.delete(cache_key(field_file.name))
+
+
+#lookup
+def get_variants(name):
+    if not name or name in SKIP_NAMES:
+        return {}
+    variants = cache.get(cache_key(name))
+    if variants is None:
+        from main_app.models import ImageDerivative
+
+        variants = (ImageDerivative.objects.filter(source=name)
+                    .values_list('variants', flat=True).first()) or {}
+        cache.set(cache_key(name), variants, CACHE_TIMEOUT)
+    return variants
+
+
+def get_variants_many(names):
+    """{name: variants} for many images: one cache round trip and at most one query for the misses."""
+    names = {name for name in names if name and name not in SKIP_NAMES}
+    if not names:
+        return {}
+    cached = cache.get_many([cache_key(name) for name in names])
+    found = {name: cached[cache_key(name)] for name in names if cache_key(name) in cached}
+    missing = names - set(found)
+    if missing:
+        from main_app.models import ImageDerivative
+
+        loaded = dict(ImageDerivative.objects.filter(source__in=missing).values_list('source', 'variants'))
+        loaded = {name: loaded.get(name) or {} for name in missing}
+        cache.set_many({cache_key(name): variants for name, variants in loaded.items()}, CACHE_TIMEOUT)
+        found.update(loaded)
+    return found
+
+
+def pick_width(variants, width):
+    """Smallest derivative at least `width` wide, or the largest one available."""
+    widths = sorted(int(w) for w in variants)
+    if not widths:
+        return None
+    for candidate in widths:
+        if candidate >= width:
+            return str(candidate)
+    return str(widths[-1])
+
+
+#signals
+def _stored_name(instance, field_name):
+    # Read the raw attribute so deferred fields are not fetched
+    value = instance.__dict__.get(field_name)
+    return getattr(value, 'name', value)
+
+
+def image_loaded(sender, instance, **kwargs):
+    for field_name in IMAGE_FIELDS.get(sender._meta.label, ()):
+        setattr(instance, f'_derivative_source_{field_name}', _stored_name(instance, field_name))
+
+
+def image_saving(sender, instance, raw=False, **kwargs):
+    """Note the fields given a new picture, before FileField.pre_save commits the upload."""
+    # An upload usually keeps its own name when stored, so comparing names after save misses it
+    if raw:
+        return
+    changed = set()
+    for field_name in IMAGE_FIELDS.get(sender._meta.label, ()):
+        if field_name not in instance.__dict__:
+            continue  # deferred, so not changed
+        field_file = getattr(instance, field_name)
+        if field_file and (not field_file._committed
+                           or getattr(instance, f'_derivative_source_{field_name}', None) != field_file.name):
+            changed.add(field_name)
+    instance._derivative_changed = changed
+
+
+def image_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    changed = getattr(instance, '_derivative_changed', set())
+    for field_name in IMAGE_FIELDS.get(sender._meta.label, ()):
+        name = _stored_name(instance, field_name)
+        if name and (created or field_name in changed):
+            setattr(instance, f'_derivative_source_{field_name}', name)
+            schedule_derivatives(getattr(instance, field_name))
+    instance._derivative_changed = set()
+
+
+def image_deleted(sender, instance, **kwargs):
+    for field_name in IMAGE_FIELDS.get(sender._meta.label, ()):
+        delete_derivatives(getattr(instance, field_name))
+
+
+def connect_signals():
+    for label in IMAGE_FIELDS:
+        try:
+            model = apps.get_model(label)
+        except LookupError:
+            continue
+        post_init.connect(image_loaded, sender=model, dispatch_uid=f'image_loaded:{label}')
+        pre_save.connect(image_saving, sender=model, dispatch_uid=f'image_saving:{label}')
+        post_save.connect(image_saved, sender=model, dispatch_uid=f'image_saved:{label}')
+        post_delete.connect(image_deleted, sender=model, dispatch_uid=f'image_deleted:{label}')
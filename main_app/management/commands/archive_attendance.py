@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.attendance_archive import archive_session, current_session_id, restore_session
+from main_app.models import (ArchivedAttendance, ArchivedAttendanceReport, Attendance, AttendanceReport,
+                             Session)
+
+
+class Command(BaseCommand):
+    help = ('Moves the attendance of finished sessions into the archive tables (or back with --restore), '
+            'so the live tables only hold the sessions in use.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--session', type=int, action='append', dest='sessions',
+                            help='Session id to move; repeat for several')
+        parser.add_argument('--older', action='store_true',
+                            help='Archive every session that started before the current one')
+        parser.add_argument('--restore', action='store_true', help='Move the sessions back to the live tables')
+        parser.add_argument('--force', action='store_true', help='Allow archiving the current session')
+        parser.add_argument('--batch-size', type=int, default=500, help='Attendance days moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only show what would move')
+
+    def handle(self, *args, **options):
+        current = current_session_id()
+        sessions = list(options['sessions'] or [])
+        if options['older']:
+            if current is None:
+                raise CommandError('There is no current session to compare with')
+            started = Session.objects.filter(pk=current).values_list('start_year', flat=True).first()
+            sessions += list(Session.objects.filter(start_year__lt=started).values_list('pk', flat=True))
+        if not sessions:
+            raise CommandError('Name sessions with --session, or use --older')
+        if current in sessions and not options['restore'] and not options['force']:
+            raise CommandError(f'Session {current} is the current session; use --force to archive it anyway')
+
+        days_model, reports_model = ((ArchivedAttendance, ArchivedAttendanceReport) if options['restore']
+                                     else (Attendance, AttendanceReport))
+        action = 'Restoring' if options['restore'] else 'Archiving'
+        for session_id in sorted(set(sessions)):
+            days = days_model.objects.filter(session_id=session_id).count()
+            rows = reports_model.objects.filter(attendance__session_id=session_id).count()
+            self.stdout.write(f"{action} session {session_id}: {days} days, {rows} report rows")
+            if options['dry_run'] or not days:
+                continue
+            started = time.perf_counter()
+            move = restore_session if options['restore'] else archive_session
+            moved_days, moved_rows = move(session_id, options['batch_size'])
+            self.stdout.write(f"  moved {moved_days} days and {moved_rows} report rows "
+                              f"in {time.perf_counter() - started:.1f}s")
+
+        self.stdout.write(f"Live tables: {Attendance.objects.count()} days, "
+                          f"{AttendanceReport.objects.count()} report rows. "
+                          f"Archive: {ArchivedAttendance.objects.count()} days, "
+                          f"{ArchivedAttendanceReport.objects.count()} report rows.")
@@ -0,0 +1,119 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app import mock_ai
+from main_app.management.commands.benchmark_load import percentile
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+class Command(BaseCommand):
+    help = ('Compares the WSGI (sync gunicorn workers) and ASGI (uvicorn workers) deployments under '
+            'concurrent load on a network-bound endpoint, reporting throughput and latency percentiles.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/', help='Path to request on each server')
+        parser.add_argument('--wsgi-url', help='Base URL of an already running WSGI server')
+        parser.add_argument('--asgi-url', help='Base URL of an already running ASGI server')
+        parser.add_argument('--workers', type=int, default=2, help='Worker processes per started server')
+        parser.add_argument('--concurrency', type=int, default=50, help='Concurrent clients')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per server')
+        parser.add_argument('--upstream-delay', type=float, default=0,
+                            help='Start a mock upstream answering after this many seconds and point '
+                                 'DEEPSEEK_API_URL of the started servers at it')
+        parser.add_argument('--json', dest='json_path', help='Write the results to this file')
+
+    def start_server(self, mode, env):
+        port = free_port()
+        command = [sys.executable, '-m', 'gunicorn', '--config', str(settings.BASE_DIR / 'gunicorn.conf.py'),
+                   '--bind', f'127.0.0.1:{port}', '--workers', str(self.workers), '--log-level', 'warning']
+        process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=dict(env, SERVER_MODE=mode))
+        self.processes.append(process)
+        if not wait_for_port(port):
+            raise CommandError(f'The {mode} server did not start')
+        return f'http://127.0.0.1:{port}'
+
+    def request(self, url):
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=60) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except OSError:
+            status = 0
+        return time.perf_counter() - started, status
+
+    def run_load(self, url, total, concurrency):
+        self.request(url)  # warm up imports and connections
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(self.request, [url] * total))
+        wall = time.perf_counter() - started
+        latencies = [elapsed * 1000 for elapsed, _ in samples]
+        return {
+            'url': url,
+            'requests': total,
+            'errors': sum(1 for _, status in samples if status == 0 or status >= 500),
+            'rps': round(total / wall, 1),
+            'p50_ms': round(percentile(latencies, 50), 1),
+            'p95_ms': round(percentile(latencies, 95), 1),
+            'p99_ms': round(percentile(latencies, 99), 1),
+        }
+
+    def handle(self, *args, **options):
+        self.workers = options['workers']
+        self.processes = []
+        env = dict(os.environ)
+        upstream = None
+        if options['upstream_delay']:
+            upstream = mock_ai.start(delay=options['upstream_delay'])
+            env['DEEPSEEK_API_URL'] = f'http://127.0.0.1:{upstream.server_port}/v1/chat/completions'
+
+        results = {}
+        try:
+            for mode in ('wsgi', 'asgi'):
+                base = options[f'{mode}_url'] or self.start_server(mode, env)
+                self.stdout.write(f"Loading {mode} at {base}{options['path']}...")
+                results[mode] = self.run_load(base.rstrip('/') + options['path'], options['requests'],
+                                              options['concurrency'])
+        finally:
+            for process in self.processes:
+                process.terminate()
+                process.wait(timeout=30)
+            if upstream:
+                upstream.shutdown()
+
+        self.stdout.write(f"{'mode':<6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for mode, row in results.items():
+            self.stdout.write(f"{mode:<6}{row['rps']:>10}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+                              f"{row['p99_ms']:>10}{row['errors']:>8}")
+        if options['json_path']:
+            with open(options['json_path'], 'w') as handle:
+                json.dump(results, handle, indent=2)
@@ -0,0 +1,113 @@
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import setup_test_environment
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = ('Load test a page with concurrent workers and report p50/p95/p99 latency. Run it once per '
+            'DATABASE_POOL_MODE (or against two deployments with --url) and compare with --baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/', help='Path to request in process')
+        parser.add_argument('--url', help='Absolute URL of a running server instead of the in-process client')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent workers')
+        parser.add_argument('--requests', type=int, default=400, help='Total requests')
+        parser.add_argument('--waves', type=int, default=4,
+                            help='Split the run into waves separated by --idle seconds')
+        parser.add_argument('--idle', type=float, default=0,
+                            help='Idle pause between waves, longer than a proxy idle timeout shows reconnects')
+        parser.add_argument('--json', dest='json_path', help='Write the results to this file')
+        parser.add_argument('--baseline', help='Results file of an earlier run to compare against')
+
+    def request_in_process(self, path):
+        # One client (and so one DB connection) per worker thread, like a gunicorn thread
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client(raise_request_exception=False)
+        started = time.perf_counter()
+        status = client.get(path, secure=True).status_code
+        return time.perf_counter() - started, status
+
+    def request_url(self, url):
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=30) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except OSError:
+            status = 0
+        return time.perf_counter() - started, status
+
+    def handle(self, *args, **options):
+        if options['url']:
+            target, call = options['url'], self.request_url
+        else:
+            setup_test_environment()
+            target, call = options['path'], self.request_in_process
+        self.local = threading.local()
+
+        waves = max(options['waves'], 1)
+        per_wave = max(options['requests'] // waves, 1)
+        latencies, errors = [], 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for wave in range(waves):
+                if wave and options['idle']:
+                    time.sleep(options['idle'])
+                for elapsed, status in pool.map(call, [target] * per_wave):
+                    latencies.append(elapsed * 1000)
+                    errors += status == 0 or status >= 500
+        if not options['url']:
+            connections.close_all()
+
+        db = settings.DATABASES['default']
+        result = {
+            'target': target,
+            'pool_mode': getattr(settings, 'DATABASE_POOL_MODE', ''),
+            'pooled': 'pool' in db.get('OPTIONS', {}),
+            'conn_max_age': db.get('CONN_MAX_AGE'),
+            'requests': len(latencies),
+            'errors': errors,
+            'p50_ms': round(percentile(latencies, 50), 1),
+            'p95_ms': round(percentile(latencies, 95), 1),
+            'p99_ms': round(percentile(latencies, 99), 1),
+            'max_ms': round(max(latencies), 1),
+            'mean_ms': round(statistics.mean(latencies), 1),
+        }
+        for key, value in result.items():
+            self.stdout.write(f"{key:<14}{value}")
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as handle:
+                json.dump(result, handle, indent=2)
+
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as handle:
+                    baseline = json.load(handle)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read baseline: {e}")
+            self.stdout.write(f"\n{'metric':<10}{'baseline':>12}{'now':>12}{'change':>10}")
+            for key in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms'):
+                old, new = baseline.get(key, 0), result[key]
+                change = f"{(new - old) / old * 100:+.0f}%" if old else '-'
+                self.stdout.write(f"{key:<10}{old:>12}{new:>12}{change:>10}")
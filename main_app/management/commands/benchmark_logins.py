@@ -0,0 +1,90 @@
+import json
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+from django.test.utils import setup_test_environment
+from django.urls import reverse
+
+from main_app.management.commands.benchmark_load import percentile
+from main_app.models import CustomUser
+
+PASSWORD = 'bench-password'
+
+
+class Command(BaseCommand):
+    help = ('Simulates a morning login storm: many concurrent logins through doLogin, each from its own IP, '
+            'with a share of unknown emails. Reports latency for known and unknown emails separately; '
+            'similar numbers mean the response time does not reveal which emails exist.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=1000, help='Total login attempts')
+        parser.add_argument('--workers', type=int, default=50, help='Concurrent clients')
+        parser.add_argument('--unknown', type=float, default=0.1, help='Share of attempts with an unknown email')
+        parser.add_argument('--json', dest='json_path', help='Write the results to this file')
+
+    def attempt(self, job):
+        index, email = job
+        # One client per attempt, as every learner has their own browser and address
+        client = Client(REMOTE_ADDR=f'10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}')
+        started = time.perf_counter()
+        response = client.post(self.url, {'email': email, 'password': PASSWORD}, secure=True)
+        elapsed = (time.perf_counter() - started) * 1000
+        connections.close_all()
+        return email.startswith('nobody'), elapsed, response.status_code, '_auth_user_id' in client.session
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        self.url = reverse('user_login')
+        total = options['logins']
+        unknown = int(total * options['unknown'])
+        tag = int(time.time())
+
+        # Committed, so the worker threads' connections can see them; removed at the end
+        hashed = make_password(PASSWORD)
+        users = CustomUser.objects.bulk_create([
+            CustomUser(email=f'Login-{tag}-{i}@Bench.example.com', first_name='Bench', last_name=str(i),
+                       user_type='3', gender='M', address='', password=hashed)
+            for i in range(total - unknown)
+        ], batch_size=1000)
+        # Mixed case on purpose: the form sends lower case, the lookup must still match
+        jobs = [(i, user.email.lower()) for i, user in enumerate(users)]
+        jobs += [(len(jobs) + i, f'nobody-{tag}-{i}@bench.example.com') for i in range(unknown)]
+        random.shuffle(jobs)
+
+        self.stdout.write(f"{total} logins ({unknown} unknown emails) with {options['workers']} workers...")
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                samples = list(pool.map(self.attempt, jobs))
+        finally:
+            CustomUser.objects.filter(email__startswith=f'Login-{tag}-').delete()
+        wall = time.perf_counter() - started
+
+        known_ms = [ms for is_unknown, ms, _, _ in samples if not is_unknown]
+        unknown_ms = [ms for is_unknown, ms, _, _ in samples if is_unknown]
+        result = {
+            'logins': total,
+            'logged_in': sum(1 for is_unknown, _, _, ok in samples if ok and not is_unknown),
+            'errors': sum(1 for _, _, status, _ in samples if status >= 500),
+            'per_second': round(total / wall, 1),
+        }
+        for label, values in (('known', known_ms), ('unknown', unknown_ms)):
+            if values:
+                result.update({
+                    f'{label}_p50_ms': round(percentile(values, 50), 1),
+                    f'{label}_p95_ms': round(percentile(values, 95), 1),
+                    f'{label}_p99_ms': round(percentile(values, 99), 1),
+                    f'{label}_mean_ms': round(statistics.mean(values), 1),
+                })
+        for key, value in result.items():
+            self.stdout.write(f"{key:<18}{value}")
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as handle:
+                json.dump(result, handle, indent=2)
@@ -0,0 +1,97 @@
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import update_last_login
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.test.utils import CaptureQueriesContext
+
+from main_app import profiles
+from main_app.models import CustomUser
+
+
+class Rollback(Exception):
+    pass
+
+
+#the receivers profiles.py replaced, kept here to measure against
+def legacy_create_user_profile(sender, instance, created, **kwargs):
+    if created:
+        model = profiles.profile_model(instance.user_type)
+        if model is not None:
+            model.objects.create(admin=instance)
+
+
+def legacy_save_user_profile(sender, instance, **kwargs):
+    model = profiles.profile_model(instance.user_type)
+    if model is not None:
+        getattr(instance, profiles.accessor(model)).save()
+
+
+def count(queries):
+    writes = sum(1 for q in queries if q['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')))
+    return len(queries), writes
+
+
+class Command(BaseCommand):
+    help = ('Counts the queries and writes caused by user saves (create, login, profile edit, password '
+            'change) with the old post_save profile receivers and with main_app.profiles.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Users per role type measured')
+
+    def scenarios(self, users, password):
+        """{scenario: (queries, writes)} summed over all users."""
+        totals = {}
+
+        def measure(name, action):
+            with CaptureQueriesContext(connection) as ctx:
+                action()
+            queries, writes = count(ctx.captured_queries)
+            old = totals.get(name, (0, 0))
+            totals[name] = (old[0] + queries, old[1] + writes)
+
+        for i, user_type in enumerate(users):
+            email = f'profile-bench-{self.run}-{i}@bench.example.com'
+            created = []
+            measure('create', lambda: created.append(CustomUser.objects.create_user(
+                email=email, password=None, user_type=user_type, first_name='Bench', last_name=str(i))))
+            # Fresh copy, as a request would load it
+            user = CustomUser.objects.get(pk=created[0].pk)
+            measure('login', lambda: update_last_login(None, user))
+            user.first_name = 'Edited'
+            measure('profile edit', user.save)
+            user.password = password
+            measure('password change', user.save)
+        return totals
+
+    def run_mode(self, mode, users, password):
+        self.run = mode
+        try:
+            with transaction.atomic():
+                if mode == 'legacy':
+                    post_save.connect(legacy_create_user_profile, sender=CustomUser, dispatch_uid='bench_create')
+                    post_save.connect(legacy_save_user_profile, sender=CustomUser, dispatch_uid='bench_save')
+                    with profiles.disabled():
+                        totals = self.scenarios(users, password)
+                else:
+                    totals = self.scenarios(users, password)
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            post_save.disconnect(sender=CustomUser, dispatch_uid='bench_create')
+            post_save.disconnect(sender=CustomUser, dispatch_uid='bench_save')
+        return totals
+
+    def handle(self, *args, **options):
+        users = [user_type for user_type in profiles.PROFILE_MODELS for _ in range(options['users'])]
+        password = make_password('bench-password')
+        results = {mode: self.run_mode(mode, users, password) for mode in ('legacy', 'registry')}
+
+        self.stdout.write(f"{len(users)} users across {len(profiles.PROFILE_MODELS)} roles, per user:")
+        self.stdout.write(f"{'scenario':<18}{'legacy q/w':>14}{'now q/w':>12}{'writes saved':>14}")
+        for scenario in results['legacy']:
+            (old_q, old_w), (new_q, new_w) = results['legacy'][scenario], results['registry'][scenario]
+            n = len(users)
+            self.stdout.write(f"{scenario:<18}{f'{old_q / n:.1f}/{old_w / n:.1f}':>14}"
+                              f"{f'{new_q / n:.1f}/{new_w / n:.1f}':>12}{(old_w - new_w) / n:>14.1f}")
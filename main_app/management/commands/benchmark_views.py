@@ -0,0 +1,149 @@
+import json
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment
+from django.urls import reverse
+
+from main_app.db_routers import use_database
+from main_app.profiling import profile_queries
+from main_app.synthetic import generate
+
+# label: (url name, role that requests it, kwargs builder)
+BENCHMARKS = {
+    'admin_home': ('admin_home', 'hod', None),
+    'staff_home': ('staff_home', 'staff', None),
+    'student_home': ('student_home', 'student', None),
+    'educator_home': ('educator_home', 'educator', None),
+    'principal_home': ('principal_home', 'principal', None),
+    'parent_home': ('parent_home', 'parent', None),
+    'circuit_manager_home': ('circuit_manager_home', 'circuit_manager', None),
+    'index_view': ('index', None, None),
+    'general_search_view': ('general_search_view', None, None),
+    'result_sheet_pdf': ('result_sheet_pdf_view', 'hod', lambda data: {'id': data['courses'][0].pk}),
+}
+
+# Default per-view budgets at 1x data; override with BENCHMARK_BUDGETS in settings
+DEFAULT_BUDGET = {'queries': 100, 'ms': 2000, 'peak_kb': 50 * 1024}
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks the role dashboards and reports on synthetic data at several scales, '
+            'recording queries, wall time and peak memory. Exits non-zero on a budget or scaling regression. '
+            'Runs against freshly created test databases, never the configured ones.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='1,10,100', help='Comma separated data scales')
+        parser.add_argument('--views', default='', help='Comma separated benchmark labels (default: all)')
+        parser.add_argument('--repeat', type=int, default=3, help='Requests per view, the fastest is kept')
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help='Allowed slack over linear growth of time and memory between scales (0.5 = 50%%)')
+        parser.add_argument('--query-slack', type=int, default=5,
+                            help='Extra queries allowed at larger scales; query counts must not grow with the data')
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this file')
+
+    def measure(self, client, url):
+        # Warm-up: imports, template compilation and caches are not what is being measured
+        client.get(url, secure=True)
+        best = None
+        for _ in range(self.repeat):
+            tracemalloc.start()
+            started = time.perf_counter()
+            with profile_queries() as profile:
+                response = client.get(url, secure=True)
+            elapsed = (time.perf_counter() - started) * 1000
+            peak = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+            run = {'status': response.status_code, 'queries': profile.queries, 'ms': round(elapsed, 1),
+                   'db_ms': round(profile.db_time * 1000, 1), 'peak_kb': round(peak),
+                   'duplicates': len(profile.duplicates(3))}
+            if best is None or run['ms'] < best['ms']:
+                best = run
+        return best
+
+    def run_scale(self, scale, labels):
+        results = {}
+        try:
+            # Replicas cannot see the uncommitted synthetic rows, so every read stays on the primary
+            with use_database('default'), transaction.atomic():
+                self.stdout.write(f"Generating data at {scale}x...")
+                data = generate(scale)
+                self.stdout.write(f"  {data['rows']}")
+                for label in labels:
+                    url_name, role, kwargs_for = BENCHMARKS[label]
+                    client = Client(raise_request_exception=False)
+                    if role:
+                        client.force_login(data['users'][role])
+                    url = reverse(url_name, kwargs=kwargs_for(data) if kwargs_for else None)
+                    if label == 'general_search_view':
+                        url += '?q=School'
+                    results[label] = self.measure(client, url)
+                raise Rollback
+        except Rollback:
+            pass
+        return results
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        scales = sorted(int(s) for s in options['scales'].split(',') if s)
+        labels = [v for v in options['views'].split(',') if v] or list(BENCHMARKS)
+        unknown = set(labels) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+        self.repeat = max(options['repeat'], 1)
+        budgets = getattr(settings, 'BENCHMARK_BUDGETS', {})
+
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            all_results = {scale: self.run_scale(scale, labels) for scale in scales}
+        finally:
+            runner.teardown_databases(old_config)
+
+        failures = []
+        base_scale = scales[0]
+        header = f"{'view':<24}{'scale':>6}{'status':>8}{'queries':>9}{'ms':>10}{'db ms':>10}{'peak KB':>10}"
+        self.stdout.write(header)
+        for label in labels:
+            budget = dict(DEFAULT_BUDGET, **budgets.get(label, {}))
+            base = all_results[base_scale][label]
+            for scale in scales:
+                row = all_results[scale][label]
+                self.stdout.write(f"{label:<24}{scale:>6}{row['status']:>8}{row['queries']:>9}"
+                                  f"{row['ms']:>10}{row['db_ms']:>10}{row['peak_kb']:>10}")
+                if row['status'] >= 500:
+                    failures.append(f"{label} @{scale}x returned {row['status']}")
+                if scale == base_scale:
+                    for metric in ('queries', 'ms', 'peak_kb'):
+                        if row[metric] > budget[metric]:
+                            failures.append(f"{label} @{scale}x {metric}={row[metric]} over budget {budget[metric]}")
+                    continue
+                # A view's query count must not depend on the data (N+1 and friends)
+                if row['queries'] - base['queries'] > options['query_slack']:
+                    failures.append(f"{label} queries grew from {base['queries']} to {row['queries']} "
+                                    f"from {base_scale}x to {scale}x data")
+                # Time and memory growing faster than the data itself is a scaling regression
+                allowed = (scale / base_scale) * (1 + options['tolerance'])
+                for metric in ('ms', 'peak_kb'):
+                    if base[metric] and row[metric] / base[metric] > allowed:
+                        failures.append(f"{label} {metric} grew {row[metric] / base[metric]:.1f}x "
+                                        f"from {base_scale}x to {scale}x data")
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as handle:
+                json.dump({'results': all_results, 'failures': failures}, handle, indent=2)
+
+        if failures:
+            for failure in failures:
+                self.stdout.write(self.style.ERROR(failure))
+            raise CommandError(f"{len(failures)} benchmark regressions")
+        self.stdout.write(self.style.SUCCESS("All benchmarks within budget."))
@@ -0,0 +1,96 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from main_app.models import Attendance, AttendanceReport, StudentResult
+from main_app.synthetic import generate
+
+# label: queryset builder over the synthetic data, mirroring the filters the views run
+HOT_QUERIES = {
+    'attendance_by_subject_date': lambda d: Attendance.objects.filter(
+        subject=d['subjects'][0], date=d['attendance_date']),
+    'attendance_session_lookup': lambda d: Attendance.objects.filter(
+        session=d['session'], subject=d['subjects'][0], grade=d['subjects'][0].grade_id,
+        date=d['attendance_date']),
+    'student_attendance_status': lambda d: AttendanceReport.objects.filter(
+        student=d['students'][0], status=True),
+    'student_absences': lambda d: AttendanceReport.objects.filter(student=d['students'][0], status=False),
+    'attendance_report_for_student': lambda d: AttendanceReport.objects.filter(
+        attendance__subject=d['subjects'][0], attendance__date=d['attendance_date'], student=d['students'][0]),
+    'results_by_course': lambda d: StudentResult.objects.filter(student__course=d['courses'][0]),
+}
+
+# Models whose Meta.indexes are dropped for the "before" run
+INDEXED_MODELS = (Attendance, AttendanceReport, StudentResult)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Runs EXPLAIN for the hot attendance and result queries on synthetic data, with and '
+            'without the composite indexes, and prints the plans and timings side by side.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=10, help='Synthetic data scale')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query, the fastest is kept')
+        parser.add_argument('--plans', action='store_true', help='Print the full plans')
+
+    def analyze_tables(self):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                for model in INDEXED_MODELS:
+                    cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+        elif connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def run_queries(self, data, repeat):
+        results = {}
+        analyze = connection.vendor == 'postgresql'
+        for label, build in HOT_QUERIES.items():
+            queryset = build(data)
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                elapsed = (time.perf_counter() - started) * 1000
+                best = elapsed if best is None else min(best, elapsed)
+            plan = queryset.explain(analyze=True) if analyze else queryset.explain()
+            results[label] = {'ms': round(best, 2), 'plan': plan}
+        return results
+
+    def handle(self, *args, **options):
+        repeat = max(options['repeat'], 1)
+        try:
+            with transaction.atomic():
+                self.stdout.write(f"Generating data at {options['scale']}x...")
+                data = generate(options['scale'])
+                data['attendance_date'] = Attendance.objects.filter(session=data['session']).values_list(
+                    'date', flat=True).first()
+                self.stdout.write(f"  {data['rows']}")
+                self.analyze_tables()
+                after = self.run_queries(data, repeat)
+
+                # Drop the composite indexes and measure again, the rollback restores them.
+                # Plain DROP INDEX since the SQLite schema editor refuses to run inside atomic()
+                with connection.cursor() as cursor:
+                    for model in INDEXED_MODELS:
+                        for index in model._meta.indexes:
+                            cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
+                self.analyze_tables()
+                before = self.run_queries(data, repeat)
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(f"{'query':<32}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+        for label in HOT_QUERIES:
+            old, new = before[label], after[label]
+            speedup = old['ms'] / new['ms'] if new['ms'] else 0
+            self.stdout.write(f"{label:<32}{old['ms']:>12}{new['ms']:>12}{speedup:>9.1f}x")
+            if options['plans']:
+                self.stdout.write("  before:\n    " + old['plan'].replace('\n', '\n    '))
+                self.stdout.write("  after:\n    " + new['plan'].replace('\n', '\n    '))
@@ -0,0 +1,40 @@
+import resource
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.exports import EXPORTS, FILTERS, csv_chunks, write_xlsx
+
+
+class Command(BaseCommand):
+    help = ('Writes an export (the same as the download endpoints) to a file and reports the time taken and '
+            'the peak memory of the process, which should not grow with the number of rows.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(EXPORTS))
+        parser.add_argument('output', help='File to write; .xlsx for a workbook, anything else for CSV')
+        for name in FILTERS:
+            parser.add_argument(f'--{name}', type=int, help=f'Only this {name} (id)')
+        parser.add_argument('--chunk-size', type=int, help='Rows per fetch (default EXPORT_CHUNK_SIZE)')
+
+    def handle(self, *args, **options):
+        export = EXPORTS[options['name']]
+        params = {name: options[name] for name in FILTERS if options[name] is not None}
+        started = time.perf_counter()
+        try:
+            if options['output'].endswith('.xlsx'):
+                with open(options['output'], 'wb') as handle:
+                    count = write_xlsx(export, params, handle, options['chunk_size'])
+            else:
+                count = -1  # the header line
+                with open(options['output'], 'w', encoding='utf-8', newline='') as handle:
+                    for line in csv_chunks(export, params, options['chunk_size']):
+                        handle.write(line)
+                        count += 1
+        except ImportError as e:
+            raise CommandError(f'{e}; install XlsxWriter for .xlsx exports')
+
+        # ru_maxrss is in kilobytes on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(f"{count} rows to {options['output']} in {time.perf_counter() - started:.1f}s, "
+                          f"peak memory {peak:.0f} MB")
@@ -0,0 +1,37 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from main_app.imaging import IMAGE_FIELDS, SKIP_NAMES, generate_derivatives
+from main_app.models import ImageDerivative
+
+
+class Command(BaseCommand):
+    help = 'Generates thumbnails and WebP variants for images uploaded before derivatives existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate images that already have derivatives')
+
+    def handle(self, *args, **options):
+        done = set()
+        if not options['force']:
+            done = set(ImageDerivative.objects.values_list('source', flat=True))
+
+        count = 0
+        for label, field_names in IMAGE_FIELDS.items():
+            model = apps.get_model(label)
+            for field_name in field_names:
+                names = (model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                         .values_list(field_name, flat=True).distinct())
+                for name in names.iterator():
+                    if name in done or name in SKIP_NAMES:
+                        continue
+                    field_file = getattr(model(**{field_name: name}), field_name)
+                    try:
+                        generate_derivatives(field_file.storage, name)
+                        done.add(name)
+                        count += 1
+                        self.stdout.write(self.style.SUCCESS(f"Processed: {name}"))
+                    except Exception as e:
+                        self.stdout.write(self.style.ERROR(f"Failed to process {name}: {e}"))
+
+        self.stdout.write(self.style.SUCCESS(f"Done! {count} images processed."))
@@ -0,0 +1,156 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Packages that should only load on the code paths that need them
+LAZY_PACKAGES = ('pandas', 'numpy', 'reportlab', 'PIL', 'matplotlib', 'openpyxl', 'xlsxwriter')
+
+# What a worker imports before it can serve its first request
+STARTUP_SCRIPT = '''
+import sys
+from importlib import import_module
+import django
+django.setup()
+for name in sys.argv[1:]:
+    import_module(name)
+'''
+
+LINE_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+
+def parse_importtime(output):
+    """[(module, self us, cumulative us, depth)] from `python -X importtime` stderr, in print order."""
+    rows = []
+    for line in output.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            self_us, cumulative, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative), (len(indent) - 1) // 2))
+    return rows
+
+
+def import_chain(rows, index):
+    """Modules that imported rows[index], outermost first. Parents print after their children."""
+    chain = [rows[index][0]]
+    depth = rows[index][3]
+    for name, _, _, row_depth in rows[index + 1:]:
+        if row_depth < depth:
+            chain.append(name)
+            depth = row_depth
+    return list(reversed(chain))
+
+
+class Command(BaseCommand):
+    help = ('Profiles what a worker imports at startup with `python -X importtime`, grouped by app and '
+            'package, and times cold starts. --check fails if a heavy package is loaded at startup.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('modules', nargs='*',
+                            help='Modules to import after django.setup() (default: the server entry point '
+                                 'for SERVER_MODE and ROOT_URLCONF)')
+        parser.add_argument('--runs', type=int, default=5, help='Cold starts to time')
+        parser.add_argument('--top', type=int, default=15, help='Rows to show per table')
+        parser.add_argument('--check', action='store_true',
+                            help=f"Exit with an error if any of {', '.join(LAZY_PACKAGES)} loads at startup")
+        parser.add_argument('--json', dest='json_path', help='Write the results to this file')
+        parser.add_argument('--baseline', help='Results file of an earlier run to compare against')
+
+    def run_startup(self, modules, importtime=False):
+        command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', STARTUP_SCRIPT]
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        started = time.perf_counter()
+        process = subprocess.run(command + modules, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        elapsed = time.perf_counter() - started
+        if process.returncode:
+            raise CommandError(f"Startup failed:\n{process.stderr[-2000:]}")
+        return elapsed, process.stderr
+
+    def owner(self, module):
+        """The installed app a module belongs to, else its top-level package."""
+        best = None
+        for app_name in self.app_names:
+            if (module == app_name or module.startswith(app_name + '.')) and len(app_name) > len(best or ''):
+                best = app_name
+        return best or module.split('.')[0]
+
+    def handle(self, *args, **options):
+        mode = getattr(settings, 'SERVER_MODE', 'asgi')
+        modules = options['modules'] or [f'school.{mode}', settings.ROOT_URLCONF]
+        self.app_names = [config.name for config in apps.get_app_configs()]
+
+        # One untimed run so .pyc files exist and the timed runs measure imports, not compiling
+        self.run_startup(modules)
+        timings = [self.run_startup(modules)[0] * 1000 for _ in range(max(options['runs'], 1))]
+        _, stderr = self.run_startup(modules, importtime=True)
+        rows = parse_importtime(stderr)
+        if not rows:
+            raise CommandError('No -X importtime output, is this CPython 3.7 or later?')
+
+        by_owner = defaultdict(lambda: [0, 0])
+        for name, self_us, _, _ in rows:
+            by_owner[self.owner(name)][0] += self_us
+            by_owner[self.owner(name)][1] += 1
+        owners = sorted(by_owner.items(), key=lambda item: -item[1][0])
+        slowest = sorted(rows, key=lambda row: -row[2])
+
+        heavy = {}
+        for index, (name, _, cumulative, _) in enumerate(rows):
+            package = name.split('.')[0]
+            if package in LAZY_PACKAGES and package not in heavy and name == package:
+                heavy[package] = {'ms': round(cumulative / 1000, 1), 'via': import_chain(rows, index)}
+
+        result = {
+            'modules': modules,
+            'cold_start_ms': round(statistics.median(timings), 1),
+            'cold_start_min_ms': round(min(timings), 1),
+            'import_ms': round(sum(row[1] for row in rows) / 1000, 1),
+            'module_count': len(rows),
+            'by_app': {owner: {'self_ms': round(us / 1000, 1), 'modules': count} for owner, (us, count) in owners},
+            'heavy': heavy,
+        }
+
+        self.stdout.write(f"Startup imports {', '.join(modules)}")
+        self.stdout.write(f"cold start    {result['cold_start_ms']} ms median, {result['cold_start_min_ms']} ms best "
+                          f"of {len(timings)}")
+        self.stdout.write(f"imports       {result['import_ms']} ms in {result['module_count']} modules\n")
+
+        self.stdout.write(f"{'app / package':<40}{'self ms':>10}{'modules':>9}")
+        for owner, (us, count) in owners[:options['top']]:
+            self.stdout.write(f"{owner:<40}{us / 1000:>10.1f}{count:>9}")
+
+        self.stdout.write(f"\n{'module':<50}{'cumulative ms':>14}")
+        for name, _, cumulative, _ in slowest[:options['top']]:
+            self.stdout.write(f"{name:<50}{cumulative / 1000:>14.1f}")
+
+        if heavy:
+            self.stdout.write('\nHeavy packages loaded at startup:')
+            for package, info in heavy.items():
+                self.stdout.write(f"  {package} ({info['ms']} ms) via {' -> '.join(info['via'])}")
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as handle:
+                json.dump(result, handle, indent=2)
+
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as handle:
+                    baseline = json.load(handle)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read baseline: {e}")
+            self.stdout.write(f"\n{'metric':<18}{'baseline':>12}{'now':>12}{'change':>10}")
+            for key in ('cold_start_ms', 'cold_start_min_ms', 'import_ms', 'module_count'):
+                old, new = baseline.get(key, 0), result[key]
+                change = f"{(new - old) / old * 100:+.0f}%" if old else '-'
+                self.stdout.write(f"{key:<18}{old:>12}{new:>12}{change:>10}")
+
+        if options['check'] and heavy:
+            raise CommandError(f"Loaded at startup: {', '.join(heavy)}. Import them inside the views that use them.")
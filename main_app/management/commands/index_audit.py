@@ -0,0 +1,146 @@
+import json
+import re
+from collections import Counter, defaultdict
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models
+
+from main_app.profiling import query_shape
+
+_COLUMN = r'"(\w+)"\."(\w+)"'
+_WHERE_RE = re.compile(r'\bWHERE\b(.*?)(?:\bGROUP BY\b|\bORDER BY\b|\bLIMIT\b|\bOFFSET\b|$)', re.I | re.S)
+_ORDER_RE = re.compile(r'\bORDER BY\b(.*?)(?:\bLIMIT\b|\bOFFSET\b|$)', re.I | re.S)
+_PREDICATE_RE = re.compile(_COLUMN + r'\s*(=|IN\b|IS\b|<=|>=|<>|!=|<|>|BETWEEN\b|LIKE\b)?', re.I)
+_EQUALITY_OPS = {'=', 'IN', 'IS', ''}
+
+
+def read_shapes(path):
+    """
+    Query shapes with their call counts from a capture file. Each line is one of:
+    a QueryProfilerMiddleware log line (uses its "duplicates"), a JSON object
+    with "sql"/"shape"/"query" and "count"/"calls" (e.g. a pg_stat_statements
+    export), or plain SQL.
+    """
+    shapes = Counter()
+    with open(path) as handle:
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            start = line.find('{')
+            try:
+                record = json.loads(line[start:]) if start >= 0 else None
+            except ValueError:
+                record = None
+            if isinstance(record, dict):
+                for shape, count in record.get('duplicates', []):
+                    shapes[query_shape(shape)] += count
+                sql = record.get('sql') or record.get('shape') or record.get('query')
+                if sql:
+                    shapes[query_shape(sql)] += int(record.get('count') or record.get('calls') or 1)
+            elif line.upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                shapes[query_shape(line)] += 1
+    return shapes
+
+
+def read_pg_stat_statements(limit):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT query, calls FROM pg_stat_statements ORDER BY total_exec_time DESC LIMIT %s', [limit])
+        return Counter({query_shape(query): calls for query, calls in cursor.fetchall()})
+
+
+def table_models():
+    return {model._meta.db_table: model for model in apps.get_models()}
+
+
+def existing_indexes(model):
+    """Column lists of every index Django creates for `model`."""
+    meta = model._meta
+    columns = {field.name: field.column for field in meta.concrete_fields}
+    indexes = [[field.column] for field in meta.concrete_fields
+               if field.primary_key or field.unique or field.db_index]
+    for fields in meta.unique_together:
+        indexes.append([columns[name] for name in fields])
+    for index in meta.indexes:
+        indexes.append([columns[name.lstrip('-')] for name in index.fields])
+    for constraint in meta.constraints:
+        if getattr(constraint, 'fields', None):
+            indexes.append([columns[name] for name in constraint.fields])
+    return indexes
+
+
+def is_covered(wanted, indexes):
+    """True if some index starts with the wanted columns (equality columns in any order)."""
+    return any(set(index[:len(wanted)]) == set(wanted) for index in indexes)
+
+
+def parse_shape(shape):
+    """{table: (equality columns, range columns, order columns)} for one query shape."""
+    tables = defaultdict(lambda: ([], [], []))
+    where = _WHERE_RE.search(shape)
+    if where:
+        for table, column, op in _PREDICATE_RE.findall(where.group(1)):
+            bucket = tables[table][0] if (op or '').upper() in _EQUALITY_OPS else tables[table][1]
+            if column not in bucket:
+                bucket.append(column)
+    order = _ORDER_RE.search(shape)
+    if order:
+        for table, column in re.findall(_COLUMN, order.group(1)):
+            if column not in tables[table][2]:
+                tables[table][2].append(column)
+    return tables
+
+
+class Command(BaseCommand):
+    help = ('Reads captured query shapes (profiler logs, SQL or pg_stat_statements) and suggests '
+            'composite indexes for filters that no existing index covers.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='Capture files to read')
+        parser.add_argument('--pg-stat-statements', action='store_true',
+                            help='Also read the top statements from pg_stat_statements')
+        parser.add_argument('--limit', type=int, default=500, help='Statements to read from pg_stat_statements')
+        parser.add_argument('--min-calls', type=int, default=10, help='Ignore shapes seen fewer times')
+
+    def handle(self, *args, **options):
+        shapes = Counter()
+        for path in options['paths']:
+            shapes.update(read_shapes(path))
+        if options['pg_stat_statements']:
+            if connection.vendor != 'postgresql':
+                raise CommandError('pg_stat_statements needs PostgreSQL')
+            shapes.update(read_pg_stat_statements(options['limit']))
+        if not shapes:
+            raise CommandError('No query shapes to audit, pass a capture file or --pg-stat-statements')
+
+        by_table = table_models()
+        suggestions = Counter()
+        for shape, calls in shapes.items():
+            if calls < options['min_calls']:
+                continue
+            for table, (equality, ranges, order) in parse_shape(shape).items():
+                model = by_table.get(table)
+                if model is None or model._meta.proxy:
+                    continue
+                # Equality columns first, then one range or sort column the index can still use
+                wanted = equality + (ranges[:1] or [c for c in order if c not in equality][:1])
+                if not wanted or is_covered(wanted, existing_indexes(model)):
+                    continue
+                suggestions[(model, tuple(wanted))] += calls
+
+        if not suggestions:
+            self.stdout.write(self.style.SUCCESS('Every frequent filter is covered by an existing index.'))
+            return
+
+        for (model, columns), calls in suggestions.most_common():
+            by_column = {field.column: field for field in model._meta.concrete_fields}
+            fields = [by_column[c].name if c in by_column else c for c in columns]
+            name = f"{model._meta.model_name[:12]}_{'_'.join(f[:6] for f in fields)}"[:26] + '_idx'
+            self.stdout.write(f"{model._meta.label} ({calls} calls)")
+            self.stdout.write(f"    models.Index(fields={fields!r}, name={name!r}),")
+            last = by_column.get(columns[-1])
+            if isinstance(last, models.BooleanField) and len(fields) > 1:
+                self.stdout.write("    # or a partial index when one value dominates the filter:")
+                self.stdout.write(f"    models.Index(fields={fields[:-1]!r}, condition=Q({fields[-1]}=False), "
+                                  f"name={name[:21] + '_part_idx'!r}),")
@@ -1,32 +1,206 @@
+import hashlib
+import json
+import mimetypes
 import os
-from django.core.management.base import BaseCommand
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
 from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+MB = 1024 * 1024
+
+
+def file_md5(path, chunk_size=None):
+    """
+    Return the ETag S3 will report for `path`: the plain md5 for single-part
+    uploads, or md5-of-part-md5s with a "-N" suffix for multipart uploads.
+    """
+    whole = hashlib.md5()
+    parts = []
+    with open(path, 'rb') as handle:
+        while True:
+            block = handle.read(chunk_size or 8 * MB)
+            if not block:
+                break
+            whole.update(block)
+            if chunk_size:
+                parts.append(hashlib.md5(block).digest())
+    if chunk_size and len(parts) > 1:
+        return f'{hashlib.md5(b"".join(parts)).hexdigest()}-{len(parts)}'
+    return whole.hexdigest()
+
+
+class Manifest:
+    """
+    Append-only JSON lines file, one record per finished (or failed) file.
+    The last record for a path wins, so reruns resume where they stopped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as handle:
+                for line in handle:
+                    line = line.strip()
+                    if line:
+                        record = json.loads(line)
+                        self.records[record['path']] = record
+
+    def is_done(self, relative_path, size, mtime):
+        record = self.records.get(relative_path)
+        return bool(record and record['status'] == 'done'
+                    and record['size'] == size and record.get('mtime') == mtime)
+
+    def write(self, record):
+        with self.lock:
+            self.records[record['path']] = record
+            with open(self.path, 'a') as handle:
+                handle.write(json.dumps(record) + '\n')
+
 
 class Command(BaseCommand):
     help = 'Uploads all local media files to S3 preserving folder structure'
 
-    def handle(self, *args, **options):
-        # Update this path to your local media root
-        LOCAL_MEDIA_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))), 'static/mediafiles')
+    def add_arguments(self, parser):
+        default_root = os.path.join(settings.BASE_DIR, 'static', 'mediafiles')
+        parser.add_argument('--source', default=default_root, help='Local media root to upload')
+        parser.add_argument('--workers', type=int, default=8, help='Files uploaded concurrently')
+        parser.add_argument('--multipart-threshold', type=int, default=16,
+                            help='Files larger than this many MB use multipart transfer')
+        parser.add_argument('--chunk-size', type=int, default=8, help='Multipart chunk size in MB')
+        parser.add_argument('--manifest', default=os.path.join(settings.BASE_DIR, 'media_migration_manifest.jsonl'),
+                            help='Progress manifest used to resume interrupted runs')
+        parser.add_argument('--no-verify', action='store_true', help='Skip the HEAD check after each upload')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be uploaded')
+        parser.add_argument('--throughput', type=float, default=10.0,
+                            help='Assumed upload speed in MB/s for the dry-run estimate')
 
+    #s3 helpers
+    def object_for(self, relative_path):
+        bucket = getattr(default_storage, 'bucket', None)
+        if bucket is None:
+            return None
+        key = default_storage._normalize_name(relative_path.replace(os.sep, '/'))
+        return bucket.Object(key)
 
-        if not os.path.exists(LOCAL_MEDIA_ROOT):
-            self.stdout.write(self.style.ERROR(f"Local media root does not exist: {LOCAL_MEDIA_ROOT}"))
+    def remote_state(self, relative_path):
+        """(size, etag) of the uploaded object, or None when it is missing."""
+        obj = self.object_for(relative_path)
+        if obj is None:
+            if default_storage.exists(relative_path):
+                return default_storage.size(relative_path), None
+            return None
+        try:
+            obj.load()  # HEAD request
+        except Exception:
+            return None
+        return obj.content_length, obj.e_tag.strip('"')
+
+    def upload(self, local_path, relative_path, size):
+        obj = self.object_for(relative_path)
+        if obj is None:
+            with open(local_path, 'rb') as file_data:
+                default_storage.save(relative_path, file_data)
             return
+        from boto3.s3.transfer import TransferConfig
+
+        config = TransferConfig(
+            multipart_threshold=self.multipart_threshold,
+            multipart_chunksize=self.chunk_size,
+            max_concurrency=4,
+            use_threads=True,
+        )
+        content_type = mimetypes.guess_type(local_path)[0] or 'application/octet-stream'
+        obj.upload_file(local_path, ExtraArgs={'ContentType': content_type}, Config=config)
+
+    #per-file work
+    def migrate_file(self, local_path, relative_path, size, mtime):
+        # boto3 goes multipart from the threshold itself, not just above it
+        chunk = self.chunk_size if size >= self.multipart_threshold else None
+        etag = file_md5(local_path, chunk)
+        record = {'path': relative_path, 'size': size, 'mtime': mtime, 'etag': etag}
+
+        remote = self.remote_state(relative_path)
+        if remote and remote[0] == size and (remote[1] is None or remote[1] == etag):
+            record['status'] = 'done'
+            record['skipped'] = True
+            return record
 
-        self.stdout.write(f"Starting migration from {LOCAL_MEDIA_ROOT} to S3...")
+        self.upload(local_path, relative_path, size)
 
-        count = 0
-        for root, dirs, files in os.walk(LOCAL_MEDIA_ROOT):
+        if self.verify:
+            remote = self.remote_state(relative_path)
+            if not remote or remote[0] != size or (remote[1] is not None and remote[1] != etag):
+                record['status'] = 'failed'
+                record['error'] = f'verification failed: remote={remote}'
+                return record
+        record['status'] = 'done'
+        return record
+
+    def handle(self, *args, **options):
+        local_media_root = options['source']
+        if not os.path.exists(local_media_root):
+            self.stdout.write(self.style.ERROR(f"Local media root does not exist: {local_media_root}"))
+            return
+
+        self.multipart_threshold = options['multipart_threshold'] * MB
+        self.chunk_size = options['chunk_size'] * MB
+        self.verify = not options['no_verify']
+        manifest = Manifest(options['manifest'])
+
+        pending = []
+        skipped = 0
+        for root, dirs, files in os.walk(local_media_root):
             for f in files:
                 local_path = os.path.join(root, f)
-                relative_path = os.path.relpath(local_path, LOCAL_MEDIA_ROOT)
+                relative_path = os.path.relpath(local_path, local_media_root)
+                stat = os.stat(local_path)
+                if manifest.is_done(relative_path, stat.st_size, int(stat.st_mtime)):
+                    skipped += 1
+                    continue
+                pending.append((local_path, relative_path, stat.st_size, int(stat.st_mtime)))
+
+        total_bytes = sum(item[2] for item in pending)
+        self.stdout.write(f"{len(pending)} files ({total_bytes / MB:.1f} MB) to upload, "
+                          f"{skipped} already done according to {manifest.path}")
+
+        if options['dry_run']:
+            seconds = total_bytes / MB / max(options['throughput'], 0.01)
+            self.stdout.write(self.style.SUCCESS(
+                f"Dry run: estimated {seconds / 60:.1f} minutes at {options['throughput']} MB/s."))
+            return
+
+        started = time.monotonic()
+        uploaded = failed = 0
+        uploaded_bytes = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {pool.submit(self.migrate_file, *item): item for item in pending}
+            for future in as_completed(futures):
+                local_path, relative_path, size, mtime = futures[future]
                 try:
-                    with open(local_path, "rb") as file_data:
-                        default_storage.save(relative_path, file_data)
-                    count += 1
-                    self.stdout.write(self.style.SUCCESS(f"Uploaded: {relative_path}"))
+                    record = future.result()
                 except Exception as e:
-                    self.stdout.write(self.style.ERROR(f"Failed to upload {relative_path}: {e}"))
+                    record = {'path': relative_path, 'size': size, 'mtime': mtime,
+                              'status': 'failed', 'error': str(e)}
+                manifest.write(record)
+                if record['status'] == 'done':
+                    uploaded += 1
+                    uploaded_bytes += size
+                    label = "Skipped (already on S3)" if record.get('skipped') else "Uploaded"
+                    self.stdout.write(self.style.SUCCESS(f"{label}: {relative_path}"))
+                else:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f"Failed to upload {relative_path}: {record['error']}"))
 
-        self.stdout.write(self.style.SUCCESS(f"Migration completed! {count} files uploaded to S3."))
\ No newline at end of file
+        elapsed = time.monotonic() - started
+        rate = uploaded_bytes / MB / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Migration completed! {uploaded} files uploaded to S3, {failed} failed "
+            f"({uploaded_bytes / MB:.1f} MB in {elapsed:.0f}s, {rate:.1f} MB/s)."))
+        if failed:
+            self.stdout.write("Run the command again to retry the failed files.")
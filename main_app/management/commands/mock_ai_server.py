@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from main_app.mock_ai import MockAIServer
+
+
+class Command(BaseCommand):
+    help = 'Serves a local mock of the DeepSeek chat completions API for offline development.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--delay', type=float, default=0.5, help='Seconds before each answer')
+        parser.add_argument('--fail-every', type=int, default=0, help='Answer every Nth request with a 503')
+        parser.add_argument('--token-delay', type=float, default=0.05, help='Seconds between streamed words')
+
+    def handle(self, *args, **options):
+        server = MockAIServer((options['host'], options['port']), options['delay'], options['fail_every'],
+                              options['token_delay'])
+        self.stdout.write(f"Mock AI API on http://{options['host']}:{options['port']}/v1/chat/completions")
+        self.stdout.write("Set DEEPSEEK_API_URL to that address. Ctrl+C to stop.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
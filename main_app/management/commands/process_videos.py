@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from main_app import video_processing
+from main_app.models import Video
+from main_app.video_processing import process_video
+
+
+class Command(BaseCommand):
+    help = ('Extracts posters and transcodes renditions for videos that are pending, failed, '
+            'or abandoned in processing by a worker that died')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', nargs='*', type=int, help='Only process these video ids')
+        parser.add_argument('--retry-failed', action='store_true', help='Also retry videos that failed before')
+        parser.add_argument('--watch', type=int, metavar='SECONDS',
+                            help='Keep running and look for new uploads every SECONDS (the Procfile worker)')
+
+    def handle(self, *args, **options):
+        while True:
+            self.process(options)
+            if not options['watch']:
+                return
+            close_old_connections()
+            time.sleep(options['watch'])
+
+    def process(self, options):
+        statuses = [Video.PENDING]
+        if options['retry_failed']:
+            statuses.append(Video.FAILED)
+        claimable = video_processing.claimable(statuses)
+        videos = Video.objects.exclude(video_file='').exclude(video_file__isnull=True)
+        if options['ids']:
+            videos = videos.filter(pk__in=options['ids'])
+        else:
+            videos = videos.filter(claimable)
+
+        count = 0
+        for video_id in videos.values_list('pk', flat=True):
+            # Claim the video so a second worker does not transcode it too
+            if not options['ids'] and not Video.objects.filter(claimable, pk=video_id).update(
+                    processing_status=Video.PROCESSING, processing_started_at=timezone.now()):
+                continue
+            try:
+                process_video(video_id)
+                count += 1
+                self.stdout.write(self.style.SUCCESS(f"Processed video {video_id}"))
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"Failed to process video {video_id}: {e}"))
+
+        if count or not options['watch']:
+            self.stdout.write(self.style.SUCCESS(f"Done! {count} videos processed."))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main_app.analytics import MEASURES, refresh
+
+
+class Command(BaseCommand):
+    help = ('Folds results, attendance, quiz sittings and school performance changed since the last run into '
+            'the circuit analytics cube. Schedule it (e.g. every 15 minutes with cron or Heroku Scheduler); '
+            'use --full now and then to drop deleted rows.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--measure', action='append', dest='measures', choices=sorted(MEASURES),
+                            help='Only this measure; repeat for several (default: all)')
+        parser.add_argument('--full', action='store_true', help='Rebuild from scratch instead of incrementally')
+        parser.add_argument('--batch', type=int, default=500, help='(school, session) partitions per transaction')
+
+    def handle(self, *args, **options):
+        for measure in options['measures'] or MEASURES:
+            started = time.perf_counter()
+            partitions, cells = refresh(measure, full=options['full'], batch=options['batch'])
+            scope = 'full rebuild' if partitions is None else f'{partitions} partitions'
+            self.stdout.write(f"{measure:<12} {scope}, {cells} cells written "
+                              f"in {(time.perf_counter() - started) * 1000:.0f} ms")
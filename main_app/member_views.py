@@ -4,9 +4,10 @@ from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from .forms import * # Make sure to create this form
 from .models import *  # Import the necessary models
+from .profiles import request_profile, save_changes
 
 def member_home(request):
-    member = get_object_or_404(Member, admin=request.user)
+    member = request_profile(request, Member)
     items = NewsAndEvents.objects.all().order_by("-updated_date")
 
     context = {
@@ -17,7 +18,7 @@ def member_home(request):
     return render(request, 'member_template/home_content.html', context)
 
 def member_view_attendance(request):
-    member = get_object_or_404(Member, admin=request.user)
+    member = request_profile(request, Member)
     attendance_reports = AttendanceReport.objects.filter(member=member)
     items = NewsAndEvents.objects.all().order_by("-updated_date")
 
@@ -30,7 +31,7 @@ def member_view_attendance(request):
     return render(request, 'member_template/view_attendance.html', context)
 
 def member_view_profile(request):
-    member = get_object_or_404(Member, admin=request.user)
+    member = request_profile(request, Member)
     form = MemberForm(request.POST or None, instance=member)
 
     context = {
@@ -40,7 +41,7 @@ def member_view_profile(request):
 
     if request.method == 'POST':
         if form.is_valid():
-            form.save()
+            save_changes(form.save(commit=False))
             messages.success(request, "Profile updated successfully!")
             return redirect(reverse('member_view_profile'))
         else:
@@ -49,7 +50,7 @@ def member_view_profile(request):
     return render(request, 'member_template/view_profile.html', context)
 
 def member_manage_attendance_reports(request):
-    member = get_object_or_404(Member, admin=request.user)
+    member = request_profile(request, Member)
     attendance_reports = AttendanceReport.objects.filter(member=member)
 
     context = {
@@ -59,7 +60,7 @@ def member_manage_attendance_reports(request):
     return render(request, 'member_template/manage_attendance_reports.html', context)
 
 def member_add_attendance_report(request):
-    member = get_object_or_404(Member, admin=request.user)
+    member = request_profile(request, Member)
 
     if request.method == 'POST':
         # Get data from POST request and create new AttendanceReport instance
@@ -1,8 +1,141 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.functional import SimpleLazyObject
+
+from . import profiles
+from .db_routers import _replica_reads, _wrote
+from .profiling import (QueryBudgetExceeded, check_budget, endpoint_stats,
+                        log_profile, profile_queries, server_timing)
+
+logger = logging.getLogger('main_app.profiling')
+
+
 class LoginCheckMiddleWare:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.get_response(request)
         # Middleware logic here
         response = self.get_response(request)
-        return response
\ No newline at end of file
+        return response
+
+
+class RoleProfileMiddleware:
+    """Adds request.profile, the user's role profile, resolved on first use (see profiles.resolve)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.profile = SimpleLazyObject(lambda: profiles.resolve(request))
+        return self.get_response(request)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets reporting views (REPLICA_READ_VIEWS url names, or views wrapped with
+    db_routers.replica_view) read from a replica, unless the user wrote
+    something in the last REPLICA_PIN_SECONDS.
+    """
+    cookie_name = 'db_primary_until'
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.read_views = set(getattr(settings, 'REPLICA_READ_VIEWS', ()))
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        wrote_token = _wrote.set(False)
+        replica_token = _replica_reads.set(False)
+        try:
+            return self.pin_if_wrote(self.get_response(request))
+        finally:
+            _replica_reads.reset(replica_token)
+            _wrote.reset(wrote_token)
+
+    async def __acall__(self, request):
+        wrote_token = _wrote.set(False)
+        replica_token = _replica_reads.set(False)
+        try:
+            return self.pin_if_wrote(await self.get_response(request))
+        finally:
+            _replica_reads.reset(replica_token)
+            _wrote.reset(wrote_token)
+
+    def pin_if_wrote(self, response):
+        if _wrote.get():
+            response.set_cookie(self.cookie_name, str(int(time.time()) + self.pin_seconds),
+                                max_age=self.pin_seconds, httponly=True, samesite='Lax')
+        return response
+
+    def pinned_to_primary(self, request):
+        try:
+            return int(request.COOKIES.get(self.cookie_name, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD') or self.pinned_to_primary(request):
+            return None
+        url_name = getattr(request.resolver_match, 'url_name', None)
+        view_class = getattr(view_func, 'view_class', None)
+        if (url_name in self.read_views or getattr(view_func, 'use_replica', False)
+                or getattr(view_class, 'use_replica', False)):
+            _replica_reads.set(True)
+        return None
+
+
+class QueryProfilerMiddleware:
+    """
+    Opt-in (QUERY_PROFILER = True) per-request query count, DB/template time,
+    N+1 detection and cache hit counting. Adds a Server-Timing header and checks
+    QUERY_BUDGETS; with QUERY_BUDGET_STRICT the request fails instead of logging.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_PROFILER', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        self.strict = getattr(settings, 'QUERY_BUDGET_STRICT', False)
+
+    def __call__(self, request):
+        with profile_queries() as profile:
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        endpoint = (match.view_name if match else None) or request.path
+        response['Server-Timing'] = server_timing(profile)
+        endpoint_stats.record(endpoint, profile)
+        log_profile(endpoint, response.status_code, profile)
+
+        budget = self.budgets.get(endpoint)
+        if budget:
+            try:
+                check_budget(profile, budget.get('queries'), budget.get('duplicates'), label=endpoint)
+            except QueryBudgetExceeded as e:
+                if self.strict:
+                    raise
+                logger.warning(str(e))
+        return response
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:30
+
+import main_app.storage_backends
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0008_video_processing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('ref_count', models.PositiveIntegerField(default=1)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='file',
+            field=models.FileField(storage=main_app.storage_backends.content_addressed_storage, upload_to='documents/'),
+        ),
+        migrations.AlterField(
+            model_name='files',
+            name='pdf',
+            field=models.FileField(storage=main_app.storage_backends.content_addressed_storage, upload_to='store/pdfs/'),
+        ),
+        migrations.AlterField(
+            model_name='messagemedia',
+            name='media',
+            field=models.FileField(storage=main_app.storage_backends.content_addressed_storage, upload_to='message_media/'),
+        ),
+        migrations.AlterField(
+            model_name='prospectors',
+            name='copy',
+            field=models.FileField(storage=main_app.storage_backends.content_addressed_storage, upload_to='store/prospectors/'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0010_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aichatlog',
+            name='prompt_key',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='aichatlog',
+            name='cached',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='aichatlog',
+            index=models.Index(fields=['prompt_key', 'created_at'], name='aichatlog_prompt_key_idx'),
+        ),
+    ]
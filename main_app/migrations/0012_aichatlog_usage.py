@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0011_aichatlog_prompt_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aichatlog',
+            name='school',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='main_app.school'),
+        ),
+        migrations.AddField(
+            model_name='aichatlog',
+            name='prompt_tokens',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='aichatlog',
+            name='completion_tokens',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='aichatlog',
+            index=models.Index(fields=['school', 'created_at'], name='aichatlog_school_created_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_report_sessions(apps, schema_editor):
+    Attendance = apps.get_model('main_app', 'Attendance')
+    AttendanceReport = apps.get_model('main_app', 'AttendanceReport')
+    AttendanceReport.objects.filter(session__isnull=True).update(
+        session_id=Subquery(Attendance.objects.filter(pk=OuterRef('attendance_id')).values('session_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0013_customuser_email_lower_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendancereport',
+            name='session',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='main_app.session'),
+        ),
+        migrations.AddIndex(
+            model_name='attendancereport',
+            index=models.Index(fields=['session', 'student'], name='attreport_session_student_idx'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedAttendance',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('grade', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='main_app.grade')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='main_app.session')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='main_app.subject')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['session', 'subject', 'date'], name='archatt_session_subject_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedAttendanceReport',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('status', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('attendance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reports', to='main_app.archivedattendance')),
+                ('session', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='main_app.session')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='main_app.student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['session', 'student'], name='archreport_session_stu_idx'), models.Index(fields=['student', 'status'], name='archreport_student_status_idx')],
+            },
+        ),
+        # Last, so no schema change follows the data update in this transaction
+        migrations.RunPython(fill_report_sessions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0014_attendance_archive'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='schoolperformance',
+            name='total_score',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0015_schoolperformance_total_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsRefresh',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('measure', models.CharField(max_length=20, unique=True)),
+                ('refreshed_through', models.DateTimeField()),
+                ('duration_ms', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AnalyticsCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('measure', models.CharField(choices=[('results', 'Results (assignment + test + exam)'), ('attendance', 'Attendance (share present)'), ('quizzes', 'Quiz scores'), ('performance', 'School performance evaluations')], max_length=20)),
+                ('total', models.FloatField(default=0)),
+                ('count', models.IntegerField(default=0)),
+                ('circuit', models.ForeignKey(null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='main_app.circuit')),
+                ('grade', models.ForeignKey(null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='main_app.grade')),
+                ('school', models.ForeignKey(null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='main_app.school')),
+                ('session', models.ForeignKey(null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='main_app.session')),
+                ('subject', models.ForeignKey(null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='main_app.subject')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['measure', 'circuit', 'session'], name='analyticscell_slice_idx'), models.Index(fields=['measure', 'school', 'session'], name='analyticscell_partition_idx')],
+            },
+        ),
+    ]
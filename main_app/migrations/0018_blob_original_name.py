@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0017_timetable_class_day_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blob',
+            name='original_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
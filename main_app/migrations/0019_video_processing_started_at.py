@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0018_blob_original_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='processing_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,101 @@
+"""
+Offline stand-in for the DeepSeek chat completions API.
+
+`manage.py mock_ai_server` serves it; set
+DEEPSEEK_API_URL=http://127.0.0.1:8765/v1/chat/completions to use it. Answers
+echo the question, after an optional delay, and every request is counted so
+cache hits and questions that shared a stream can be checked from /stats. Requests with
+"stream": true get the answer as Server-Sent Events, one word per chunk;
+streams the client abandons are counted as cancelled.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, delay=0.0, fail_every=0, token_delay=0.05):
+        super().__init__(address, MockAIHandler)
+        self.delay = delay
+        self.fail_every = fail_every
+        self.token_delay = token_delay
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.cancelled = 0
+
+    def count(self):
+        with self.lock:
+            self.requests += 1
+            return self.requests
+
+
+class MockAIHandler(BaseHTTPRequestHandler):
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            return self.send_json(200, {'requests': self.server.requests, 'cancelled': self.server.cancelled})
+        self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        except ValueError:
+            return self.send_json(400, {'error': 'invalid json'})
+        number = self.server.count()
+        time.sleep(self.server.delay)
+        if self.server.fail_every and number % self.server.fail_every == 0:
+            return self.send_json(503, {'error': 'mock failure'})
+
+        question = (payload.get('messages') or [{}])[-1].get('content', '')
+        answer = f"Mock answer #{number}: " + ' '.join(question.split())[-200:]
+        if payload.get('stream'):
+            return self.stream(number, answer)
+        self.send_json(200, {
+            'id': f'mock-{number}',
+            'object': 'chat.completion',
+            'model': payload.get('model', 'deepseek-chat'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': answer},
+                         'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': len(question.split()), 'completion_tokens': len(answer.split()),
+                      'total_tokens': len(question.split()) + len(answer.split())},
+        })
+
+    def stream(self, number, answer):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        try:
+            for word in answer.split(' '):
+                chunk = {'id': f'mock-{number}', 'object': 'chat.completion.chunk',
+                         'choices': [{'index': 0, 'delta': {'content': word + ' '}, 'finish_reason': None}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                time.sleep(self.server.token_delay)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            with self.server.lock:
+                self.server.cancelled += 1
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+def start(host='127.0.0.1', port=0, delay=0.0, fail_every=0, token_delay=0.05):
+    """Start a mock server on a background thread and return it (server.server_port is the port)."""
+    server = MockAIServer((host, port), delay, fail_every, token_delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
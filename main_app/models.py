@@ -14,18 +14,18 @@ from django.contrib.auth.models import AbstractUser, UserManager
 from django.contrib.auth.models import BaseUserManager
 from django.conf import settings
 from django.core.files import File
+from django.core.files.storage import default_storage
+from .storage_backends import content_addressed_storage
 from io import BytesIO
-from PIL import Image, ImageDraw
 from django.core.validators import MaxValueValidator
 from django.utils import timezone
-from django.db.models import Sum
+from django.db.models.functions import Lower
 from django.contrib.auth.hashers import make_password
 from django.dispatch import receiver
 from django.db.models.signals import post_save
 from django.core.exceptions import ValidationError
 from college.models import CollegeAndUniversities
 from bursary.models import Bursary
-#from moviepy.editor import VideoFileClip
 import uuid
 import os
 
@@ -159,6 +159,12 @@ class CustomUser(AbstractUser):
     REQUIRED_FIELDS = []
     objects = CustomUserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # EmailBackend looks users up by lower(email)
+            models.Index(Lower('email'), name='customuser_email_lower_idx'),
+        ]
+
     def __str__(self):
         return self.last_name + ", " + self.first_name
 
@@ -318,6 +324,29 @@ class InformalStudentResult(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
 #Attendance
+# Older sessions are moved to the Archived* tables by attendance_archive.py
+class AttendanceQuerySet(models.query.QuerySet):
+    def current(self, session_id=None):
+        """Rows of the current session only; pass `session_id` when the caller already looked it up."""
+        if session_id is None:
+            from .attendance_archive import current_session_id
+
+            session_id = current_session_id()
+        return self.filter(session_id=session_id) if session_id else self
+
+    def for_session(self, session):
+        return self.filter(session=session)
+
+class AttendanceManager(models.Manager):
+    def get_queryset(self):
+        return AttendanceQuerySet(self.model, using=self._db)
+
+    def current(self, session_id=None):
+        return self.get_queryset().current(session_id)
+
+    def for_session(self, session):
+        return self.get_queryset().for_session(session)
+
 class Attendance(models.Model):
     session = models.ForeignKey(Session, on_delete=models.DO_NOTHING)
     subject = models.ForeignKey(Subject, on_delete=models.DO_NOTHING)
@@ -325,14 +354,68 @@ class Attendance(models.Model):
     date = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    objects = AttendanceManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['subject', 'date'], name='attendance_subject_date_idx'),
+            models.Index(fields=['session', 'subject', 'grade', 'date'], name='attendance_session_lookup_idx'),
+        ]
 
 #attendance report
 class AttendanceReport(models.Model):
     student = models.ForeignKey(Student, on_delete=models.DO_NOTHING)
     attendance = models.ForeignKey(Attendance, on_delete=models.CASCADE)
+    # Copy of attendance.session, so current-session reads need no join
+    session = models.ForeignKey(Session, on_delete=models.DO_NOTHING, null=True, blank=True)
     status = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    objects = AttendanceManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'status'], name='attreport_student_status_idx'),
+            models.Index(fields=['attendance', 'student'], name='attreport_attendance_stu_idx'),
+            # Absences are the minority of rows and what the reports look for
+            models.Index(fields=['student'], condition=Q(status=False), name='attreport_absent_idx'),
+            models.Index(fields=['session', 'student'], name='attreport_session_student_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.session_id is None and self.attendance_id is not None:
+            self.session_id = self.attendance.session_id
+        super().save(*args, **kwargs)
+
+#attendance archive: same columns as Attendance and AttendanceReport, ids kept
+class ArchivedAttendance(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    session = models.ForeignKey(Session, on_delete=models.DO_NOTHING, related_name='+')
+    subject = models.ForeignKey(Subject, on_delete=models.DO_NOTHING, related_name='+')
+    grade = models.ForeignKey(Grade, on_delete=models.DO_NOTHING, related_name='+')
+    date = models.DateField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['session', 'subject', 'date'], name='archatt_session_subject_idx'),
+        ]
+
+class ArchivedAttendanceReport(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    student = models.ForeignKey(Student, on_delete=models.DO_NOTHING, related_name='+')
+    attendance = models.ForeignKey(ArchivedAttendance, on_delete=models.CASCADE, related_name='reports')
+    session = models.ForeignKey(Session, on_delete=models.DO_NOTHING, null=True, blank=True, related_name='+')
+    status = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['session', 'student'], name='archreport_session_stu_idx'),
+            models.Index(fields=['student', 'status'], name='archreport_student_status_idx'),
+        ]
 
 #leavereport student
 class LeaveReportStudent(models.Model):
@@ -397,6 +480,11 @@ class StudentResult(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'subject'], name='studentresult_stu_subject_idx'),
+        ]
+
 
 
 #MEMBER
@@ -510,49 +598,7 @@ class QuestionPaperManager(models.Manager):
         return self.get_queryset().search(query)
 
 
-@receiver(post_save, sender=CustomUser)
-def create_user_profile(sender, instance, created, **kwargs):
-    if created:
-        if instance.user_type == 1:
-            Admin.objects.create(admin=instance)
-        if instance.user_type == 2:
-            Staff.objects.create(admin=instance)
-        if instance.user_type == 3:
-            Student.objects.create(admin=instance)
-        if instance.user_type == 4:
-            Principal.objects.create(admin=instance)
-        if instance.user_type == 5:
-            Educator.objects.create(admin=instance)
-        if instance.user_type == 6:
-            Circuit_Manager.objects.create(admin=instance)
-        if instance.user_type == 7:
-            Parent.objects.create(admin=instance)
-        if instance.user_type == 8:
-            Member.objects.create(admin=instance)
-        if instance.user_type == 9:
-            CWA_Admin.objects.create(admin=instance)
-
-
-@receiver(post_save, sender=CustomUser)
-def save_user_profile(sender, instance, **kwargs):
-    if instance.user_type == 1:
-        instance.admin.save()
-    if instance.user_type == 2:
-        instance.staff.save()
-    if instance.user_type == 3:
-        instance.student.save()
-    if instance.user_type == 4:
-        instance.principal.save()
-    if instance.user_type == 5:
-        instance.educator.save()
-    if instance.user_type == 6:
-        instance.circuit_manager.save()
-    if instance.user_type == 7:
-        instance.parent.save()
-    if instance.user_type == 8:
-        instance.member.save()
-    if instance.user_type == 9:
-        instance.cwa_admin.save()
+# Role profiles are created and saved by main_app.profiles
 
 
 #Documents
@@ -617,7 +663,7 @@ class Subscription(models.Model):
 class Files(models.Model):
     filename = models.CharField(max_length=100)
     owner = models.CharField(max_length=100)
-    pdf = models.FileField(upload_to='store/pdfs/')
+    pdf = models.FileField(upload_to='store/pdfs/', storage=content_addressed_storage)
     cover = models.ImageField(upload_to='store/pdfs/')
 
     def __str__(self):
@@ -652,6 +698,10 @@ class Timetable(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['day', 'grade', 'course', 'start_time'], name='timetable_class_day_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.created_by_id:
@@ -659,7 +709,7 @@ class Timetable(models.Model):
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.day} - {self.grade.name} ({self.course.name})"
+        return f"{self.day} - {self.grade} ({self.course})"
 
 
 #testimonial
@@ -674,13 +724,14 @@ class Message(models.Model):
 
 class MessageMedia(models.Model):
     message = models.ForeignKey(Message, related_name='media', on_delete=models.CASCADE)
-    media = models.FileField(upload_to='message_media/')
+    media = models.FileField(upload_to='message_media/', storage=content_addressed_storage)
 
     def __str__(self):
         return self.media.name
 
 
 #School Perfomance
+# Running totals per (school, session, subject, grade), kept by performance.record_evaluation
 class SchoolPerformance(models.Model):
     school_record = models.ForeignKey(School, on_delete=models.CASCADE)
     session = models.ForeignKey(Session, on_delete=models.CASCADE)  # New ForeignKey to Session
@@ -689,7 +740,7 @@ class SchoolPerformance(models.Model):
     grade = models.ForeignKey(Grade, on_delete=models.DO_NOTHING, null=True, blank=False)
     school_principal = models.ForeignKey(Principal, on_delete=models.CASCADE)
     performance_score = models.DecimalField(max_digits=5, decimal_places=2)
-    total_score = models.DecimalField(max_digits=7, decimal_places=2, default=0.00)
+    total_score = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
     overall_performance = models.DecimalField(max_digits=5, decimal_places=2, default=0.00)
     num_evaluations = models.IntegerField(default=1)
     improvement = models.DecimalField(max_digits=5, decimal_places=2, default=0.00)
@@ -703,34 +754,34 @@ class SchoolPerformance(models.Model):
     def __str__(self):
         return f"{self.school_record.name} - {self.subject} ({self.grade}) Performance ({self.school_record.year})"
 
-    def calculate_total_score(self):
-        total = SchoolPerformance.objects.filter(
-            school_record=self.school_record,
-            session=self.session,
-            grade=self.grade,
-            subject=self.subject
-        ).aggregate(total=Sum('performance_score'))['total']
-        self.total_score = total or 0.00
-        self.save()
-
-    def calculate_overall_performance(self):
-        if self.num_evaluations > 0:
-            self.overall_performance = self.total_score / self.num_evaluations
-        else:
-            self.overall_performance = 0.00
-        self.save()
-
-    def calculate_improvement(self, previous_score):
-        if previous_score:
-            self.improvement = self.performance_score - previous_score
-        else:
-            self.improvement = self.performance_score
-        self.save()
+#circuit analytics: pre-aggregated cells rebuilt by analytics.refresh (see analytics.py)
+class AnalyticsCell(models.Model):
+    MEASURES = [
+        ('results', 'Results (assignment + test + exam)'),
+        ('attendance', 'Attendance (share present)'),
+        ('quizzes', 'Quiz scores'),
+        ('performance', 'School performance evaluations'),
+    ]
+    measure = models.CharField(max_length=20, choices=MEASURES)
+    circuit = models.ForeignKey(Circuit, on_delete=models.DO_NOTHING, null=True, related_name='+')
+    school = models.ForeignKey(School, on_delete=models.DO_NOTHING, null=True, related_name='+')
+    session = models.ForeignKey(Session, on_delete=models.DO_NOTHING, null=True, related_name='+')
+    subject = models.ForeignKey(Subject, on_delete=models.DO_NOTHING, null=True, related_name='+')
+    grade = models.ForeignKey(Grade, on_delete=models.DO_NOTHING, null=True, related_name='+')
+    total = models.FloatField(default=0)
+    count = models.IntegerField(default=0)
 
-    def save(self, *args, **kwargs):
-        self.calculate_total_score()
-        self.calculate_overall_performance()
-        super(SchoolPerformance, self).save(*args, **kwargs)
+    class Meta:
+        indexes = [
+            models.Index(fields=['measure', 'circuit', 'session'], name='analyticscell_slice_idx'),
+            models.Index(fields=['measure', 'school', 'session'], name='analyticscell_partition_idx'),
+        ]
+
+class AnalyticsRefresh(models.Model):
+    measure = models.CharField(max_length=20, unique=True)
+    # Source rows changed after this are folded in by the next refresh
+    refreshed_through = models.DateTimeField()
+    duration_ms = models.IntegerField(default=0)
 
 #school of specialisation assessment dates
 
@@ -776,14 +827,13 @@ def validate_video_size(video):
         raise ValidationError(f"Maximum file size is 50MB. Uploaded file size: {video.size / (1024 * 1024):.2f}MB")
 
 def validate_video_duration(video):
-    from moviepy.editor import VideoFileClip  # Import within the function to avoid issues when not using videos
+    from main_app.video_processing import probe  # Import within the function to avoid issues when not using videos
     try:
-        clip = VideoFileClip(video.temporary_file_path())  # Get video path for duration check
-        duration = clip.duration
-        if duration > 60:  # 1 minute is 60 seconds
-            raise ValidationError("Maximum duration is 1 minute.")
+        duration, width, height = probe(video.temporary_file_path())  # Get video path for duration check
     except Exception as e:
         raise ValidationError(f"Unable to verify video duration: {e}")
+    if duration > 60:  # 1 minute is 60 seconds
+        raise ValidationError("Maximum duration is 1 minute.")
 
 class CustomAd(models.Model):
     title = models.CharField(max_length=100, blank=True)
@@ -825,7 +875,7 @@ class PrivacyPolicy(models.Model):
 class Prospectors(models.Model):
     institution = models.CharField(max_length=100)
     address = models.CharField(max_length=100)
-    copy = models.FileField(upload_to='store/prospectors/')
+    copy = models.FileField(upload_to='store/prospectors/', storage=content_addressed_storage)
     logo = models.ImageField(upload_to='store/prospectors/')
 
     class Meta:
@@ -861,7 +911,7 @@ class Comment(models.Model):
 class Document(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
-    file = models.FileField(upload_to='documents/')
+    file = models.FileField(upload_to='documents/', storage=content_addressed_storage)
     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     approved = models.BooleanField(default=False)
@@ -901,11 +951,48 @@ class AIChatLog(models.Model):
     ])
     question = models.TextField()
     response = models.TextField()
+    # Normalised question hash, answers are reused by main_app.ai_gateway
+    prompt_key = models.CharField(max_length=64, blank=True, default='')
+    cached = models.BooleanField(default=False)
+    # For per-school budgets and usage (see main_app/ai_limits.py)
+    school = models.ForeignKey(School, null=True, blank=True, on_delete=models.SET_NULL)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['prompt_key', 'created_at'], name='aichatlog_prompt_key_idx'),
+            models.Index(fields=['school', 'created_at'], name='aichatlog_school_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.get_question_type_display()} - {self.created_at}"
 
+#deduplicated uploads (see main_app/storage_backends.py)
+class Blob(models.Model):
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, unique=True)  # storage name, cas/aa/bb/<sha256>.ext
+    original_name = models.CharField(max_length=255, blank=True)  # file name of the first upload, for downloads
+    size = models.BigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+#image derivatives (see main_app/imaging.py)
+class ImageDerivative(models.Model):
+    source = models.CharField(max_length=255, unique=True)  # storage name of the original
+    width = models.PositiveIntegerField(default=0)
+    height = models.PositiveIntegerField(default=0)
+    variants = models.JSONField(default=dict)  # {"320": {"original": name, "webp": name}}
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.source
+
 #video comment
 class VideoCategory(models.Model):
     name = models.CharField(max_length=255, unique=True)
@@ -923,6 +1010,25 @@ class Video(models.Model):
     thumbnail = models.ImageField(upload_to='video_thumbnails/', null=True, blank=True)
     date_posted = models.DateTimeField(default=timezone.now)
 
+    # Filled in by main_app.video_processing
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    READY = 'ready'
+    FAILED = 'failed'
+    PROCESSING_STATUS = [
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (READY, 'Ready'),
+        (FAILED, 'Failed'),
+    ]
+    processing_status = models.CharField(max_length=10, choices=PROCESSING_STATUS, default=PENDING)
+    processing_started_at = models.DateTimeField(null=True, blank=True)  # when a worker claimed it
+    duration = models.FloatField(null=True, blank=True)  # seconds
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    renditions = models.JSONField(default=dict, blank=True)  # {"360p": {"height", "bandwidth", "mp4", "size"}}
+    hls_playlist = models.CharField(max_length=255, blank=True)
+
 
     # Social links
     website_url = models.CharField(max_length=2000, null=True, blank=True)
@@ -943,6 +1049,13 @@ class Video(models.Model):
     def __str__(self):
         return self.title
 
+    def rendition_url(self, name):
+        return default_storage.url(self.renditions[name]['mp4'])
+
+    def hls_url(self):
+        # Served by Django so the segment URIs can be signed (see video_processing.signed_media_playlist)
+        return reverse('video_hls', args=[self.pk]) if self.hls_playlist else None
+
 #video comment
 class VideoComment(models.Model):
     video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name="comments")
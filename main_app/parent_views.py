@@ -1,14 +1,17 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
+from . import attendance_archive
+from .attendance_archive import wants_archive
 from .models import *
+from .profiles import request_profile, save_changes
 from .forms import *
 
 # Parent Home
 def parent_home(request):
-    parent = get_object_or_404(Parent, admin=request.user)
+    parent = request_profile(request, Parent)
     students = parent.student.all()  # Get all linked students
 
-    total_attendance_reports = AttendanceReport.objects.filter(student__in=students).count()
+    total_attendance_reports = AttendanceReport.objects.current().filter(student__in=students).count()
     items = NewsAndEvents.objects.all().order_by("-updated_date")
 
     context = {
@@ -23,8 +26,8 @@ def parent_home(request):
 
 # View Attendance Reports
 def parent_view_attendance(request):
-    parent = get_object_or_404(Parent, admin=request.user)
-    attendance_reports = AttendanceReport.objects.filter(student=parent.student)
+    parent = request_profile(request, Parent)
+    attendance_reports = attendance_archive.reports(wants_archive(request), student__in=parent.student.all())
 
     context = {
         'page_title': 'Attendance Reports',
@@ -34,13 +37,14 @@ def parent_view_attendance(request):
 
 # View Profile
 def parent_view_profile(request):
-    parent = get_object_or_404(Parent, admin=request.user)
+    parent = request_profile(request, Parent)
     
     if request.method == 'POST':
         # Updating directly on the model, no form
-        parent.school = request.POST.get('school', parent.school)
-        parent.grade = request.POST.get('grade', parent.grade)
-        parent.save()
+        school_id = request.POST.get('school')
+        if school_id:
+            parent.school_id = school_id
+        save_changes(parent)
         messages.success(request, "Profile updated successfully!")
         return redirect('parent_view_profile')
 
@@ -52,8 +56,8 @@ def parent_view_profile(request):
 
 # Manage Attendance Reports
 def parent_manage_attendance_reports(request):
-    parent = get_object_or_404(Parent, admin=request.user)
-    attendance_reports = AttendanceReport.objects.filter(student=parent.student)
+    parent = request_profile(request, Parent)
+    attendance_reports = AttendanceReport.objects.current().filter(student__in=parent.student.all())
 
     context = {
         'page_title': 'Manage Attendance Reports',
@@ -63,7 +67,7 @@ def parent_manage_attendance_reports(request):
 
 # Add Attendance Report
 def parent_add_attendance_report(request):
-    parent = get_object_or_404(Parent, admin=request.user)
+    parent = request_profile(request, Parent)
 
     if request.method == 'POST':
         # Creating attendance report directly from POST data
@@ -0,0 +1,154 @@
+"""
+Running school performance aggregates.
+
+A SchoolPerformance row holds the running figures for one (school,
+session, subject, grade):
+
+* total_score and num_evaluations: sum and count of every score recorded
+* overall_performance: total_score / num_evaluations
+* performance_score: the latest score
+* improvement: overall_performance minus the same row's overall
+  performance in the previous session, at the time of the last evaluation
+
+`record_evaluation` adds a score with one UPDATE. The new totals, average
+and improvement are computed in the database from F() expressions, so
+concurrent evaluations cannot lose each other's scores and nothing is
+re-aggregated. The row is only INSERTed on the first evaluation of its key.
+
+`summary` gives the per-grade chart data for a session, with the
+improvement over the previous session from one grouped query. It is
+cached until the next evaluation in that session
+(PERFORMANCE_SUMMARY_SECONDS at most).
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .models import SchoolPerformance, Session
+
+SUMMARY_KEY = 'performance:summary:{}'
+SESSIONS_KEY = 'performance:previous_sessions'
+
+
+def _previous_sessions():
+    """{session id: id of the session before it}, cached until a Session changes."""
+    order = cache.get(SESSIONS_KEY)
+    if order is None:
+        ids = list(Session.objects.order_by('start_year').values_list('id', flat=True))
+        order = dict(zip(ids[1:], ids))
+        cache.set(SESSIONS_KEY, order, 3600)
+    return order
+
+
+def previous_session_id(session):
+    return _previous_sessions().get(session.pk)
+
+
+def forget_sessions(sender, **kwargs):
+    cache.delete(SESSIONS_KEY)
+
+
+def connect_signals():
+    post_save.connect(forget_sessions, sender=Session, dispatch_uid='performance_sessions_save')
+    post_delete.connect(forget_sessions, sender=Session, dispatch_uid='performance_sessions_delete')
+
+
+def _decimal(expression):
+    return ExpressionWrapper(expression, output_field=DecimalField(max_digits=7, decimal_places=2))
+
+
+def _previous_overall(previous_id):
+    """The same school, subject and grade's overall performance in session `previous_id`, as a subquery."""
+    return Subquery(SchoolPerformance.objects.filter(
+        school_record=OuterRef('school_record'), subject=OuterRef('subject'), grade=OuterRef('grade'),
+        session_id=previous_id,
+    ).values('overall_performance')[:1])
+
+
+#writing
+def record_evaluation(school_record, session, subject, grade, performance_score, educator, school_principal,
+                      comments=None):
+    """Add one evaluation's score to the running figures of its school, session, subject and grade."""
+    score = Decimal(performance_score)
+    previous_id = previous_session_id(session)
+    key = {'school_record': school_record, 'session': session, 'subject': subject, 'grade': grade}
+    overall = _decimal((F('total_score') + score) / (F('num_evaluations') + 1))
+    changes = {
+        'total_score': F('total_score') + score,
+        'num_evaluations': F('num_evaluations') + 1,
+        'overall_performance': overall,
+        'improvement': _decimal(overall - Coalesce(_previous_overall(previous_id), Value(Decimal(0)))),
+        'performance_score': score,
+        'educator': educator,
+        'school_principal': school_principal,
+        'updated_at': timezone.now(),
+    }
+    if comments:
+        changes['comments'] = comments
+
+    if not SchoolPerformance.objects.filter(**key).update(**changes):
+        try:
+            # The first evaluation of this key; a concurrent first one makes this an update after all
+            with transaction.atomic():
+                SchoolPerformance.objects.create(
+                    **key, performance_score=score, total_score=score, num_evaluations=1,
+                    overall_performance=score, educator=educator, school_principal=school_principal,
+                    comments=comments,
+                    improvement=score - Decimal(SchoolPerformance.objects.filter(
+                        school_record=school_record, subject=subject, grade=grade,
+                        session_id=previous_id,
+                    ).values_list('overall_performance', flat=True).first() or 0),
+                )
+        except IntegrityError:
+            SchoolPerformance.objects.filter(**key).update(**changes)
+    cache.delete_many([SUMMARY_KEY.format(session.pk), SUMMARY_KEY.format('all')])
+
+
+#reading
+def summary(session=None):
+    """
+    Chart data per grade: {'grades', 'averages', 'improvements', 'evaluations'}
+    for `session`, or over every session when None.
+    """
+    key = SUMMARY_KEY.format(session.pk if session else 'all')
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    previous = previous_session_id(session) if session else None
+    rows = SchoolPerformance.objects.all()
+    if session:
+        rows = rows.filter(session_id__in=[session.pk, previous] if previous else [session.pk])
+    totals = {}
+    for row in (rows.values('grade__name', 'session_id')
+                .annotate(total=Sum('total_score'), count=Sum('num_evaluations'))
+                .order_by('grade__name')):
+        totals.setdefault(row['grade__name'] or 'No grade', {})[row['session_id']] = row
+
+    def average(row):
+        return float(row['total'] / row['count']) if row and row['count'] else 0.0
+
+    data = {'grades': [], 'averages': [], 'improvements': [], 'evaluations': []}
+    for grade, by_session in totals.items():
+        if session:
+            current = by_session.get(session.pk)
+            if current is None:
+                continue
+            before = by_session.get(previous)
+            improvement = average(current) - average(before) if before else 0.0
+        else:
+            current = {'total': sum(r['total'] for r in by_session.values()),
+                       'count': sum(r['count'] for r in by_session.values())}
+            improvement = 0.0
+        data['grades'].append(grade)
+        data['averages'].append(round(average(current), 2))
+        data['improvements'].append(round(improvement, 2))
+        data['evaluations'].append(current['count'])
+    cache.set(key, data, getattr(settings, 'PERFORMANCE_SUMMARY_SECONDS', 600))
+    return data
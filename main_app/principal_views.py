@@ -6,13 +6,17 @@ from django.shortcuts import (HttpResponseRedirect, get_object_or_404, redirect,
 from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 
+from . import attendance_archive, exports
+from .attendance_archive import wants_archive
+from .datatables import ATTENDANCE_TABLE, RESULTS_TABLE
 from .forms import *
 from .models import *
+from .profiles import request_profile, save_changes
 
 
 #principal home
 def principal_home(request):
-    principal = get_object_or_404(Principal, admin=request.user)
+    principal = request_profile(request, Principal)
     
     # Filter news based on school name appearing in title or summary
     items = NewsAndEvents.objects.filter(
@@ -23,7 +27,7 @@ def principal_home(request):
     total_students = Student.objects.filter(school=principal.school).count()
     total_educators = Educator.objects.filter(school=principal.school).count()
     total_subjects = Subject.objects.filter(course_id__school=principal.school).count()
-    total_attendance = AttendanceReport.objects.filter(student__school=principal.school).count()
+    total_attendance = AttendanceReport.objects.current().filter(student__school=principal.school).count()
 
     context = {
         'page_title': 'Principal Dashboard',
@@ -94,7 +98,7 @@ def delete_post(request, pk):
     return redirect("staff_home")
 
 def principal_view_results(request):
-    principal = get_object_or_404(Principal, admin=request.user)
+    principal = request_profile(request, Principal)
     results = StudentResult.objects.filter(student__course=principal.course)
     
     context = {
@@ -104,17 +108,22 @@ def principal_view_results(request):
     return render(request, 'principal_template/view_results.html', context)
 
 def principal_view_attendance(request):
-    principal = get_object_or_404(Principal, admin=request.user)
-    attendance_reports = AttendanceReport.objects.filter(student__course=principal.course)
-    
+    # The rows come page by page from principal_attendance_data
     context = {
         'page_title': 'View Attendance',
-        'attendance_reports': attendance_reports
+        'table': ATTENDANCE_TABLE.describe(reverse('principal_attendance_data')),
+        'export_url': reverse('principal_export_data', args=['attendance']),
+        'sessions': Session.objects.order_by('-start_year'),
     }
     return render(request, 'principal_template/view_attendance.html', context)
 
+def principal_attendance_data(request):
+    principal = request_profile(request, Principal)
+    reports = attendance_archive.session_reports(attendance_archive.requested_session(request))
+    return ATTENDANCE_TABLE.page(reports.filter(student__course=principal.course), request.GET)
+
 def principal_view_educators(request):
-    principal = get_object_or_404(Principal, admin=request.user)
+    principal = request_profile(request, Principal)
     educators = Educator.objects.all()
     
     context = {
@@ -124,7 +133,7 @@ def principal_view_educators(request):
     return render(request, 'principal_template/view_educators.html', context)
 
 def principal_view_profile(request):
-    principal = get_object_or_404(Principal, admin=request.user)
+    principal = request_profile(request, Principal)
     form = PrincipalEditForm(request.POST or None, request.FILES or None, instance=principal)
     
     context = {
@@ -136,7 +145,7 @@ def principal_view_profile(request):
         if form.is_valid():
             try:
                 obj = form.save(commit=False)
-                obj.save()
+                save_changes(obj)
                 messages.success(request, "Profile Updated!")
                 return redirect(reverse('principal_view_profile'))
             except Exception as e:
@@ -147,30 +156,36 @@ def principal_view_profile(request):
     return render(request, 'principal_template/view_profile.html', context)
 
 def principal_view_attendance_report(request):
-    principal = get_object_or_404(Principal, admin=request.user)
-    attendance_reports = AttendanceReport.objects.filter(student__course=principal.course)
-    
     context = {
         'page_title': 'Attendance Reports',
-        'attendance_reports': attendance_reports
+        'table': ATTENDANCE_TABLE.describe(reverse('principal_attendance_data')),
+        'export_url': reverse('principal_export_data', args=['attendance']),
+        'sessions': Session.objects.order_by('-start_year'),
     }
     return render(request, 'principal_template/view_attendance_reports.html', context)
 
 def principal_view_student_results(request):
-    principal = get_object_or_404(Principal, admin=request.user)
-    student_results = StudentResult.objects.filter(student__course=principal.course)
-    
     context = {
         'page_title': 'Student Results',
-        'student_results': student_results
+        'table': RESULTS_TABLE.describe(reverse('principal_results_data')),
+        'export_url': reverse('principal_export_data', args=['results']),
     }
     return render(request, 'principal_template/view_student_results.html', context)
 
+def principal_results_data(request):
+    principal = request_profile(request, Principal)
+    return RESULTS_TABLE.page(StudentResult.objects.filter(student__course=principal.course), request.GET)
+
+def principal_export_data(request, name):
+    # Always the principal's own school
+    principal = request_profile(request, Principal)
+    return exports.download(request, name, school=principal.school_id)
+
 @csrf_exempt
 def fetch_student_attendance(request):
     try:
         student_id = request.POST.get('student_id')
-        attendance_data = AttendanceReport.objects.filter(student_id=student_id)
+        attendance_data = attendance_archive.reports(wants_archive(request), student_id=student_id)
         attendance_list = [
             {
                 'date': attendance.attendance.date,
@@ -200,7 +215,7 @@ def fetch_student_results(request):
 
 
 def principal_manage_parents(request):
-    principal = get_object_or_404(Principal, admin=request.user)
+    principal = request_profile(request, Principal)
     parents = Parent.objects.filter(student__course=principal.course)
 
     context = {
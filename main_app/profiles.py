@@ -0,0 +1,208 @@
+"""
+Role profiles for CustomUser.
+
+Every user_type has one profile model (Student for 3, Educator for 5, ...),
+listed in PROFILE_MODELS. A single post_save receiver uses the registry:
+
+* A new user gets an empty profile of its type, cached on the user, so code
+  like `user.staff.course = course; user.save()` keeps working without
+  another query.
+* Saving an existing user saves its profile only if the profile was loaded
+  and one of its fields changed, and then only those fields. Logins
+  (last_login), edits and password changes no longer rewrite the profile.
+
+`get_profile` creates a missing profile on first use, for users made while
+profiles were `disabled()` or with bulk_create. Bulk imports and views that
+build the profile themselves use `with profiles.disabled():` to skip the
+automatic one.
+
+RoleProfileMiddleware adds a lazy `request.profile`. Role views call
+`request_profile(request, Student)` instead of
+`get_object_or_404(Student, admin=request.user)`. The profile is loaded at
+most once per request, with its school, course, grade, circuit, session and
+term joined in. It is kept in the shared cache (CACHES) for
+PROFILE_CACHE_SECONDS, and the entry is dropped on every worker whenever the
+profile or the user is saved. A cached profile may still be a little behind
+the database, so views that edit it save it with `save_changes`, which only
+writes the fields they changed.
+"""
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_init, post_save
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+
+# Foreign keys joined when a profile is loaded for a request, where the model has them
+RELATED = ('school', 'course', 'grade', 'circuit', 'session', 'term')
+
+# user_type: profile model in main_app
+PROFILE_MODELS = {
+    '1': 'Admin',
+    '2': 'Staff',
+    '3': 'Student',
+    '4': 'Principal',
+    '5': 'Educator',
+    '6': 'Circuit_Manager',
+    '7': 'Parent',
+    '8': 'Member',
+    '9': 'CWA_Admin',
+}
+
+_enabled = contextvars.ContextVar('profiles_enabled', default=True)
+
+
+@contextmanager
+def disabled():
+    """Do not create or save profiles for users saved inside this block."""
+    token = _enabled.set(False)
+    try:
+        yield
+    finally:
+        _enabled.reset(token)
+
+
+def profile_model(user_type):
+    name = PROFILE_MODELS.get(str(user_type))
+    return apps.get_model('main_app', name) if name else None
+
+
+def accessor(model):
+    """Name of the reverse one-to-one on CustomUser, e.g. 'student' or 'circuit_manager'."""
+    return model._meta.get_field('admin').remote_field.get_accessor_name()
+
+
+def get_profile(user, create=True):
+    """The user's role profile, created if it is missing; None for unknown user types."""
+    model = profile_model(user.user_type)
+    if model is None:
+        return None
+    try:
+        return getattr(user, accessor(model))
+    except model.DoesNotExist:
+        if not create:
+            return None
+    profile, _ = model.objects.get_or_create(admin=user)
+    setattr(user, accessor(model), profile)
+    return profile
+
+
+#change tracking
+def _remember(sender, instance, **kwargs):
+    # Only values already loaded; reading a deferred field here would query
+    instance._profile_saved = {field.attname: instance.__dict__[field.attname]
+                               for field in sender._meta.concrete_fields if field.attname in instance.__dict__}
+
+
+def changed_fields(profile):
+    saved = getattr(profile, '_profile_saved', {})
+    return [field.attname for field in profile._meta.concrete_fields
+            if not field.primary_key and field.attname in profile.__dict__
+            and (field.attname not in saved or saved[field.attname] != profile.__dict__[field.attname])]
+
+
+def save_changes(profile):
+    """Save only the fields changed since the profile was loaded; returns their names."""
+    changed = changed_fields(profile)
+    if changed:
+        profile.save(update_fields=changed)
+    return changed
+
+
+def sync_profile(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if not created and (update_fields is None or 'user_type' in update_fields):
+        cache.delete(CACHE_KEY.format(instance.pk))
+    if raw or not _enabled.get():
+        return
+    model = profile_model(instance.user_type)
+    if model is None:
+        return
+    if created:
+        setattr(instance, accessor(model), model.objects.create(admin=instance))
+        return
+    profile = instance._state.fields_cache.get(accessor(model))
+    if profile is not None and profile.pk is not None:
+        changed = changed_fields(profile)
+        if changed:
+            profile.save(update_fields=changed)
+
+
+#per request
+CACHE_KEY = 'profile:{}'
+
+
+def _with_related(model):
+    names = {field.name for field in model._meta.fields if field.many_to_one}
+    return model.objects.select_related(*[name for name in RELATED if name in names])
+
+
+def resolve(request):
+    """The role profile of request.user, loaded once per request; None if there is none."""
+    if hasattr(request, '_profile_cache'):
+        return request._profile_cache
+    user = request.user
+    profile = None
+    model = profile_model(user.user_type) if user.is_authenticated else None
+    if model is not None:
+        key = CACHE_KEY.format(user.pk)
+        profile = cache.get(key)
+        if not isinstance(profile, model) or profile.admin_id != user.pk:
+            profile = _with_related(model).filter(admin_id=user.pk).first()
+            if profile is not None:
+                cache.set(key, profile, getattr(settings, 'PROFILE_CACHE_SECONDS', 60))
+        if profile is not None:
+            # request.user is already loaded, so profile.admin needs no query
+            model.admin.field.set_cached_value(profile, user)
+    request._profile_cache = profile
+    return profile
+
+
+def request_profile(request, model):
+    """
+    request.user's `model` profile or 404, the same as
+    get_object_or_404(model, admin=request.user) but loaded once per request.
+    """
+    profile = resolve(request)
+    if isinstance(profile, model):
+        return profile
+    if not request.user.is_authenticated:
+        raise Http404('No profile for anonymous users')
+    # A leftover profile of another type, from before a user_type change
+    return get_object_or_404(_with_related(model), admin=request.user)
+
+
+def role_required(*user_types):
+    """
+    Only signed-in superusers and users of these user_types may use the view;
+    everyone else, anonymous users included, gets a 403.
+
+        @role_required('1')
+        def export_data(request, name): ...
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            user = request.user
+            if not user.is_authenticated or not (user.is_superuser or str(user.user_type) in user_types):
+                return HttpResponse("Not allowed", status=403)
+            return view(request, *args, **kwargs)
+        return wrapped
+    return decorator
+
+
+def forget(sender, instance, **kwargs):
+    cache.delete(CACHE_KEY.format(instance.admin_id))
+
+
+def connect_signals():
+    for name in PROFILE_MODELS.values():
+        model = apps.get_model('main_app', name)
+        post_init.connect(_remember, sender=model, dispatch_uid=f'profile_init:{name}')
+        post_save.connect(_remember, sender=model, dispatch_uid=f'profile_saved:{name}')
+        post_save.connect(forget, sender=model, dispatch_uid=f'profile_forget:{name}')
+        post_delete.connect(forget, sender=model, dispatch_uid=f'profile_delete:{name}')
+    post_save.connect(sync_profile, sender=apps.get_model('main_app', 'CustomUser'), dispatch_uid='sync_profile')
@@ -0,0 +1,233 @@
+"""
+Per-request query profiling.
+
+QueryProfilerMiddleware (enabled with QUERY_PROFILER = True) records for each
+request the number of queries, total DB time, repeated query shapes (N+1
+signatures), template render time and cache hits/misses. It adds a
+Server-Timing header, logs one structured line per request and keeps a rolling
+table of the slowest endpoints for the HOD "Query profile" page.
+
+`query_budget` enforces the same numbers in tests:
+
+    with query_budget(max_queries=25, max_duplicates=3):
+        client.get(reverse('admin_home'))
+"""
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('main_app.profiling')
+
+_current = ContextVar('query_profile', default=None)
+
+# Literals are replaced so queries that only differ by ids share one shape
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_RE = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+
+
+def query_shape(sql):
+    shape = _STRING_RE.sub('?', sql)
+    shape = _NUMBER_RE.sub('?', shape)
+    shape = _IN_RE.sub('IN (...)', shape)
+    return ' '.join(shape.split())
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.shapes = Counter()
+        self.template_time = 0.0
+        self._template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+    def duplicates(self, threshold=2):
+        """Query shapes run at least `threshold` times, most repeated first."""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 1),
+            'template_ms': round(self.template_time * 1000, 1),
+            'total_ms': round(self.total_time * 1000, 1),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'duplicate_shapes': len(self.duplicates()),
+        }
+
+
+#instrumentation
+def _execute_wrapper(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.db_time += time.perf_counter() - started
+        profile.queries += 1
+        profile.shapes[query_shape(sql)] += 1
+
+
+_patch_lock = threading.Lock()
+_patched = False
+
+
+def _patch_templates_and_cache():
+    """Wrap Template.render and the cache backends once per process."""
+    global _patched
+    with _patch_lock:
+        if _patched:
+            return
+        _patched = True
+
+        from django.core.cache import caches
+        from django.template.base import Template
+
+        original_render = Template.render
+
+        def render(self, context):
+            profile = _current.get()
+            if profile is None:
+                return original_render(self, context)
+            # Only time the outermost template so includes are not counted twice
+            profile._template_depth += 1
+            started = time.perf_counter()
+            try:
+                return original_render(self, context)
+            finally:
+                profile._template_depth -= 1
+                if profile._template_depth == 0:
+                    profile.template_time += time.perf_counter() - started
+
+        Template.render = render
+
+        sentinel = object()
+        for backend_class in {type(caches[alias]) for alias in settings.CACHES}:
+            original_get = backend_class.get
+
+            def get(self, key, default=None, version=None, _original=original_get):
+                value = _original(self, key, sentinel, version=version)
+                profile = _current.get()
+                if profile is not None:
+                    if value is sentinel:
+                        profile.cache_misses += 1
+                    else:
+                        profile.cache_hits += 1
+                return default if value is sentinel else value
+
+            backend_class.get = get
+
+
+@contextmanager
+def profile_queries():
+    """Collect a RequestProfile for everything run inside the block."""
+    _patch_templates_and_cache()
+    profile = RequestProfile()
+    token = _current.set(profile)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(_execute_wrapper))
+            yield profile
+    finally:
+        _current.reset(token)
+
+
+#slowest endpoints
+class EndpointStats:
+    """Rolling per-endpoint totals for this worker process."""
+
+    def __init__(self, size=50):
+        self.size = size
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def record(self, endpoint, profile):
+        data = profile.as_dict()
+        with self.lock:
+            stats = self.endpoints.setdefault(endpoint, {
+                'endpoint': endpoint, 'hits': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                'max_queries': 0, 'total_queries': 0, 'worst_duplicates': [],
+            })
+            stats['hits'] += 1
+            stats['total_ms'] += data['total_ms']
+            stats['total_queries'] += data['queries']
+            stats['max_queries'] = max(stats['max_queries'], data['queries'])
+            if data['total_ms'] >= stats['max_ms']:
+                stats['max_ms'] = data['total_ms']
+                stats['worst_duplicates'] = profile.duplicates(3)[:5]
+            if len(self.endpoints) > self.size * 2:
+                for name, _ in sorted(self.endpoints.items(), key=lambda item: item[1]['max_ms'])[:self.size]:
+                    del self.endpoints[name]
+
+    def slowest(self, limit=None):
+        with self.lock:
+            rows = [dict(stats, avg_ms=stats['total_ms'] / stats['hits'],
+                         avg_queries=stats['total_queries'] / stats['hits'])
+                    for stats in self.endpoints.values()]
+        rows.sort(key=lambda row: row['max_ms'], reverse=True)
+        return rows[:limit or self.size]
+
+    def clear(self):
+        with self.lock:
+            self.endpoints.clear()
+
+
+endpoint_stats = EndpointStats(getattr(settings, 'QUERY_PROFILER_TOP_N', 50))
+
+
+def server_timing(profile):
+    return ', '.join([
+        f'db;dur={profile.db_time * 1000:.1f};desc="{profile.queries} queries"',
+        f'tpl;dur={profile.template_time * 1000:.1f}',
+        f'cache;desc="{profile.cache_hits} hit/{profile.cache_misses} miss"',
+        f'total;dur={profile.total_time * 1000:.1f}',
+    ])
+
+
+def log_profile(endpoint, status, profile):
+    logger.info(json.dumps(dict(profile.as_dict(), endpoint=endpoint, status=status,
+                                duplicates=profile.duplicates(3)[:3])))
+
+
+#budgets
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def check_budget(profile, max_queries=None, max_duplicates=None, label=''):
+    problems = []
+    if max_queries is not None and profile.queries > max_queries:
+        problems.append(f"{profile.queries} queries (budget {max_queries})")
+    if max_duplicates is not None:
+        repeated = [(shape, count) for shape, count in profile.duplicates() if count > max_duplicates]
+        for shape, count in repeated[:3]:
+            problems.append(f"{count}x {shape[:200]}")
+    if problems:
+        raise QueryBudgetExceeded(f"{label or 'Block'} went over its query budget: " + '; '.join(problems))
+
+
+@contextmanager
+def query_budget(max_queries=None, max_duplicates=None, label=''):
+    """Fail (AssertionError) when the block runs too many or too repetitive queries."""
+    with profile_queries() as profile:
+        yield profile
+    check_budget(profile, max_queries, max_duplicates, label)
@@ -1,17 +1,19 @@
 import json
 from django.contrib import messages
 from django.core.files.storage import FileSystemStorage
-from django.http import HttpResponse, JsonResponse
+from django.db.models import Count
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import (HttpResponseRedirect, get_object_or_404,redirect, render)
 from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 
 from .forms import *
 from .models import *
+from .profiles import request_profile, save_changes
 
 
 def staff_home(request):
-    staff = get_object_or_404(Staff, admin=request.user)
+    staff = request_profile(request, Staff)
     items = NewsAndEvents.objects.all().order_by("-updated_date")
     total_students = Student.objects.filter(course=staff.course).count()
     total_leave = LeaveReportStaff.objects.filter(staff=staff).count()
@@ -21,8 +23,11 @@ def staff_home(request):
     total_attendance = attendance_list.count()
     attendance_list = []
     subject_list = []
+    # One grouped query, not one count per subject
+    attendance_by_subject = dict(Attendance.objects.order_by().values('subject_id')
+                                 .annotate(count=Count('pk')).values_list('subject_id', 'count'))
     for subject in subjects:
-        attendance_count = Attendance.objects.filter(subject=subject).count()
+        attendance_count = attendance_by_subject.get(subject.id, 0)
         subject_list.append(subject.name)
         attendance_list.append(attendance_count)
     context = {
@@ -41,8 +46,8 @@ def staff_home(request):
 
 def staff_take_attendance(request):
     try:
-        staff = Staff.objects.get(admin=request.user)
-    except Staff.DoesNotExist:
+        staff = request_profile(request, Staff)
+    except Http404:
         return HttpResponse("No staff record found for the current user. Please contact the admin.")
     
     subjects = Subject.objects.filter(staff_id=staff)
@@ -157,7 +162,7 @@ def save_attendance(request):
 
 
 def staff_update_attendance(request):
-    staff = get_object_or_404(Staff, admin=request.user)
+    staff = request_profile(request, Staff)
     subjects = Subject.objects.filter(staff_id=staff)
     sessions = Session.objects.all()
     context = {
@@ -254,7 +259,7 @@ def staff_feedback(request):
 
 
 def staff_view_profile(request):
-    staff = get_object_or_404(Staff, admin=request.user)
+    staff = request_profile(request, Staff)
     form = StaffEditForm(request.POST or None, request.FILES or None,instance=staff)
     context = {'form': form, 'page_title': 'View/Update Profile'}
     if request.method == 'POST':
@@ -279,7 +284,7 @@ def staff_view_profile(request):
                 admin.address = address
                 admin.gender = gender
                 admin.save()
-                staff.save()
+                save_changes(staff)
                 messages.success(request, "Profile Updated!")
                 return redirect(reverse('staff_view_profile'))
             else:
@@ -297,16 +302,15 @@ def staff_view_profile(request):
 def staff_fcmtoken(request):
     token = request.POST.get('token')
     try:
-        staff_user = get_object_or_404(CustomUser, id=request.user.id)
-        staff_user.fcm_token = token
-        staff_user.save()
+        request.user.fcm_token = token
+        request.user.save(update_fields=['fcm_token'])
         return HttpResponse("True")
     except Exception as e:
         return HttpResponse("False")
 
 
 def staff_view_notification(request):
-    staff = get_object_or_404(Staff, admin=request.user)
+    staff = request_profile(request, Staff)
     notifications = NotificationStaff.objects.filter(staff=staff)
     context = {
         'notifications': notifications,
@@ -316,7 +320,7 @@ def staff_view_notification(request):
 
 
 def staff_add_result(request):
-    staff = get_object_or_404(Staff, admin=request.user)
+    staff = request_profile(request, Staff)
     subjects = Subject.objects.filter(staff=staff)
     sessions = Session.objects.all()
     context = {
@@ -1,5 +1,147 @@
+import hashlib
+import os
+
+from django.core.files.storage import Storage, storages
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
 from storages.backends.s3boto3 import S3Boto3Storage
 
 class MediaStorage(S3Boto3Storage):
     location = 'media'
     file_overwrite = False
+
+
+#content addressed storage
+def content_hash(content):
+    """sha256 of an uploaded file, reusing the digest taken while it streamed in."""
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+    sha = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        sha.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return sha.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(Storage):
+    """
+    Wraps another configured storage and stores every distinct file once,
+    under cas/<aa>/<bb>/<sha256><ext>. Identical uploads from any app get the
+    same name (and so the same URL and CDN cache entry); Blob keeps a
+    reference count so the object is only removed when the last row lets go.
+
+    Files saved before this storage existed keep their old names and are
+    passed straight through to the wrapped backend. `download_name` gives the
+    file name to offer a downloader.
+    """
+    prefix = 'cas'
+
+    def __init__(self, backend='default'):
+        self.backend_alias = backend
+
+    @property
+    def backend(self):
+        return storages[self.backend_alias]
+
+    def blob_name(self, digest, original_name):
+        ext = os.path.splitext(original_name)[1].lower()
+        return f'{self.prefix}/{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+    def save(self, name, content, max_length=None):
+        from main_app.models import Blob
+
+        if not hasattr(content, 'chunks'):
+            from django.core.files import File
+            content = File(content, name)
+        digest = content_hash(content)
+        blob_name = self.blob_name(digest, name or content.name)
+        # The stored name is the hash, so keep the uploaded file's name for downloads
+        original_name = os.path.basename(getattr(content, 'name', None) or name or '')[:255]
+
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    blob, created = Blob.objects.get_or_create(
+                        sha256=digest, defaults={'name': blob_name, 'original_name': original_name,
+                                                 'size': content.size})
+            except IntegrityError:
+                blob, created = Blob.objects.get(sha256=digest), False
+            if not created:
+                Blob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+
+        if created or not self.backend.exists(blob.name):
+            if hasattr(content, 'seek'):
+                content.seek(0)
+            # _save, not save: the name is the content, so it must never get an
+            # available-name suffix (AWS_S3_FILE_OVERWRITE is off). Every writer
+            # of this name writes the same bytes.
+            stored = self.backend._save(blob.name, content)
+            if stored != blob.name:
+                # A local backend that refuses to overwrite: the object is already there
+                self.backend.delete(stored)
+        return blob.name
+
+    def delete(self, name):
+        from main_app.models import Blob
+
+        with transaction.atomic():
+            blob = Blob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                # Not a content addressed file
+                return self.backend.delete(name)
+            if blob.ref_count > 1:
+                Blob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+                return
+            blob.delete()
+        self.backend.delete(name)
+
+    #everything else goes to the wrapped storage
+    def _open(self, name, mode='rb'):
+        return self.backend.open(name, mode)
+
+    def exists(self, name):
+        return self.backend.exists(name)
+
+    def size(self, name):
+        return self.backend.size(name)
+
+    def url(self, name, *args, **kwargs):
+        return self.backend.url(name, *args, **kwargs)
+
+    def path(self, name):
+        return self.backend.path(name)
+
+    def listdir(self, path):
+        return self.backend.listdir(path)
+
+    def get_modified_time(self, name):
+        return self.backend.get_modified_time(name)
+
+    def get_created_time(self, name):
+        return self.backend.get_created_time(name)
+
+    def get_accessed_time(self, name):
+        return self.backend.get_accessed_time(name)
+
+
+def download_name(field_file):
+    """The name a download of `field_file` should get: the original upload name for content addressed files."""
+    from main_app.models import Blob
+
+    name = field_file.name
+    if name.startswith(f'{ContentAddressedStorage.prefix}/'):
+        original = Blob.objects.filter(name=name).values_list('original_name', flat=True).first()
+        if original:
+            return original
+    return os.path.basename(name)
+
+
+def content_addressed_storage():
+    """Storage callable for FileFields that should be deduplicated."""
+    return storages['content_addressed']
@@ -4,22 +4,27 @@ from datetime import datetime
 
 from django.contrib import messages
 from django.core.files.storage import FileSystemStorage
+from django.db.models import Count, Q
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import (HttpResponseRedirect, get_object_or_404,
                               redirect, render)
 from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from questpaper.models import *
+from . import attendance_archive
 from .forms import *
 from .models import *
+from .profiles import request_profile, save_changes
 
 # student home
 def student_home(request):
-    student = get_object_or_404(Student, admin=request.user)
+    student = request_profile(request, Student)
     items = NewsAndEvents.objects.all().order_by("-updated_date")
     total_subject = Subject.objects.filter(grade=student.grade).count()
-    total_attendance = AttendanceReport.objects.filter(student=student).count()
-    total_present = AttendanceReport.objects.filter(student=student, status=True).count()
+    session_id = attendance_archive.current_session_id()
+    reports = AttendanceReport.objects.current(session_id).filter(student=student)
+    total_attendance = reports.count()
+    total_present = reports.filter(status=True).count()
     
     if total_attendance == 0:  # Don't divide by zero
         percent_absent = percent_present = 0
@@ -31,13 +36,16 @@ def student_home(request):
     data_present = []
     data_absent = []
     subjects = Subject.objects.filter(grade=student.grade)
+    # Present and absent per subject in one grouped query, not two counts per subject
+    by_subject = {row['attendance__subject_id']: row for row in AttendanceReport.objects.filter(
+        attendance__in=Attendance.objects.current(session_id), student=student,
+    ).values('attendance__subject_id').annotate(
+        present=Count('pk', filter=Q(status=True)), absent=Count('pk', filter=Q(status=False)))}
     
     for subject in subjects:
-        attendance = Attendance.objects.filter(subject=subject)
-        present_count = AttendanceReport.objects.filter(
-            attendance__in=attendance, status=True, student=student).count()
-        absent_count = AttendanceReport.objects.filter(
-            attendance__in=attendance, status=False, student=student).count()
+        counts = by_subject.get(subject.id, {})
+        present_count = counts.get('present', 0)
+        absent_count = counts.get('absent', 0)
         
         subject_name.append(subject.name)
         data_present.append(present_count)
@@ -67,7 +75,7 @@ def student_home(request):
 
 #student add results(only class tests and informal assignments)
 def student_add_result(request):
-    staff = get_object_or_404(Staff, admin=request.user)
+    staff = request_profile(request, Staff)
     subjects = Subject.objects.filter(staff=staff)
     sessions = Session.objects.all()
     context = {
@@ -99,7 +107,7 @@ def student_add_result(request):
 #student take attendance
 def student_take_attendance(request):
     try:
-        student = get_object_or_404(Student, admin=request.user)
+        student = request_profile(request, Student)
         subjects = Subject.objects.filter(grade=student.grade)
         
         # Attempt to get sessions
@@ -117,7 +125,7 @@ def student_take_attendance(request):
     
 def submit_attendance(request):
     if request.method == 'POST':
-        student = get_object_or_404(Student, admin=request.user)
+        student = request_profile(request, Student)
         subject_id = request.POST.get('subject')
         session_id = request.POST.get('session')
         status = request.POST.get('status') == 'present'  # True if 'present', False if 'absent'
@@ -144,7 +152,7 @@ def submit_attendance(request):
 
 @ csrf_exempt
 def student_view_attendance(request):
-    student = get_object_or_404(Student, admin=request.user)
+    student = request_profile(request, Student)
     if request.method != 'POST':
         course = get_object_or_404(Course, id=student.course.id)
         context = {
@@ -226,7 +234,7 @@ def student_feedback(request):
 
 
 def student_view_profile(request):
-    student = get_object_or_404(Student, admin=request.user)
+    student = request_profile(request, Student)
     form = StudentEditForm(request.POST or None, request.FILES or None,
                            instance=student)
     context = {'form': form,
@@ -254,7 +262,7 @@ def student_view_profile(request):
                 admin.address = address
                 admin.gender = gender
                 admin.save()
-                student.save()
+                save_changes(student)
                 messages.success(request, "Profile Updated!")
                 return redirect(reverse('student_view_profile'))
             else:
@@ -268,17 +276,16 @@ def student_view_profile(request):
 @csrf_exempt
 def student_fcmtoken(request):
     token = request.POST.get('token')
-    student_user = get_object_or_404(CustomUser, id=request.user.id)
     try:
-        student_user.fcm_token = token
-        student_user.save()
+        request.user.fcm_token = token
+        request.user.save(update_fields=['fcm_token'])
         return HttpResponse("True")
     except Exception as e:
         return HttpResponse("False")
 
 
 def student_view_notification(request):
-    student = get_object_or_404(Student, admin=request.user)
+    student = request_profile(request, Student)
     notifications = NotificationStudent.objects.filter(student=student)
     context = {
         'notifications': notifications,
@@ -288,7 +295,7 @@ def student_view_notification(request):
 
 
 def student_view_result(request):
-    student = get_object_or_404(Student, admin=request.user)
+    student = request_profile(request, Student)
     results = StudentResult.objects.filter(student=student)
     context = {
         'results': results,
@@ -299,7 +306,7 @@ def student_view_result(request):
 
 # View for listing all question papers
 def question_paper_list(request):
-    student = get_object_or_404(Student, admin=request.user)
+    student = request_profile(request, Student)
     # Filter question papers based on the student's grade and subjects
     question_papers = QuestionPaper.objects.filter(
         grade=student.grade,
@@ -0,0 +1,162 @@
+"""
+Synthetic school data for benchmarks and index experiments.
+
+`generate(scale)` builds `scale` circuits, each with schools, courses, subjects,
+learners, educators, attendance, results and result sheet rows, using
+bulk_create so 100x data takes seconds rather than minutes. It also creates one user of every role,
+wired to the first school, for dashboard benchmarks. Call it inside a
+transaction you roll back afterwards.
+"""
+import datetime
+import random
+
+from django.contrib.auth.hashers import make_password
+
+from .models import (Admin, Attendance, AttendanceReport, Circuit, Circuit_Manager, Course,
+                     CustomUser, Educator, Grade, InformalStudentResult, NewsAndEvents, Parent,
+                     Principal, Session, Staff, Student, StudentResult, Subject, Term)
+
+SCHOOLS_PER_CIRCUIT = 2
+COURSES_PER_SCHOOL = 2
+SUBJECTS_PER_COURSE = 4
+STUDENTS_PER_COURSE = 10
+EDUCATORS_PER_SCHOOL = 2
+ATTENDANCE_DAYS = 5
+GRADE_NAMES = ['Grade 8', 'Grade 9', 'Grade 10', 'Grade 11', 'Grade 12']
+
+
+def _users(prefix, count, user_type, password):
+    users = [
+        CustomUser(
+            email=f'{prefix}-{i}@bench.example.com', first_name=prefix.title(), last_name=str(i),
+            user_type=str(user_type), gender=random.choice('MF'), address='', password=password,
+        )
+        for i in range(count)
+    ]
+    # bulk_create skips the post_save profile receivers; profiles are made below
+    return CustomUser.objects.bulk_create(users, batch_size=1000)
+
+
+def generate(scale=1, seed=1):
+    """Create a data set proportional to `scale` and return handles to it."""
+    from result.models import TakenCourse
+
+    from .models import School
+
+    random.seed(seed)
+    password = make_password(None)  # unusable, so no hashing cost
+    tag = f'bench{scale}-{random.randint(0, 10 ** 6)}'
+
+    session = Session.objects.create(start_year=datetime.date(2025, 1, 1), end_year=datetime.date(2025, 12, 31))
+    Term.objects.create(term_name='Term 1', is_current=True, session=session)
+    grades = Grade.objects.bulk_create([Grade(name=name) for name in GRADE_NAMES])
+    NewsAndEvents.objects.bulk_create([
+        NewsAndEvents(title=f'News {i}', summary='Synthetic news item', posted_as='News') for i in range(10)
+    ])
+
+    circuits = Circuit.objects.bulk_create([
+        Circuit(name=f'{tag} circuit {i}', contact='000', email='c@bench.example.com', whatsapp_number='000')
+        for i in range(scale)
+    ])
+    schools = School.objects.bulk_create([
+        School(emis=f'{tag}-{c.pk}-{i}', name=f'School {c.pk}-{i}', circuit=c, grade=random.choice(grades),
+               contact='000')
+        for c in circuits for i in range(SCHOOLS_PER_CIRCUIT)
+    ])
+    courses = Course.objects.bulk_create([
+        Course(name=f'Course {s.pk}-{i}', school=s) for s in schools for i in range(COURSES_PER_SCHOOL)
+    ])
+    course_grade = {course.pk: random.choice(grades) for course in courses}
+    subjects = Subject.objects.bulk_create([
+        Subject(name=f'Subject {c.pk}-{i}', course=c, grade=course_grade[c.pk])
+        for c in courses for i in range(SUBJECTS_PER_COURSE)
+    ])
+    school_of = {course.pk: course.school for course in courses}
+
+    # learners
+    student_users = _users(f'{tag}-learner', len(courses) * STUDENTS_PER_COURSE, 3, password)
+    students = Student.objects.bulk_create([
+        Student(admin=user, course=course, school=school_of[course.pk], circuit=school_of[course.pk].circuit,
+                grade=course_grade[course.pk], session=session)
+        for user, course in zip(student_users, [c for c in courses for _ in range(STUDENTS_PER_COURSE)])
+    ], batch_size=1000)
+
+    # educators
+    educator_users = _users(f'{tag}-educator', len(schools) * EDUCATORS_PER_SCHOOL, 5, password)
+    educator_schools = [s for s in schools for _ in range(EDUCATORS_PER_SCHOOL)]
+    educators = Educator.objects.bulk_create([
+        Educator(admin=user, school=school, circuit=school.circuit, session=session,
+                 course=random.choice([c for c in courses if c.school_id == school.pk]))
+        for user, school in zip(educator_users, educator_schools)
+    ], batch_size=1000)
+
+    # attendance and results
+    subjects_by_course = {}
+    for subject in subjects:
+        subjects_by_course.setdefault(subject.course_id, []).append(subject)
+    students_by_course = {}
+    for student in students:
+        students_by_course.setdefault(student.course_id, []).append(student)
+
+    start = datetime.date(2025, 2, 3)
+    attendances = Attendance.objects.bulk_create([
+        Attendance(session=session, subject=subject, grade=subject.grade, date=start + datetime.timedelta(days=d))
+        for subject in subjects for d in range(ATTENDANCE_DAYS)
+    ], batch_size=2000)
+    AttendanceReport.objects.bulk_create([
+        AttendanceReport(student=student, attendance=attendance, session=session, status=random.random() < 0.9)
+        for attendance in attendances
+        for student in students_by_course[attendance.subject.course_id]
+    ], batch_size=5000)
+    StudentResult.objects.bulk_create([
+        StudentResult(student=student, subject=subject, assignment=random.randint(0, 100),
+                      test=random.randint(0, 100), exam=random.randint(0, 100))
+        for course_id, course_students in students_by_course.items()
+        for student in course_students for subject in subjects_by_course[course_id]
+    ], batch_size=5000)
+    InformalStudentResult.objects.bulk_create([
+        InformalStudentResult(student=student, subject=subject, informaltest=random.randint(0, 100))
+        for course_id, course_students in students_by_course.items()
+        for student in course_students for subject in subjects_by_course[course_id]
+    ], batch_size=5000)
+    totals = {student.pk: random.randint(20, 100) for student in students}
+    TakenCourse.objects.bulk_create([
+        TakenCourse(student=student, course_id=student.course_id, total=totals[student.pk],
+                    grade='A' if totals[student.pk] >= 50 else 'F',
+                    comment='PASS' if totals[student.pk] >= 50 else 'FAIL')
+        for student in students
+    ], batch_size=5000)
+
+    # one user per role, attached to the first school
+    school, course = schools[0], courses[0]
+    roles = {}
+    for user_type, name in ((1, 'hod'), (2, 'staff'), (4, 'principal'), (6, 'circuit_manager'), (7, 'parent')):
+        roles[name] = _users(f'{tag}-{name}', 1, user_type, password)[0]
+    Admin.objects.create(admin=roles['hod'])
+    Staff.objects.create(admin=roles['staff'], course=course)
+    Principal.objects.create(admin=roles['principal'], school=school, circuit=school.circuit, course=course,
+                             grade=course_grade[course.pk])
+    Circuit_Manager.objects.create(admin=roles['circuit_manager'], circuit=school.circuit)
+    parent = Parent.objects.create(admin=roles['parent'], school=school)
+    parent.student.add(*students_by_course[course.pk][:2])
+    roles['student'] = students_by_course[course.pk][0].admin
+    roles['educator'] = educators[0].admin
+    roles['superuser'] = roles['hod']
+    CustomUser.objects.filter(pk=roles['hod'].pk).update(is_superuser=True, is_staff=True)
+
+    return {
+        'scale': scale,
+        'session': session,
+        'circuits': circuits,
+        'schools': schools,
+        'courses': courses,
+        'subjects': subjects,
+        'students': students,
+        'educators': educators,
+        'users': roles,
+        'rows': {
+            'students': len(students),
+            'attendance': len(attendances),
+            'attendance_reports': AttendanceReport.objects.filter(attendance__session=session).count(),
+        },
+    }
@@ -0,0 +1,84 @@
+from django import template
+from django.conf import settings
+from django.utils.html import format_html
+
+from main_app.imaging import get_variants, get_variants_many, pick_width
+
+register = template.Library()
+
+
+def _url(field_file, name):
+    return field_file.storage.url(name)
+
+
+def _original_url(field_file):
+    try:
+        return field_file.url
+    except ValueError:
+        return settings.MEDIA_URL + "default.png"
+
+
+def _variants(field_file, resolved=None):
+    if not field_file:
+        return {}
+    if resolved is not None and field_file.name in resolved:
+        return resolved[field_file.name]
+    return get_variants(field_file.name)
+
+
+def _fallback_url(field_file, variants, width):
+    chosen = pick_width(variants, width)
+    if chosen is None:
+        return _original_url(field_file)
+    return _url(field_file, variants[chosen]['original'])
+
+
+@register.simple_tag
+def image_variants(objects, field_name):
+    """
+    Resolve the derivatives of a whole page of images at once, for
+    `responsive_image ... variants=...` inside the loop.
+
+        {% image_variants photos "image" as photo_variants %}
+    """
+    return get_variants_many(getattr(getattr(obj, field_name, None), 'name', None) for obj in objects)
+
+
+@register.filter
+def derivative_url(field_file, width):
+    """
+    URL of the resized copy closest to `width`, falling back to the original
+    while derivatives are still being generated.
+
+        <img src="{{ photo.image|derivative_url:320 }}">
+    """
+    return _fallback_url(field_file, _variants(field_file), int(width))
+
+
+@register.simple_tag
+def responsive_image(field_file, width, alt='', css_class='', sizes=None, style='', variants=None):
+    """
+    <picture> element with WebP and original-format srcsets. `variants` is
+    the result of `image_variants` for the page, if it was resolved.
+
+        {% responsive_image photo.image 640 alt=photo.description css_class="image-thumbnail" %}
+    """
+    width = int(width)
+    found = _variants(field_file, variants)
+    fallback = _fallback_url(field_file, found, width)
+    if not found:
+        return format_html('<img src="{}" alt="{}" class="{}" style="{}" loading="lazy">',
+                           fallback, alt, css_class, style)
+
+    sizes = sizes or f'(max-width: {width}px) 100vw, {width}px'
+    widths = sorted(found, key=int)
+
+    def srcset(fmt):
+        return ', '.join(f'{_url(field_file, found[w][fmt])} {w}w' for w in widths)
+
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" style="{}" loading="lazy" decoding="async">'
+        '</picture>',
+        srcset('webp'), sizes, fallback, srcset('original'), sizes, alt, css_class, style,
+    )
@@ -1,3 +1,315 @@
-from django.test import TestCase
+import asyncio
+import contextvars
+from datetime import time, timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import ai_gateway, ai_limits, ai_stream, video_processing
+from .db_routers import RailwayRouter, use_database, use_replica
+from .models import AIChatLog, Course, CustomUser, Grade, Session, Subject, Timetable, Video
+from .profiling import QueryBudgetExceeded, query_budget, query_shape
+from .timetables import weekly_grid
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def model(app_label):
+    return SimpleNamespace(_meta=SimpleNamespace(app_label=app_label))
+
+
+def fresh(fn):
+    """Run fn in an empty context, so the router's per-request state does not leak between tests."""
+    return contextvars.Context().run(fn)
+
+
+#router
+@mock.patch('main_app.db_routers.choose_replica', return_value='replica')
+class RouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = RailwayRouter()
+
+    def test_writes_go_to_the_primary(self, choose):
+        self.assertEqual(fresh(lambda: self.router.db_for_write(model('main_app'))), 'default')
+
+    def test_railway_apps(self, choose):
+        self.assertEqual(fresh(lambda: self.router.db_for_read(model('analytics'))), 'railway')
+        self.assertEqual(fresh(lambda: self.router.db_for_write(model('backup'))), 'railway')
+
+    def test_reads_use_the_default_outside_use_replica(self, choose):
+        self.assertIsNone(fresh(lambda: self.router.db_for_read(model('main_app'))))
+
+    def test_reads_in_use_replica_go_to_a_replica(self, choose):
+        def read():
+            with use_replica():
+                return self.router.db_for_read(model('main_app'))
+        self.assertEqual(fresh(read), 'replica')
+
+    def test_reads_after_a_write_stay_on_the_primary(self, choose):
+        def read_after_write():
+            with use_replica():
+                self.router.db_for_write(model('main_app'))
+                return self.router.db_for_read(model('main_app'))
+        self.assertIsNone(fresh(read_after_write))
+
+    def test_cache_and_sessions_are_read_from_the_primary_and_do_not_pin(self, choose):
+        def read():
+            with use_replica():
+                cache_db = self.router.db_for_read(model('django_cache'))
+                session_db = self.router.db_for_read(model('sessions'))
+                self.router.db_for_write(model('django_cache'))
+                self.router.db_for_write(model('sessions'))
+                return cache_db, session_db, self.router.db_for_read(model('main_app'))
+        self.assertEqual(fresh(read), ('default', 'default', 'replica'))
+
+    def test_use_database(self, choose):
+        def read_and_write():
+            with use_database('railway'):
+                return self.router.db_for_read(model('main_app')), self.router.db_for_write(model('main_app'))
+        self.assertEqual(fresh(read_and_write), ('railway', 'railway'))
+
+    @override_settings(DATABASE_REPLICAS={'default': 1})
+    def test_use_database_never_writes_to_a_replica(self, choose):
+        def write():
+            with use_database('default'):
+                return self.router.db_for_write(model('main_app'))
+        self.assertEqual(fresh(write), 'default')
+
+
+#query budgets
+class QueryBudgetTests(TestCase):
+    def test_query_shape_ignores_literals(self):
+        self.assertEqual(query_shape("SELECT * FROM t WHERE id = 5 AND name = 'a'"),
+                         query_shape("SELECT * FROM t WHERE id = 42 AND name = 'b'"))
+
+    def test_within_budget(self):
+        with query_budget(max_queries=1) as profile:
+            Session.objects.count()
+        self.assertEqual(profile.queries, 1)
+
+    def test_too_many_queries(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(max_queries=1):
+                Session.objects.count()
+                Session.objects.count()
+
+    def test_repeated_queries(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(max_duplicates=2):
+                for pk in range(3):
+                    Session.objects.filter(pk=pk).first()
+
+
+# Local memory, so only the grid's own queries are counted
+@override_settings(CACHES=LOCMEM_CACHES)
+class TimetableQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user('hod@example.com', 'secret', user_type='1',
+                                                   first_name='Head', last_name='Teacher', gender='M')
+        self.grade = Grade.objects.create(name='Grade 10')
+        self.course = Course.objects.create(name='Science')
+        self.subject = Subject.objects.create(name='Physics', grade=self.grade, course=self.course)
+        self.educator = CustomUser.objects.create_user('educator@example.com', 'secret', user_type='5',
+                                                       first_name='Ed', last_name='Ucator',
+                                                       gender='F').educator
+
+    def add_slots(self, count):
+        for hour in range(8, 8 + count):
+            slot = Timetable.objects.create(day='Monday', grade=self.grade, course=self.course,
+                                            start_time=time(hour), end_time=time(hour, 45),
+                                            created_by=self.user)
+            slot.subjects.add(self.subject)
+            slot.educators.add(self.educator)
+
+    def grid_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            weekly_grid(self.user)
+        return len(captured)
+
+    def test_grid_queries_do_not_grow_with_slots(self):
+        self.add_slots(1)
+        one = self.grid_queries()
+        self.add_slots(5)
+        self.assertEqual(self.grid_queries(), one)
+
+    def test_grid_budget(self):
+        self.add_slots(6)
+        cache.clear()
+        # slots with grade and course, subjects, educators, their users
+        with query_budget(max_queries=4, max_duplicates=1, label='weekly_grid'):
+            grid = weekly_grid(self.user)
+        self.assertEqual(len(grid[0]['slots']), 6)
+
+
+class RoleRequiredTests(TestCase):
+    def test_other_roles_are_refused(self):
+        student = CustomUser.objects.create_user('student@example.com', 'secret', user_type='3',
+                                                 first_name='Stu', last_name='Dent', gender='F')
+        self.client.force_login(student)
+        self.assertEqual(self.client.get(reverse('ai_usage')).status_code, 403)
+
+    def test_anonymous_is_refused(self):
+        self.assertEqual(self.client.get(reverse('ai_usage')).status_code, 403)
+
+
+#AI gateway and streaming
+class GatewayTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        ai_gateway.answers.clear()
+
+    def test_equivalent_questions_share_a_key(self):
+        self.assertEqual(ai_gateway.prompt_key('career', 'What is NSFAS?'),
+                         ai_gateway.prompt_key('career', '  what is nsfas '))
+        self.assertNotEqual(ai_gateway.prompt_key('career', 'What is NSFAS?'),
+                            ai_gateway.prompt_key('bursary', 'What is NSFAS?'))
+
+    def test_lru_cache_evicts_the_oldest(self):
+        answers = ai_gateway.LRUCache(size=2)
+        answers.set('a', 1)
+        answers.set('b', 2)
+        answers.get('a')
+        answers.set('c', 3)
+        self.assertEqual((answers.get('a'), answers.get('b'), answers.get('c')), (1, None, 3))
+
+    def test_lookup_reuses_a_logged_answer(self):
+        key, answer = ai_gateway.lookup('What is NSFAS?', 'career')
+        self.assertIsNone(answer)
+        ai_gateway.log_exchange(key, 'What is NSFAS?', 'career', 'A bursary scheme.', False)
+        ai_gateway.answers.clear()
+        self.assertEqual(ai_gateway.lookup('what is nsfas', 'career'), (key, 'A bursary scheme.'))
+
+    def test_unavailable_answers_are_not_reused(self):
+        key, _ = ai_gateway.lookup('What is NSFAS?', 'career')
+        ai_gateway.log_exchange(key, 'What is NSFAS?', 'career', ai_gateway.UNAVAILABLE, False)
+        self.assertEqual(ai_gateway.lookup('What is NSFAS?', 'career'), (key, None))
+
+    def test_assessment_questions_are_not_cached(self):
+        key, _ = ai_gateway.lookup('Mark my essay', 'assessment')
+        ai_gateway.log_exchange(key, 'Mark my essay', 'assessment', 'Good work.', False)
+        self.assertEqual(ai_gateway.lookup('Mark my essay', 'assessment'), (key, None))
+
+
+@override_settings(AI_RATE_LIMITS={'ip': {'capacity': 1, 'per_minute': 1}})
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bucket_refuses_once_empty(self):
+        self.assertEqual(ai_limits.take([('ip', '10.0.0.1')], 0), 0)
+        with self.assertRaises(ai_limits.RateLimited):
+            ai_limits.take([('ip', '10.0.0.1')], 0)
+        # other callers have their own bucket
+        self.assertEqual(ai_limits.take([('ip', '10.0.0.2')], 0), 0)
+
+
+# admit() runs on its own thread and database connection, which under SQLite
+# would wait forever on the locks held by a TestCase transaction
+@override_settings(AI_STREAM_BACKEND='fake', AI_FAKE_TOKEN_DELAY=0, AI_STREAM_MAX_TOKENS=50)
+class StreamTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        ai_gateway.answers.clear()
+
+    def stream(self, question, question_type='career'):
+        async def collect():
+            return [event async for event in ai_stream.stream_answer(question, question_type,
+                                                                     ip_address='10.0.0.1')]
+        return async_to_sync(collect)()
+
+    def test_streams_tokens_then_logs_the_answer(self):
+        events = self.stream('What is NSFAS?')
+        self.assertEqual(events[0], ': stream open\n\n')
+        self.assertTrue(all(event.startswith('event: token') for event in events[1:-1]))
+        self.assertEqual(events[-1], ai_stream.sse('done', {'cached': False}))
+        log = AIChatLog.objects.get()
+        self.assertFalse(log.cached)
+        self.assertIn('NSFAS', log.response)
+        self.assertGreater(log.completion_tokens, 0)
+
+    def test_repeated_question_is_served_from_the_cache(self):
+        self.stream('What is NSFAS?')
+        answer = AIChatLog.objects.get().response
+        events = self.stream('what is nsfas')
+        self.assertEqual(events[1:], [ai_stream.sse('token', {'text': answer}),
+                                      ai_stream.sse('done', {'cached': True})])
+        self.assertEqual(AIChatLog.objects.filter(cached=True).count(), 1)
+
+    def stream_together(self, *questions):
+        async def collect(question):
+            return [event async for event in ai_stream.stream_answer(question, 'career', ip_address='10.0.0.1')]
+
+        async def together():
+            return await asyncio.gather(*(collect(question) for question in questions))
+        return async_to_sync(together)()
+
+    @override_settings(AI_FAKE_TOKEN_DELAY=0.01)
+    def test_questions_asked_together_share_one_answer(self):
+        first, second = self.stream_together('What is NSFAS?', 'what is nsfas')
+        answer = AIChatLog.objects.get(cached=False).response
+        self.assertEqual(first[-1], ai_stream.sse('done', {'cached': False}))
+        self.assertEqual(second[1:], [ai_stream.sse('token', {'text': answer}),
+                                      ai_stream.sse('done', {'cached': True})])
+        self.assertEqual(AIChatLog.objects.filter(cached=True).count(), 1)
+        self.assertEqual(ai_gateway.flights.calls, {})
+
+    def test_errors_are_shared_but_not_cached(self):
+        calls = []
+
+        async def failing(prompt, model, max_tokens):
+            calls.append(prompt)
+            await asyncio.sleep(0.05)
+            raise httpx.ReadTimeout('upstream is slow')
+            yield
+
+        with mock.patch.dict(ai_stream.BACKENDS, fake=failing):
+            first, second = self.stream_together('What is NSFAS?', 'what is nsfas')
+        error = ai_stream.sse('error', {'message': ai_gateway.UNAVAILABLE})
+        self.assertEqual((first[-1], second[-1], len(calls)), (error, error, 1))
+        self.assertEqual(AIChatLog.objects.count(), 0)
+        # the next asker goes upstream again
+        self.assertEqual(self.stream('What is NSFAS?')[-1], ai_stream.sse('done', {'cached': False}))
+
+    @override_settings(AI_RATE_LIMITS={'ip': {'capacity': 1, 'per_minute': 1}}, AI_QUEUE_TIMEOUT=0)
+    def test_rate_limited_stream_reports_an_error(self):
+        self.stream('What is NSFAS?')
+        events = self.stream('What is a bursary?')
+        self.assertTrue(events[-1].startswith('event: error'))
+        self.assertEqual(AIChatLog.objects.count(), 1)
+
+
+#video processing
+@mock.patch('main_app.management.commands.process_videos.process_video')
+class ProcessVideosTests(TestCase):
+    def setUp(self):
+        self.author = CustomUser.objects.create_user('author@example.com', 'secret', user_type='8',
+                                                     first_name='Ada', last_name='Author', gender='F')
+
+    def video(self, status, claimed_ago=None):
+        started = timezone.now() - timedelta(seconds=claimed_ago) if claimed_ago is not None else None
+        return Video.objects.create(author=self.author, title=status, video_file='videos/talk.mp4',
+                                    processing_status=status, processing_started_at=started)
+
+    def test_abandoned_videos_are_reclaimed(self, process):
+        pending = self.video(Video.PENDING)
+        abandoned = self.video(Video.PROCESSING, claimed_ago=video_processing.CLAIM_TIMEOUT + 60)
+        self.video(Video.PROCESSING, claimed_ago=60)
+        self.video(Video.READY)
+        call_command('process_videos', stdout=StringIO())
+        self.assertEqual(sorted(call.args[0] for call in process.call_args_list),
+                         [pending.pk, abandoned.pk])
+        abandoned.refresh_from_db()
+        self.assertGreater(abandoned.processing_started_at, timezone.now() - timedelta(minutes=1))
@@ -0,0 +1,163 @@
+"""
+Timetable clash detection and cached weekly grids.
+
+A slot clashes when it overlaps another slot on the same day for one of its
+educators, or for the same grade and course. `clashes` loads that day's
+slots for those keys with one indexed query and puts each key's slots in an
+IntervalIndex. The index is kept sorted by start time with the running
+maximum end time, so one bisect finds the slots starting before the new one
+ends. Walking back from there stops at the first slot whose running end is
+no later than the new start. Without existing clashes that is O(log n) per
+key, and overlaps already in the data are still all found.
+
+TimetableForm.clean runs the check, because a slot's educators are only
+known from the form until save_m2m.
+
+`weekly_grid` gives the slots a user sees, by day and start time, built with
+select_related/prefetch_related and cached per user for
+TIMETABLE_CACHE_SECONDS. Any change to a slot, its subjects or educators, or
+to a student's or educator's grade and course bumps a version kept in the
+shared cache (CACHES), so every worker starts new cache keys at once.
+"""
+import time
+from bisect import bisect_left
+from itertools import accumulate
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from .models import Educator, Student, Timetable
+
+DAYS = [day for day, _ in Timetable.DAY_CHOICES]
+VERSION_KEY = 'timetable:version'
+
+
+class IntervalIndex:
+    """The (start, end, id) slots of one educator, or one grade and course, on one day."""
+
+    def __init__(self, slots=()):
+        self.slots = sorted(slots)
+        self.starts = [start for start, _, _ in self.slots]
+        # reach[i]: latest end among slots[:i + 1]
+        self.reach = list(accumulate((end for _, end, _ in self.slots), max))
+
+    def overlapping(self, start, end, exclude=None):
+        """Ids of the slots overlapping [start, end); touching ends do not overlap."""
+        found = []
+        index = bisect_left(self.starts, end) - 1
+        while index >= 0 and self.reach[index] > start:
+            slot_start, slot_end, pk = self.slots[index]
+            if slot_end > start and pk != exclude:
+                found.append(pk)
+            index -= 1
+        return found
+
+
+def _indexes(day, grade, course, educators):
+    """{('educator', id) or ('class', grade id, course id): IntervalIndex} for the slots on `day`."""
+    educator_ids = [educator.pk for educator in educators]
+    keyed = {}
+    rows = (Timetable.educators.through.objects
+            .filter(timetable__day=day, educator_id__in=educator_ids)
+            .values_list('educator_id', 'timetable__start_time', 'timetable__end_time', 'timetable_id'))
+    for educator_id, start, end, pk in rows:
+        keyed.setdefault(('educator', educator_id), []).append((start, end, pk))
+    if grade is not None and course is not None:
+        rows = (Timetable.objects.filter(day=day, grade=grade, course=course)
+                .values_list('start_time', 'end_time', 'id'))
+        keyed[('class', grade.pk, course.pk)] = list(rows)
+    return {key: IntervalIndex(slots) for key, slots in keyed.items()}
+
+
+def clashes(day, start, end, grade=None, course=None, educators=(), exclude=None):
+    """Messages describing the slots that [start, end) on `day` would overlap."""
+    indexes = _indexes(day, grade, course, educators)
+    found = {}
+    for educator in educators:
+        index = indexes.get(('educator', educator.pk))
+        for pk in index.overlapping(start, end, exclude) if index else ():
+            found.setdefault(pk, []).append(str(educator))
+    if grade is not None and course is not None:
+        for pk in indexes[('class', grade.pk, course.pk)].overlapping(start, end, exclude):
+            found.setdefault(pk, []).append(f"{grade.name} ({course.name})")
+    slots = Timetable.objects.filter(pk__in=found).order_by('start_time')
+    return [f"{', '.join(found[slot.pk])} already booked on {slot.day} "
+            f"{slot.start_time:%H:%M}-{slot.end_time:%H:%M}" for slot in slots]
+
+
+#weekly grids
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Seeded from the clock, so a lost version never comes back to the keys of old grids
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def forget_grids(sender, **kwargs):
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def forget_profile_grids(sender, update_fields=None, **kwargs):
+    if update_fields is None or {'grade', 'course'} & set(update_fields):
+        forget_grids(sender)
+
+
+def connect_signals():
+    post_save.connect(forget_grids, sender=Timetable, dispatch_uid='timetable_grid_save')
+    post_delete.connect(forget_grids, sender=Timetable, dispatch_uid='timetable_grid_delete')
+    m2m_changed.connect(forget_grids, sender=Timetable.subjects.through, dispatch_uid='timetable_grid_subjects')
+    m2m_changed.connect(forget_grids, sender=Timetable.educators.through, dispatch_uid='timetable_grid_educators')
+    for model in (Student, Educator):
+        post_save.connect(forget_profile_grids, sender=model, dispatch_uid=f'timetable_grid_{model.__name__}')
+
+
+def slots_for(user):
+    """The timetable slots `user` sees, or None for a role without a timetable."""
+    if user.user_type == "3":
+        student = Student.objects.filter(admin=user).first()
+        if student is None:
+            return Timetable.objects.none()
+        return Timetable.objects.filter(grade=student.grade, course=student.course)
+    if user.user_type == "5":
+        educator = Educator.objects.filter(admin=user).first()
+        if educator is None:
+            return Timetable.objects.none()
+        return Timetable.objects.filter(
+            Q(educators=educator) | Q(grade=educator.grade, course=educator.course)).distinct()
+    if user.user_type in ["1", "4", "6"]:
+        return Timetable.objects.all()
+    return None
+
+
+def weekly_grid(user):
+    """[{'day', 'slots'}] Monday to Saturday, each slot a dict ordered by start time; cached per user."""
+    key = f'timetable:grid:{_version()}:{user.pk}'
+    grid = cache.get(key)
+    if grid is not None:
+        return grid
+
+    by_day = {day: [] for day in DAYS}
+    slots = slots_for(user)
+    if slots is not None:
+        slots = (slots.select_related('grade', 'course')
+                 .prefetch_related('subjects', 'educators__admin').order_by('start_time', 'id'))
+        for slot in slots:
+            by_day.setdefault(slot.day, []).append({
+                'id': slot.id,
+                'start_time': slot.start_time,
+                'end_time': slot.end_time,
+                'grade': slot.grade.name if slot.grade else '',
+                'course': slot.course.name if slot.course else '',
+                'subjects': [(subject.id, subject.name) for subject in slot.subjects.all()],
+                'educators': [str(educator) for educator in slot.educators.all()],
+            })
+    grid = [{'day': day, 'slots': slots} for day, slots in by_day.items()]
+    cache.set(key, grid, getattr(settings, 'TIMETABLE_CACHE_SECONDS', 3600))
+    return grid
@@ -30,6 +30,8 @@ urlpatterns = [
     path("doLogin/", views.doLogin, name='user_login'),
     path("logout_user/", views.logout_user, name='user_logout'),
     path("admin/home/", hod_views.admin_home, name='admin_home'),
+    path("admin/query-profile/", hod_views.query_profile_view, name='query_profile'),
+    path("admin/ai-usage/", hod_views.ai_usage_view, name='ai_usage'),
     path("staff/add", hod_views.add_staff, name='add_staff'),
     path("term/add", hod_views.add_term, name='add_term'),
     path("course/add", hod_views.add_course, name='add_course'),
@@ -76,6 +78,9 @@ urlpatterns = [
     path("parent/add/", hod_views.add_parent, name='add_parent'),
     path("member/add/", hod_views.add_member, name='add_member'),
     path("add_cwa_admin/add/", hod_views.add_cwa_admin, name='add_cwa_admin'),
+    path("users/bulk-enroll/", hod_views.bulk_enroll, name='bulk_enroll'),
+    path("exports/<str:name>/", hod_views.export_data, name='export_data'),
+    path("school-performance/", hod_views.school_performance_view, name='school_performance_view'),
 
     
     #manager
@@ -203,6 +208,13 @@ urlpatterns = [
     #principal
     path('principal/home/', principal_views.principal_home, name='principal_home'),
     path('principal/view_attendance/', principal_views.principal_view_attendance, name='principal_view_attendance'),
+    path('principal/attendance_reports/', principal_views.principal_view_attendance_report,
+         name='principal_view_attendance_report'),
+    path('principal/attendance/data/', principal_views.principal_attendance_data, name='principal_attendance_data'),
+    path('principal/student_results/', principal_views.principal_view_student_results,
+         name='principal_view_student_results'),
+    path('principal/results/data/', principal_views.principal_results_data, name='principal_results_data'),
+    path('principal/exports/<str:name>/', principal_views.principal_export_data, name='principal_export_data'),
     path('principal/view_results/', principal_views.principal_view_results, name='principal_view_results'),
     path('principal/manage_parents/', principal_views.principal_manage_parents, name='principal_manage_parents'),
     path('principal/manage_members/', principal_views.principal_manage_members, name='principal_manage_members'),
@@ -242,6 +254,19 @@ urlpatterns = [
     
     # Result URLs
     path('results/', circuit_manager_views.circuit_manager_view_results, name='circuit_manager_view_results'),
+    path('results/data/', circuit_manager_views.circuit_manager_results_data, name='circuit_manager_results_data'),
+    path('circuit_manager/exports/<str:name>/', circuit_manager_views.circuit_manager_export_data,
+         name='circuit_manager_export_data'),
+    path('circuit_manager/analytics/', circuit_manager_views.circuit_manager_analytics,
+         name='circuit_manager_analytics'),
+    path('circuit_manager/analytics/data/', circuit_manager_views.circuit_manager_analytics_data,
+         name='circuit_manager_analytics_data'),
+
+    # Attendance Report URLs
+    path('attendance_reports/', circuit_manager_views.circuit_manager_view_attendance_reports,
+         name='circuit_manager_view_attendance_reports'),
+    path('attendance_reports/data/', circuit_manager_views.circuit_manager_attendance_data,
+         name='circuit_manager_attendance_data'),
 
     # Parent URLs
     path('parents/', circuit_manager_views.circuit_manager_manage_parents, name='circuit_manager_manage_parents'),
@@ -263,6 +288,7 @@ urlpatterns = [
     path('educator/students/', educator_views.educator_view_students, name='educator_view_students'),
     path('educator/attendance/', educator_views.educator_view_attendance, name='educator_view_attendance'),
     path('educator/results/', educator_views.educator_view_results, name='educator_view_results'),
+    path('educator/results/data/', educator_views.educator_results_data, name='educator_results_data'),
     # path('educator/profile/', educator_views.educator_view_profile, name='educator_view_profile'),
     path('educator/fetch_student_attendance/', educator_views.fetch_student_attendance, name='fetch_student_attendance'),
     path('educator/fetch_student_results/', educator_views.fetch_student_results, name='fetch_student_results'),
@@ -382,11 +408,17 @@ urlpatterns = [
     path('videos/', views.videos_view, name='videos'),
     path('videos/add/', views.video_add_view, name='video_add'),
     path('videos/<int:video_id>/', views.show_video, name='show_video'),
+    path('videos/<int:video_id>/hls/master.m3u8', views.video_hls, name='video_hls'),
+    path('videos/<int:video_id>/hls/<str:name>/index.m3u8', views.video_hls_rendition, name='video_hls_rendition'),
     
     # AJAX endpoints for likes and comments
     path('videos/<int:video_id>/like/', views.like_video, name='like_video'),
     path('videos/<int:video_id>/comment/', views.add_comment, name='add_comment'),
     path('videos/<int:video_id>/comments/', views.get_comments, name='get_comments'),
+
+    #AI assistant
+    path('assistant/', views.ai_assistant, name='ai_assistant'),
+    path('assistant/stream/', views.ai_assistant_stream, name='ai_assistant_stream'),
     
     #Course
     path('upload-excel/', hod_views.upload_courses_from_excel, name='upload_courses_excel'),
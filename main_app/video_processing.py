@@ -0,0 +1,278 @@
+"""
+Offline processing for uploaded videos, using the ffmpeg binary shipped with
+imageio-ffmpeg.
+
+For each Video this:
+  - probes duration and frame size,
+  - extracts a poster frame when no thumbnail was uploaded,
+  - transcodes low and mid bitrate MP4 renditions plus HLS segments,
+and stores everything under videos/renditions/<id>/ in the default storage.
+
+Transcoding runs outside the web process: `process_videos --watch` (the
+Procfile worker) polls for pending videos. With VIDEO_PROCESSING_IN_WEB the
+upload view queues it on a small thread pool instead, for single-process
+setups.
+
+The bucket is private, so players cannot follow the relative URIs of stored
+playlists. The playlists are served through Django instead (see
+`signed_media_playlist`), with every segment rewritten to a signed URL.
+"""
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# name, frame height, video bitrate, audio bitrate
+RENDITIONS = getattr(settings, 'VIDEO_RENDITIONS', (
+    ('360p', 360, '600k', '64k'),
+    ('720p', 720, '1800k', '128k'),
+))
+HLS_SEGMENT_SECONDS = 6
+POSTER_WIDTH = 1280
+FFMPEG_TIMEOUT = getattr(settings, 'VIDEO_FFMPEG_TIMEOUT', 60 * 30)
+# Signed segment URLs outlive the video by this much, so a paused player can resume
+HLS_URL_EXPIRY = getattr(settings, 'VIDEO_HLS_URL_EXPIRY', 60 * 60)
+# A video claimed longer ago than every ffmpeg step timing out, plus time for
+# copying files, belongs to a worker that died; it is picked up again
+CLAIM_TIMEOUT = getattr(settings, 'VIDEO_CLAIM_TIMEOUT', FFMPEG_TIMEOUT * (len(RENDITIONS) + 1) + 30 * 60)
+
+executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'VIDEO_PROCESSING_WORKERS', 1),
+    thread_name_prefix='video-processing',
+)
+
+
+def ffmpeg_exe():
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def run_ffmpeg(*args):
+    command = [ffmpeg_exe(), '-hide_banner', '-loglevel', 'error', '-y', *args]
+    subprocess.run(command, check=True, capture_output=True, timeout=FFMPEG_TIMEOUT)
+
+
+def probe(path):
+    """Return (duration in seconds, width, height) of a local video file."""
+    import imageio_ffmpeg
+
+    reader = imageio_ffmpeg.read_frames(path)
+    try:
+        meta = next(reader)
+    finally:
+        reader.close()
+    width, height = meta.get('size') or (0, 0)
+    return meta.get('duration') or 0.0, width, height
+
+
+#steps
+def extract_poster(source, duration, workdir):
+    poster = os.path.join(workdir, 'poster.jpg')
+    offset = min(1.0, duration / 3) if duration else 0
+    run_ffmpeg('-ss', f'{offset:.2f}', '-i', source, '-frames:v', '1',
+               '-vf', f"scale='min({POSTER_WIDTH},iw)':-2", '-q:v', '3', poster)
+    return poster
+
+
+def transcode(source, name, height, video_bitrate, audio_bitrate, workdir):
+    """Write <name>.mp4 and <name>/index.m3u8 + segments in one ffmpeg pass."""
+    hls_dir = os.path.join(workdir, name)
+    os.makedirs(hls_dir, exist_ok=True)
+    mp4 = os.path.join(workdir, f'{name}.mp4')
+    encode = [
+        '-vf', f'scale=-2:{height}',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-profile:v', 'main',
+        '-b:v', video_bitrate, '-maxrate', video_bitrate, '-bufsize', video_bitrate,
+        '-c:a', 'aac', '-b:a', audio_bitrate, '-ac', '2',
+    ]
+    run_ffmpeg(
+        '-i', source,
+        *encode, '-movflags', '+faststart', mp4,
+        *encode, '-f', 'hls', '-hls_time', str(HLS_SEGMENT_SECONDS), '-hls_playlist_type', 'vod',
+        '-hls_segment_filename', os.path.join(hls_dir, 'segment_%03d.ts'),
+        os.path.join(hls_dir, 'index.m3u8'),
+    )
+    return mp4, hls_dir
+
+
+def master_playlist(renditions, width, height, uri=lambda name: f'{name}/index.m3u8'):
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+    for name, info in renditions.items():
+        bandwidth = info['bandwidth']
+        rendition_width = round(width * info['height'] / height / 2) * 2 if height else 0
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={rendition_width}x{info["height"]}')
+        lines.append(uri(name))
+    return '\n'.join(lines) + '\n'
+
+
+def upload(local_path, name):
+    # Rendition names are deterministic, replace anything from an earlier run
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    with open(local_path, 'rb') as handle:
+        return default_storage.save(name, File(handle))
+
+
+def _bits(rate):
+    return int(rate.rstrip('k')) * 1000
+
+
+#pipeline
+def claimable(statuses):
+    """Videos in `statuses`, or left in PROCESSING by a worker that died (see CLAIM_TIMEOUT)."""
+    from main_app.models import Video
+
+    stale = timezone.now() - timedelta(seconds=CLAIM_TIMEOUT)
+    abandoned = Q(processing_started_at__lt=stale) | Q(processing_started_at__isnull=True)
+    return Q(processing_status__in=statuses) | (Q(processing_status=Video.PROCESSING) & abandoned)
+
+
+def process_video(video_id):
+    from main_app.models import Video
+
+    video = Video.objects.get(pk=video_id)
+    if not video.video_file:
+        return
+    Video.objects.filter(pk=video_id).update(processing_status=Video.PROCESSING,
+                                             processing_started_at=timezone.now())
+
+    workdir = tempfile.mkdtemp(prefix=f'video-{video_id}-')
+    try:
+        # Work on a local copy so remote storage (S3) behaves like disk
+        source = os.path.join(workdir, 'source' + os.path.splitext(video.video_file.name)[1])
+        with video.video_file.open('rb') as remote, open(source, 'wb') as local:
+            shutil.copyfileobj(remote, local, 1024 * 1024)
+
+        duration, width, height = probe(source)
+        prefix = f'videos/renditions/{video.pk}'
+        updates = {'duration': duration, 'width': width, 'height': height}
+
+        if not video.thumbnail:
+            poster = extract_poster(source, duration, workdir)
+            with open(poster, 'rb') as handle:
+                video.thumbnail.save(f'video_{video.pk}.jpg', File(handle), save=False)
+            updates['thumbnail'] = video.thumbnail.name
+
+        renditions = {}
+        for name, rendition_height, video_bitrate, audio_bitrate in RENDITIONS:
+            # Never upscale; always keep at least the smallest rendition
+            if height and rendition_height > height and renditions:
+                continue
+            rendition_height = min(rendition_height, height) if height else rendition_height
+            rendition_height -= rendition_height % 2
+            mp4, hls_dir = transcode(source, name, rendition_height, video_bitrate, audio_bitrate, workdir)
+            stored_mp4 = upload(mp4, f'{prefix}/{name}.mp4')
+            for segment in sorted(os.listdir(hls_dir)):
+                upload(os.path.join(hls_dir, segment), f'{prefix}/{name}/{segment}')
+            cache.delete(playlist_key(f'{prefix}/{name}/index.m3u8'))
+            renditions[name] = {
+                'height': rendition_height,
+                'bandwidth': _bits(video_bitrate) + _bits(audio_bitrate),
+                'mp4': stored_mp4,
+                'size': os.path.getsize(mp4),
+            }
+
+        playlist = os.path.join(workdir, 'master.m3u8')
+        with open(playlist, 'w') as handle:
+            handle.write(master_playlist(renditions, width, height))
+        updates['hls_playlist'] = upload(playlist, f'{prefix}/master.m3u8')
+        updates['renditions'] = renditions
+        updates['processing_status'] = Video.READY
+        Video.objects.filter(pk=video_id).update(**updates)
+
+        # .update() skips post_save, so build the poster's resized copies here
+        if 'thumbnail' in updates:
+            from main_app.imaging import generate_derivatives
+            generate_derivatives(video.thumbnail.storage, video.thumbnail.name)
+    except Exception:
+        logger.exception("Video processing failed for video %s", video_id)
+        Video.objects.filter(pk=video_id).update(processing_status=Video.FAILED)
+        raise
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _run(video_id):
+    # Executor threads never see request_finished, so close stale connections here
+    close_old_connections()
+    try:
+        process_video(video_id)
+    except Exception:
+        pass  # already logged and recorded as FAILED
+    finally:
+        close_old_connections()
+
+
+def schedule_processing(video):
+    """Queue processing for `video` in this process if VIDEO_PROCESSING_IN_WEB; otherwise the worker picks it up."""
+    if not getattr(settings, 'VIDEO_PROCESSING_IN_WEB', False):
+        return
+    video_id = video.pk
+    transaction.on_commit(lambda: executor.submit(_run, video_id))
+
+
+#playback
+def wants_low_bitrate(request):
+    """Client hints and the Save-Data header say the learner is on a slow or metered link."""
+    if request.META.get('HTTP_SAVE_DATA', '').lower() == 'on':
+        return True
+    if request.META.get('HTTP_ECT', '') in ('slow-2g', '2g', '3g'):
+        return True
+    try:
+        return float(request.META.get('HTTP_DOWNLINK', '')) < 2.0
+    except ValueError:
+        return False
+
+
+def choose_rendition(video, request):
+    """Name of the MP4 rendition to serve, or None to fall back to the original."""
+    if not video.renditions:
+        return None
+    ordered = sorted(video.renditions, key=lambda name: video.renditions[name]['height'])
+    if wants_low_bitrate(request) or request.META.get('HTTP_SEC_CH_UA_MOBILE') == '?1':
+        return ordered[0]
+    return ordered[-1]
+
+
+def playlist_key(name):
+    return f'video:playlist:{name}'
+
+
+def _signed_url(name, expire):
+    try:
+        return default_storage.url(name, expire=expire)
+    except TypeError:
+        # Storage backends that do not sign URLs (e.g. plain FileSystemStorage)
+        return default_storage.url(name)
+
+
+def signed_media_playlist(video, name):
+    """The stored index.m3u8 of rendition `name` with every segment URI replaced by a signed URL."""
+    prefix = f'{os.path.dirname(video.hls_playlist)}/{name}'
+    key = playlist_key(f'{prefix}/index.m3u8')
+    text = cache.get(key)
+    if text is None:
+        with default_storage.open(f'{prefix}/index.m3u8', 'rb') as handle:
+            text = handle.read().decode()
+        cache.set(key, text, 24 * 60 * 60)
+
+    expire = int(video.duration or 0) + HLS_URL_EXPIRY
+    lines = []
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            line = _signed_url(f'{prefix}/{line}', expire)
+        lines.append(line)
+    return '\n'.join(lines) + '\n'
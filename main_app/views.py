@@ -1,6 +1,7 @@
 import json
 import requests
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
@@ -10,9 +11,7 @@ from django.shortcuts import get_object_or_404, redirect, render, reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
 from django.template.loader import get_template 
-from .EmailBackend import EmailBackend
-import pandas as pd
-import numpy as np
+from .EmailBackend import throttled
 from django.views.generic import ListView
 from college.models import CollegeAndUniversities
 from django.core.mail import send_mail
@@ -29,8 +28,6 @@ from main_app.models import School, Grade, Term, Subject, Educator
 from django.views import generic
 from django.views.generic import DetailView
 from django.views import View
-import pandas as pd
-import numpy as np
 from photo.models import Photo
 from job.models import Job, Category
 from bursary.forms import BursaryForm
@@ -44,6 +41,10 @@ from django.core.mail import EmailMessage
 from django.db.models import Q
 from questpaper.models import *
 from django.contrib.auth import get_user_model
+from .video_processing import schedule_processing, choose_rendition, master_playlist, signed_media_playlist
+from .ai_gateway import client_ip
+from .timetables import weekly_grid
+from .ai_stream import stream_answer
 
 
 def index_view(request):
@@ -307,7 +308,12 @@ def submit_documents(request):
 
 def doLogin(request, **kwargs):
     #Authenticate
-    user = EmailBackend.authenticate(request, username=request.POST.get('email'), password=request.POST.get('password'))
+    email = request.POST.get('email')
+    wait = throttled(request, email)
+    if wait:
+        messages.error(request, f"Too many failed attempts. Please try again in {wait // 60 or 1} minutes.")
+        return redirect("/")
+    user = authenticate(request, username=email, password=request.POST.get('password'))
     if user != None:
         login(request, user)
         if user.user_type == '1':
@@ -794,39 +800,18 @@ def mySchoolUpload(request):
 #timetable
 def timetable_list(request):
     user = request.user
-    timetables = None
-    student_subjects = None  # Initialize to handle non-student users
-
-    if user.user_type == "3":  # Student
-        try:
-            # Fetch the student's grade, course, and subjects
-            student = Student.objects.get(admin=user)
-            student_subjects = student.course.subject_set.all()  # Get all subjects linked to the course
-
-            # Filter timetables for matching grade and course
-            timetables = Timetable.objects.filter(
-                grade=student.grade,  # Ensure this is a Grade instance
-                course=student.course,  # Ensure this is a Course instance
-            ).distinct()
-        except Student.DoesNotExist:
-            timetables = []
-
-    elif user.user_type == "5":  # Educator
-        try:
-            educator = Educator.objects.get(admin=user)
-            timetables = Timetable.objects.filter(
-                grade=educator.grade,  # Ensure this is a Grade instance
-                course=educator.course,  # Ensure this is a Course instance
-            )
-        except Educator.DoesNotExist:
-            timetables = []
-
-    elif user.user_type in ["1", "4", "6"]:  # HOD, Principal, Circuit Manager
-        timetables = Timetable.objects.all()
-
-    return render(request, 'timetable/timetable_list.html', {
-        'timetables': timetables,
-        'user_subjects': student_subjects if user.user_type == "3" else None
+    student_subjects = None
+    if user.user_type == "3":  # Student: highlight the subjects of their course
+        student = Student.objects.select_related('course').filter(admin=user).first()
+        if student and student.course:
+            student_subjects = list(student.course.subjects.values_list('id', flat=True))
+
+    grid = weekly_grid(user)
+    return render(request, 'timetable/list.html', {
+        'page_title': 'Timetable',
+        'grid': grid,
+        'has_slots': any(day['slots'] for day in grid),
+        'user_subjects': student_subjects,
     })
 
 
@@ -1008,51 +993,60 @@ class MessageExchangeView(View):
         """Check if the request is an AJAX request by inspecting the headers."""
         return request.META.get('HTTP_X_REQUESTED_WITH') == 'XMLHttpRequest'
 
-    def get(self, request, *args, **kwargs):
+    async def get(self, request, *args, **kwargs):
         # Render the message.html page with the form
         form = MessageForm()
-        return render(request, self.template_name, {'form': form})
+        return await sync_to_async(render)(request, self.template_name, {'form': form})
+
+    def save_message(self, request):
+        """Validate and store the message and its media, returns None if the form is invalid."""
+        form = MessageForm(request.POST, request.FILES)
+        if not form.is_valid():
+            return None
+        # Save the message
+        message = form.save(commit=False)
+
+        # Retrieve the CustomUser instance
+        user_identifier = request.POST.get('user_email')  # Assume user_email is passed in the request
+        user = get_object_or_404(CustomUser, email=user_identifier)
+        message.author = user
+        message.save()
+
+        # Save each uploaded file to MessageMedia
+        files = request.FILES.getlist('media_files')
+        for file in files:
+            MessageMedia.objects.create(message=message, media=file)
+        message.media_urls = [media.media.url for media in message.media.all()]
+        return message
+
+    async def send_confirmation(self, user):
+        # Send email to the user after successful message addition
+        subject = 'Message Sent Successfully'
+        context = {'name': user.first_name, 'message': 'Your message has been sent successfully.'}
+        email_template = get_template('emailapp/email.html').render(context)
+
+        email = EmailMessage(
+            subject, email_template,
+            from_email="Vhembe West Apply <your@email.com>",
+            to=[user.email]
+        )
+        email.content_subtype = "html"
+        # SMTP is blocking, so it gets its own thread instead of the event loop
+        await sync_to_async(email.send, thread_sensitive=False)()
 
     @method_decorator(csrf_exempt)
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
         # Handle AJAX form submission
         if self.is_ajax_request(request) and request.method == "POST":
-            form = MessageForm(request.POST, request.FILES)
-            if form.is_valid():
-                # Save the message
-                message = form.save(commit=False)
-
-                # Retrieve the CustomUser instance
-                user_identifier = request.POST.get('user_email')  # Assume user_email is passed in the request
-                user = get_object_or_404(CustomUser, email=user_identifier)
-                message.author = user
-                message.save()
-
-                # Send email to the user after successful message addition
-                email_address = user.email
-                subject = 'Message Sent Successfully'
-                context = {'name': user.first_name, 'message': 'Your message has been sent successfully.'}
-                email_template = get_template('emailapp/email.html').render(context)
-
-                email = EmailMessage(
-                    subject, email_template,
-                    from_email="Vhembe West Apply <your@email.com>",
-                    to=[email_address]
-                )
-                email.content_subtype = "html"
-                email.send()
-
-                # Save each uploaded file to MessageMedia
-                files = request.FILES.getlist('media_files')
-                for file in files:
-                    MessageMedia.objects.create(message=message, media=file)
+            message = await sync_to_async(self.save_message)(request)
+            if message is not None:
+                await self.send_confirmation(message.author)
 
                 # Prepare the response
-                media_urls = [media.media.url for media in message.media.all()]
                 return JsonResponse({
                     'author': message.author.username,
                     'text': message.text,
-                    'media_urls': media_urls,
+                    'media_urls': message.media_urls,
                     'timestamp': message.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
                 })
 
@@ -1347,6 +1341,8 @@ def video_add_view(request):
             pinterest_url=request.POST.get("pinterest_url"),
             youtube_url=request.POST.get("youtube_url"),
         )
+        if video.video_file:
+            schedule_processing(video)
 
         messages.success(request, "Video uploaded successfully!")
         return redirect("show_video", video_id=video.id)
@@ -1362,31 +1358,89 @@ def videos_view(request):
 # Show video
 def show_video(request, video_id):
     video = get_object_or_404(Video, id=video_id)
-    return render(request, 'videos/show_video.html', {'video': video})
+    rendition = choose_rendition(video, request)
+    context = {
+        'video': video,
+        'video_src': video.rendition_url(rendition) if rendition else (video.video_file.url if video.video_file else ''),
+        'hls_src': video.hls_url(),
+    }
+    response = render(request, 'videos/show_video.html', context)
+    # Ask browsers for network hints on the next request
+    response['Accept-CH'] = 'Save-Data, ECT, Downlink, Sec-CH-UA-Mobile'
+    response['Vary'] = 'Save-Data, ECT, Downlink, Sec-CH-UA-Mobile'
+    return response
+
+# HLS playlists, with signed URIs for the private bucket
+def _playlist_response(text):
+    response = HttpResponse(text, content_type='application/vnd.apple.mpegurl')
+    # Shorter than the signed URLs inside it
+    response['Cache-Control'] = 'private, max-age=300'
+    return response
+
+def video_hls(request, video_id):
+    video = get_object_or_404(Video, id=video_id)
+    if not video.hls_playlist:
+        raise Http404
+    return _playlist_response(master_playlist(
+        video.renditions, video.width, video.height,
+        uri=lambda name: reverse('video_hls_rendition', args=[video.pk, name])))
+
+def video_hls_rendition(request, video_id, name):
+    video = get_object_or_404(Video, id=video_id)
+    if not video.hls_playlist or name not in video.renditions:
+        raise Http404
+    return _playlist_response(signed_media_playlist(video, name))
 
 @require_POST
-def like_video(request, video_id):
+async def like_video(request, video_id):
+    user = await request.auser()
     # Check if user is authenticated
-    if not request.user.is_authenticated:
+    if not user.is_authenticated:
         return JsonResponse({
             'error': 'Authentication required',
             'login_url': 'login_page'  # Adjust to your login URL
         }, status=401)
     
-    video = get_object_or_404(Video, id=video_id)
-    like, created = VideoLike.objects.get_or_create(video=video, user=request.user)
+    try:
+        video = await Video.objects.aget(id=video_id)
+    except Video.DoesNotExist:
+        raise Http404("No Video matches the given query.")
+    like, created = await VideoLike.objects.aget_or_create(video=video, user=user)
     
     if not created:
-        like.delete()
+        await like.adelete()
         liked = False
     else:
         liked = True
     
     return JsonResponse({
         'liked': liked,
-        'likes_count': video.likes.count()
+        'likes_count': await video.likes.acount()
     })
 
+#ai assistant
+AI_QUESTION_TYPES = dict(AIChatLog._meta.get_field('question_type').choices)
+
+
+def ai_assistant(request):
+    return render(request, 'ai_assistant.html', {'question_types': AI_QUESTION_TYPES.items()})
+
+
+async def ai_assistant_stream(request):
+    """Server-Sent Events stream of the assistant's answer to ?q=...&type=..."""
+    question = request.GET.get('q', '').strip()
+    question_type = request.GET.get('type', 'general')
+    if not question or question_type not in AI_QUESTION_TYPES:
+        return JsonResponse({'error': 'Ask a question'}, status=400)
+    user = await request.auser()
+    response = StreamingHttpResponse(
+        stream_answer(question[:2000], question_type, user, client_ip(request)),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # stop nginx from buffering the stream
+    return response
+
 @require_POST
 def add_comment(request, video_id):
     # Check if user is authenticated
@@ -1434,6 +1488,8 @@ def clean_int(value):
     """
     Convert messy Excel numbers to integer
     """
+    import pandas as pd
+
     if pd.isna(value) or value == "" or value is None:
         return 0
 
@@ -1464,6 +1520,10 @@ def clean_int(value):
         return 0
 
 def upload_schools_from_excel(request):
+    # pandas is slow to import, so only the upload path loads it
+    import numpy as np
+    import pandas as pd
+
     if request.method == 'POST':
         form = UploadExcelForm(request.POST, request.FILES)
         if form.is_valid():
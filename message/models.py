@@ -33,6 +33,11 @@ class Message(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['channel', 'created_at'], name='message_channel_created_idx'),
+        ]
+
 class MessageLike(models.Model):
     message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='likes')
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="liked_messages")  # ✅
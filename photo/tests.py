@@ -1,3 +1,54 @@
-from django.test import TestCase
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from main_app import imaging
+from main_app.models import CustomUser, ImageDerivative
+from .models import Photo
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+def upload(name='photo.png', size=(800, 600)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'teal').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+# Derivatives are made on the test thread instead of the executor
+@override_settings(STORAGES=STORAGES)
+@mock.patch.object(imaging.executor, 'submit', lambda fn, storage, name: imaging.generate_derivatives(storage, name))
+class PhotoDerivativeTests(TestCase):
+    def setUp(self):
+        self.author = CustomUser.objects.create_user('author@example.com', 'secret', user_type='8',
+                                                     first_name='Ada', last_name='Author', gender='F')
+
+    def create_photo(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Photo.objects.create(author=self.author, description='Sports day', image=upload())
+
+    def test_new_upload_gets_derivatives(self):
+        photo = self.create_photo()
+        record = ImageDerivative.objects.get(source=photo.image.name)
+        self.assertEqual(sorted(record.variants, key=int), ['160', '320', '640'])
+        self.assertTrue(photo.image.storage.exists(record.variants['320']['webp']))
+
+    def test_saving_other_fields_does_not_regenerate(self):
+        photo = Photo.objects.get(pk=self.create_photo().pk)
+        photo.description = 'Sports day, finals'
+        with self.captureOnCommitCallbacks() as callbacks:
+            photo.save()
+        self.assertEqual(callbacks, [])
+
+    def test_replaced_image_gets_derivatives(self):
+        photo = Photo.objects.get(pk=self.create_photo().pk)
+        photo.image = upload('finals.png')
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.save()
+        self.assertTrue(ImageDerivative.objects.filter(source=photo.image.name).exists())
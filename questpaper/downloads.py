@@ -0,0 +1,242 @@
+"""
+Download helpers for question papers.
+
+Remote storage (S3) gets a redirect to a short-lived signed URL so the worker
+is released straight away. Local storage is handed to the web server with
+X-Accel-Redirect / X-Sendfile when configured, otherwise it is streamed by
+Django with ETag, Last-Modified and single Range support.
+"""
+import atexit
+import logging
+import mimetypes
+import os
+import re
+import threading
+import time
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db.models import F
+from django.http import (FileResponse, HttpResponse, HttpResponseNotModified,
+                         HttpResponseRedirect, StreamingHttpResponse)
+from django.utils.http import http_date, parse_http_date_safe
+
+from main_app.storage_backends import download_name
+
+logger = logging.getLogger(__name__)
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+#storage helpers
+def local_path(field_file):
+    """Return the filesystem path of the file, or None for remote storage."""
+    try:
+        return field_file.storage.path(field_file.name)
+    except (NotImplementedError, AttributeError):
+        return None
+
+
+def content_disposition(filename, as_attachment):
+    disposition = 'attachment' if as_attachment else 'inline'
+    try:
+        filename.encode('ascii')
+        return f'{disposition}; filename="{filename}"'
+    except UnicodeEncodeError:
+        return f"{disposition}; filename*=utf-8''{quote(filename)}"
+
+
+def make_etag(stat):
+    return f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+
+
+#remote storage
+def signed_url_response(field_file, as_attachment=True, content_type=None):
+    """Redirect to a signed URL that expires after QUESTION_PAPER_URL_EXPIRY seconds."""
+    filename = download_name(field_file)
+    parameters = {
+        'ResponseContentDisposition': content_disposition(filename, as_attachment),
+    }
+    if content_type:
+        parameters['ResponseContentType'] = content_type
+    expire = _setting('QUESTION_PAPER_URL_EXPIRY', 300)
+    try:
+        url = field_file.storage.url(field_file.name, parameters=parameters, expire=expire)
+    except TypeError:
+        # Storage backends that do not sign URLs (e.g. plain FileSystemStorage)
+        url = field_file.url
+    return HttpResponseRedirect(url)
+
+
+#local storage
+def not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and int(last_modified) <= if_modified_since
+
+
+def parse_range(request, size, etag, last_modified):
+    """Return (start, end) for a satisfiable single range, None for a full response
+    and False when the range cannot be satisfied."""
+    header = request.META.get('HTTP_RANGE')
+    if not header:
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != int(last_modified):
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if first == '' and last == '':
+        return None
+    if first == '':
+        length = int(last)
+        if length == 0:
+            return False
+        start, end = max(size - length, 0), size - 1
+    else:
+        start = int(first)
+        end = int(last) if last else size - 1
+        end = min(end, size - 1)
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def iter_range(path, start, end):
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = handle.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def sendfile_response(path, field_file, content_type):
+    """Let nginx / apache serve the file, Django only sets the headers."""
+    backend = _setting('QUESTION_PAPER_SENDFILE', '')
+    response = HttpResponse(content_type=content_type)
+    if backend == 'nginx':
+        root = _setting('QUESTION_PAPER_SENDFILE_ROOT', settings.MEDIA_ROOT)
+        prefix = _setting('QUESTION_PAPER_SENDFILE_URL', '/protected/')
+        relative = os.path.relpath(path, root).replace(os.sep, '/')
+        response['X-Accel-Redirect'] = quote(prefix.rstrip('/') + '/' + relative)
+    else:
+        response['X-Sendfile'] = path
+    return response
+
+
+def local_file_response(request, path, field_file, as_attachment, content_type):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return HttpResponse("Question paper not found", status=404)
+
+    etag = make_etag(stat)
+    last_modified = stat.st_mtime
+    filename = download_name(field_file)
+
+    if not_modified(request, etag, last_modified):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    if _setting('QUESTION_PAPER_SENDFILE', ''):
+        response = sendfile_response(path, field_file, content_type)
+    else:
+        byte_range = parse_range(request, stat.st_size, etag, last_modified)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(iter_range(path, start, end), status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = str(end - start + 1)
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Content-Disposition'] = content_disposition(filename, as_attachment)
+    response['Cache-Control'] = 'private, max-age=%d' % _setting('QUESTION_PAPER_CACHE_SECONDS', 3600)
+    return response
+
+
+def serve_file(request, field_file, as_attachment=True, content_type=None):
+    """Serve a FieldFile without tying up the worker for the whole transfer."""
+    if content_type is None:
+        content_type = mimetypes.guess_type(field_file.name)[0] or 'application/octet-stream'
+    path = local_path(field_file)
+    if path is None:
+        return signed_url_response(field_file, as_attachment, content_type)
+    return local_file_response(request, path, field_file, as_attachment, content_type)
+
+
+#download counters
+class DownloadCounter:
+    """
+    Buffers download counts in memory and writes them with one UPDATE per paper
+    every `flush_every` downloads or `flush_interval` seconds, whichever comes first.
+    Whatever is still buffered is written when the worker exits (see `flush_at_exit`).
+    """
+
+    def __init__(self, flush_every=50, flush_interval=30):
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.pending = {}
+        self.pending_total = 0
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+
+    def hit(self, pk):
+        with self.lock:
+            self.pending[pk] = self.pending.get(pk, 0) + 1
+            self.pending_total += 1
+            due = (self.pending_total >= self.flush_every
+                   or time.monotonic() - self.last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.pending_total = 0
+            self.last_flush = time.monotonic()
+        if not pending:
+            return 0
+        from .models import QuestionPaper
+        for pk, count in pending.items():
+            QuestionPaper.objects.filter(pk=pk).update(download_count=F('download_count') + count)
+        return len(pending)
+
+
+download_counter = DownloadCounter(
+    flush_every=_setting('QUESTION_PAPER_COUNTER_FLUSH_EVERY', 50),
+    flush_interval=_setting('QUESTION_PAPER_COUNTER_FLUSH_INTERVAL', 30),
+)
+
+
+def flush_at_exit():
+    """Write the buffered counts before the process goes away (worker recycle or shutdown)."""
+    try:
+        download_counter.flush()
+    except Exception:
+        logger.exception("Could not write buffered question paper download counts")
+
+
+atexit.register(flush_at_exit)
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:30
+
+import main_app.storage_backends
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questpaper', '0002_questionpaper_download_count'),
+        ('main_app', '0009_blob_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='questionpaper',
+            name='file',
+            field=models.FileField(storage=main_app.storage_backends.content_addressed_storage, upload_to='question_papers/'),
+        ),
+        migrations.AlterField(
+            model_name='prospectors',
+            name='copy',
+            field=models.FileField(storage=main_app.storage_backends.content_addressed_storage, upload_to='store/prospectors/'),
+        ),
+    ]
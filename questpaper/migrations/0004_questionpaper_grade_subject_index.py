@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questpaper', '0003_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='questionpaper',
+            index=models.Index(fields=['grade', 'subject'], name='questionpaper_grade_subj_idx'),
+        ),
+    ]
@@ -11,6 +11,7 @@ from django.templatetags.static import static
 from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from main_app.models import School, Grade, Term, Subject, Educator
+from main_app.storage_backends import content_addressed_storage
 from django.views.generic import ListView, CreateView, DetailView, UpdateView, DeleteView
 from django.urls import reverse_lazy
 # Create your views here.
@@ -38,7 +39,7 @@ class QuestionPaper(models.Model):
     educator = models.ForeignKey(Educator, on_delete=models.CASCADE, null=True, blank=True)
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE, null=True, blank=True)
     
-    file = models.FileField(upload_to='question_papers/')
+    file = models.FileField(upload_to='question_papers/', storage=content_addressed_storage)
     
     # Restrict complexity_rating to values between 1-5
     COMPLEXITY_CHOICES = [(i, f"Level {i}") for i in range(1, 6)]
@@ -49,6 +50,14 @@ class QuestionPaper(models.Model):
     
     number_of_questions = models.TextField()  # For storing question numbers, improve if structured data is needed
 
+    # Updated in batches by questpaper.downloads.download_counter
+    download_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['grade', 'subject'], name='questionpaper_grade_subj_idx'),
+        ]
+
     def __str__(self):
         return f"{self.grade} - {self.term} - {self.subject.name}"
     
@@ -57,7 +66,7 @@ class QuestionPaper(models.Model):
 class Prospectors(models.Model):
     institution = models.CharField(max_length=100)
     address = models.CharField(max_length=100)
-    copy = models.FileField(upload_to='store/prospectors/')
+    copy = models.FileField(upload_to='store/prospectors/', storage=content_addressed_storage)
     logo = models.ImageField(upload_to='store/prospectors/')
 
     def __str__(self):
@@ -1,3 +1,51 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.test import RequestFactory, TestCase, override_settings
+
+from main_app.models import Blob
+from main_app.storage_backends import download_name
+
+from .downloads import serve_file
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'content_addressed': {'BACKEND': 'main_app.storage_backends.ContentAddressedStorage',
+                          'OPTIONS': {'backend': 'default'}},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class DownloadNameTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def save(self, name, data=b'%PDF-1.4 maths paper'):
+        return storages['content_addressed'].save(f'question_papers/{name}', ContentFile(data, name=name))
+
+    def test_download_keeps_the_uploaded_name(self):
+        stored = self.save('Maths P1 2024.pdf')
+        self.assertTrue(stored.startswith('cas/'))
+        field_file = SimpleNamespace(name=stored, storage=storages['content_addressed'])
+        self.assertEqual(download_name(field_file), 'Maths P1 2024.pdf')
+
+        response = serve_file(RequestFactory().get('/'), field_file)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="Maths P1 2024.pdf"')
+        response.close()
+
+    def test_duplicates_share_one_blob(self):
+        first = self.save('Maths P1 2024.pdf')
+        second = self.save('copy.pdf')
+        self.assertEqual(first, second)
+        blob = Blob.objects.get(name=first)
+        self.assertEqual((blob.ref_count, blob.original_name), (2, 'Maths P1 2024.pdf'))
+
+    def test_files_from_before_content_addressing_keep_their_name(self):
+        stored = storages['default'].save('question_papers/old.pdf', ContentFile(b'old'))
+        self.assertEqual(download_name(SimpleNamespace(name=stored)), 'old.pdf')
@@ -8,11 +8,12 @@ from django.urls import reverse_lazy
 import os
 from django.conf import settings
 from questpaper.forms import QuestionPaperUploadForm
-from django.http import HttpResponse, FileResponse
+from django.http import HttpResponse
 from django.core.exceptions import ObjectDoesNotExist
 from .models import QuestionPaper,Topic, Department
 from .forms import QuestionPaperUploadForm
 from django.contrib import messages
+from .downloads import serve_file, download_counter
 
 # Upload Question Paper
 def upload_question_paper(request):
@@ -82,22 +83,24 @@ def filter_question_papers(request):
 # Download Question Paper
 def download_question_paper(request, pk):
     try:
-        question_paper = QuestionPaper.objects.get(pk=pk)
-        response = FileResponse(open(question_paper.file.path, 'rb'))
-        return response
+        question_paper = QuestionPaper.objects.only('id', 'file').get(pk=pk)
     except ObjectDoesNotExist:
         return HttpResponse("Question paper not found", status=404)
-        
+
+    response = serve_file(request, question_paper.file, as_attachment=True)
+    # Count full downloads only, not revalidations or resumed ranges
+    if response.status_code in (200, 302):
+        download_counter.hit(question_paper.pk)
+    return response
+
 
 # View the Question Paper (instead of download)
 def view_question_paper(request, pk):
-    question_paper = get_object_or_404(QuestionPaper, pk=pk)
+    question_paper = get_object_or_404(QuestionPaper.objects.only('id', 'file'), pk=pk)
 
     # If the file is a PDF, render it in the browser
-    file_path = question_paper.file.path
-
-    if file_path.endswith('.pdf'):
-        return FileResponse(open(file_path, 'rb'), content_type='application/pdf')
+    if question_paper.file.name.lower().endswith('.pdf'):
+        return serve_file(request, question_paper.file, as_attachment=False, content_type='application/pdf')
     else:
         return HttpResponse("This file format is not supported for viewing.", status=400)
 
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sitting',
+            index=models.Index(fields=['user', 'quiz', 'course', 'complete'], name='sitting_user_quiz_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sitting',
+            index=models.Index(condition=models.Q(('complete', False)), fields=['user', 'quiz', 'course'], name='sitting_open_idx'),
+        ),
+    ]
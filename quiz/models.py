@@ -325,6 +325,11 @@ class Sitting(models.Model):
 
     class Meta:
         permissions = (("view_sittings", _("Can see completed exams.")),)
+        indexes = [
+            models.Index(fields=['user', 'quiz', 'course', 'complete'], name='sitting_user_quiz_idx'),
+            # SittingManager.user_sitting only ever looks for the open sitting
+            models.Index(fields=['user', 'quiz', 'course'], condition=Q(complete=False), name='sitting_open_idx'),
+        ]
 
     def get_first_question(self):
         if not self.question_list:
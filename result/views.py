@@ -1,3 +1,5 @@
+from io import BytesIO
+
 from django.shortcuts import render, get_object_or_404
 from django.contrib import messages
 from django.http import HttpResponseRedirect
@@ -6,20 +8,6 @@ from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.files.storage import FileSystemStorage
 from django.http import HttpResponse
-
-from reportlab.platypus import (
-    SimpleDocTemplate,
-    Paragraph,
-    Spacer,
-    Table,
-    TableStyle,
-    Image,
-)
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_JUSTIFY, TA_LEFT, TA_CENTER, TA_RIGHT
-from reportlab.platypus.tables import Table
-from reportlab.lib.units import inch
-from reportlab.lib import colors
 from main_app.models import Course, Session, Term, Student
 from .models import TakenCourse, Result, FIRST, SECOND
 
@@ -280,25 +268,34 @@ def assessment_result(request):
 @login_required
 
 def result_sheet_pdf_view(request, id):
-    current_term = Term.objects.get(is_current_term=True)
-    current_session = Session.objects.get(is_current_session=True)
-    result = TakenCourse.objects.filter(course__pk=id)
+    # ReportLab is slow to import and only the PDF views need it
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT, TA_RIGHT
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    current_term = Term.objects.filter(is_current=True).select_related("session").first()
+    current_session = current_term.session if current_term else None
     course = get_object_or_404(Course, id=id)
-    no_of_pass = TakenCourse.objects.filter(course__pk=id, comment="PASS").count()
-    no_of_fail = TakenCourse.objects.filter(course__pk=id, comment="FAIL").count()
+    # One query for the rows and their learners, however long the sheet
+    result = TakenCourse.objects.filter(course=course).select_related("student__admin")
+    no_of_pass = result.filter(comment="PASS").count()
+    no_of_fail = result.filter(comment="FAIL").count()
     fname = (
-        str(current_term)
+        str(current_term or "")
         + "_term_"
-        + str(current_session)
+        + str(current_session or "")
         + "_"
         + str(course)
         + "_resultSheet.pdf"
     )
     fname = fname.replace("/", "-")
-    flocation = settings.MEDIA_ROOT + "/result_sheet/" + fname
 
+    # Built in memory: MEDIA_ROOT may be remote storage or read-only
+    buffer = BytesIO()
     doc = SimpleDocTemplate(
-        flocation,
+        buffer,
         rightMargin=0,
         leftMargin=6.5 * cm,
         topMargin=0.3 * cm,
@@ -306,7 +303,7 @@ def result_sheet_pdf_view(request, id):
     )
     styles = getSampleStyleSheet()
     styles.add(
-        ParagraphStyle(name="ParagraphTitle", fontSize=11, fontName="FreeSansBold")
+        ParagraphStyle(name="ParagraphTitle", fontSize=11, fontName="Helvetica-Bold")
     )
     Story = [Spacer(1, 0.2)]
     style = styles["Normal"]
@@ -323,14 +320,6 @@ def result_sheet_pdf_view(request, id):
     # im_logo.__setattr__("_offs_y", -60)
     # Story.append(im_logo)
 
-    print("\nsettings.MEDIA_ROOT", settings.MEDIA_ROOT)
-    print("\nsettings.STATICFILES_DIRS[0]", settings.STATICFILES_DIRS[0])
-    logo = settings.STATICFILES_DIRS[0] + "/img/dj-lms.png"
-    im = Image(logo, 1 * inch, 1 * inch)
-    im.__setattr__("_offs_x", -200)
-    im.__setattr__("_offs_y", -45)
-    Story.append(im)
-
     style = getSampleStyleSheet()
     normal = style["Normal"]
     normal.alignment = TA_CENTER
@@ -339,9 +328,9 @@ def result_sheet_pdf_view(request, id):
     normal.leading = 15
     title = (
         "<b> "
-        + str(current_term)
+        + str(current_term or "")
         + " Term "
-        + str(current_session)
+        + str(current_session or "")
         + " Result Sheet</b>"
     )
     title = Paragraph(title.upper(), normal)
@@ -354,7 +343,7 @@ def result_sheet_pdf_view(request, id):
     normal.fontName = "Helvetica"
     normal.fontSize = 10
     normal.leading = 15
-    title = "<b>Course lecturer: " + request.user.get_full_name + "</b>"
+    title = "<b>Course lecturer: " + request.user.get_full_name() + "</b>"
     title = Paragraph(title.upper(), normal)
     Story.append(title)
     Story.append(Spacer(1, 0.1 * inch))
@@ -364,8 +353,7 @@ def result_sheet_pdf_view(request, id):
     normal.fontName = "Helvetica"
     normal.fontSize = 10
     normal.leading = 15
-    level = result.filter(course_id=id).first()
-    title = "<b>Level: </b>" + str(level.course.level)
+    title = "<b>Course: </b>" + str(course)
     title = Paragraph(title.upper(), normal)
     Story.append(title)
     Story.append(Spacer(1, 0.6 * inch))
@@ -393,9 +381,9 @@ def result_sheet_pdf_view(request, id):
         data = [
             (
                 count + 1,
-                student.student.student.username.upper(),
+                student.student.pk,
                 Paragraph(
-                    student.student.student.get_full_name.capitalize(), styles["Normal"]
+                    student.student.admin.get_full_name().capitalize(), styles["Normal"]
                 ),
                 student.total,
                 student.grade,
@@ -441,17 +429,21 @@ def result_sheet_pdf_view(request, id):
 
     doc.build(Story)
 
-    fs = FileSystemStorage(settings.MEDIA_ROOT + "/result_sheet")
-    with fs.open(fname) as pdf:
-        response = HttpResponse(pdf, content_type="application/pdf")
-        response["Content-Disposition"] = "inline; filename=" + fname + ""
-        return response
+    response = HttpResponse(buffer.getvalue(), content_type="application/pdf")
+    response["Content-Disposition"] = "inline; filename=" + fname + ""
     return response
 
 
 @login_required
 
 def course_registration_form(request):
+    # ReportLab is slow to import and only the PDF views need it
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT, TA_RIGHT
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
     current_term = Term.objects.get(is_current_term=True)
     current_session = Session.objects.get(is_current_session=True)
     courses = TakenCourse.objects.filter(student__student__id=request.user.id)
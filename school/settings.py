@@ -82,6 +82,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost so it also sees session/auth queries (no-op unless QUERY_PROFILER)
+    'main_app.middleware.QueryProfilerMiddleware',
     #cors to read the react
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -97,8 +99,34 @@ MIDDLEWARE = [
 
     # My Middleware
     'main_app.middleware.LoginCheckMiddleWare',
+    'main_app.middleware.RoleProfileMiddleware',
+    'main_app.middleware.ReplicaRoutingMiddleware',
 ]
 
+#query profiler (see main_app/profiling.py)
+QUERY_PROFILER = os.environ.get('QUERY_PROFILER', 'false').lower() == 'true'
+QUERY_PROFILER_TOP_N = 50
+# Per url name: {"queries": max queries, "duplicates": max repeats of one query shape}
+QUERY_BUDGETS = {
+    'admin_home': {'queries': 60, 'duplicates': 5},
+    'index': {'queries': 40, 'duplicates': 3},
+}
+QUERY_BUDGET_STRICT = False
+# Budgets at 1x synthetic data for `manage.py benchmark_views` (queries, ms, peak_kb),
+# a few queries above what each view runs with the database cache
+BENCHMARK_BUDGETS = {
+    'admin_home': {'queries': 35},
+    'staff_home': {'queries': 15},
+    'student_home': {'queries': 15},
+    'educator_home': {'queries': 20},
+    'principal_home': {'queries': 15},
+    'parent_home': {'queries': 20},
+    'circuit_manager_home': {'queries': 15},
+    'index_view': {'queries': 20},
+    'general_search_view': {'queries': 15},
+    'result_sheet_pdf': {'queries': 10},
+}
+
 
 #react cors
 
@@ -128,7 +156,10 @@ SIMPLE_JWT = {
 }
 
 # Channels + Redis
-ASGI_APPLICATION = 'your_project.asgi.application'
+# SERVER_MODE is read by gunicorn.conf.py: "asgi" runs school.asgi on uvicorn
+# workers, "wsgi" the classic sync workers
+SERVER_MODE = os.environ.get('SERVER_MODE', 'asgi')
+ASGI_APPLICATION = 'school.asgi.application'
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
@@ -139,6 +170,30 @@ CHANNEL_LAYERS = {
 }
 
 
+#shared cache
+# Login throttling, the get_user and role profile caches, the AI rate limits
+# and the timetable grids are invalidated by deleting keys, so every worker
+# must read the same cache; per-process LocMem would keep serving stale
+# entries on the other workers. REDIS_URL selects Redis (needs the redis
+# package). Without it the database cache is used; its table is created by
+# `manage.py createcachetable` in the release phase (see Procfile).
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        },
+    }
+
+
 ROOT_URLCONF = 'school.urls'
 
 
@@ -182,21 +237,102 @@ SITE_ID = 1
 
 is_local = os.environ.get('DJANGO_LOCAL', 'false').lower() == 'true'
 
+#connection pooling
+# DATABASE_POOL_MODE:
+#   "pool"       - psycopg 3 connection pool inside each worker (needs psycopg[pool])
+#   "pgbouncer"  - connections go through pgbouncer in transaction mode, no
+#                  server-side cursors and no prepared statements
+#   "persistent" - one persistent connection per thread (CONN_MAX_AGE), the old behaviour
+# ASGI (the default SERVER_MODE) defaults to "pool": persistent connections
+# are not safe there, and closing them per request would open a new TLS
+# connection to Postgres for every request.
+DATABASE_POOL_MODE = os.environ.get('DATABASE_POOL_MODE', 'pool' if SERVER_MODE == 'asgi' else 'persistent')
+# Under ASGI every sync_to_async thread would keep its own persistent
+# connection open, so an explicit "persistent" mode closes them per request
+DATABASE_CONN_MAX_AGE = int(os.environ.get(
+    'DATABASE_CONN_MAX_AGE', 0 if SERVER_MODE == 'asgi' and DATABASE_POOL_MODE == 'persistent' else 600))
+
+try:
+    from psycopg_pool import ConnectionPool as _ConnectionPool
+except ImportError:
+    _ConnectionPool = None
+
+
+def _database(url, env_prefix):
+    """dj_database_url config for `url`, tuned for DATABASE_POOL_MODE.
+
+    Pool sizes are read per database from <env_prefix>_POOL_MIN_SIZE and
+    <env_prefix>_POOL_MAX_SIZE, e.g. RAILWAY_DATABASE_POOL_MAX_SIZE.
+    """
+    postgres = bool(url) and url.startswith(('postgres', 'postgresql', 'pgsql'))
+    db = dj_database_url.parse(url, conn_max_age=DATABASE_CONN_MAX_AGE, ssl_require=postgres) if url else {}
+    if not postgres:
+        return db
+
+    # Re-validate persistent connections before use instead of failing on the
+    # first query after the server or a proxy dropped an idle TLS connection
+    db['CONN_HEALTH_CHECKS'] = True
+    options = db.setdefault('OPTIONS', {})
+    # TCP keepalives stop load balancers from silently dropping idle connections
+    options.update({'keepalives': 1, 'keepalives_idle': 30, 'keepalives_interval': 10, 'keepalives_count': 3})
+
+    if DATABASE_POOL_MODE == 'pool' and _ConnectionPool is not None:
+        db['CONN_MAX_AGE'] = 0  # the pool owns connection lifetime
+        db['CONN_HEALTH_CHECKS'] = False
+        options['pool'] = {
+            'min_size': int(os.environ.get(f'{env_prefix}_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get(f'{env_prefix}_POOL_MAX_SIZE', 10)),
+            'timeout': int(os.environ.get('DATABASE_POOL_TIMEOUT', 10)),
+            'max_idle': int(os.environ.get('DATABASE_POOL_MAX_IDLE', 240)),
+            'max_lifetime': int(os.environ.get('DATABASE_POOL_MAX_LIFETIME', 1800)),
+            'check': _ConnectionPool.check_connection,
+        }
+    elif DATABASE_POOL_MODE == 'pgbouncer':
+        # A transaction pooler may hand each transaction a different server
+        # connection, so named cursors cannot survive. Parameters are bound
+        # client side (Django's default), so no prepared statements either.
+        db['DISABLE_SERVER_SIDE_CURSORS'] = True
+        options['server_side_binding'] = False
+    return db
+
+
 DATABASES = {
-    'default': dj_database_url.config(
-        default=os.environ.get('DATABASE_URL'),
-        conn_max_age=600,
-        ssl_require=True,
-    ),
-    'railway': dj_database_url.parse(
+    'default': _database(os.environ.get('DATABASE_URL'), 'DATABASE'),
+    'railway': _database(
         os.environ.get(
             'RAILWAY_DATABASE_URL_PUBLIC' if is_local else 'RAILWAY_DATABASE_URL'
         ),
-        conn_max_age=600,
-        ssl_require=True,
+        'RAILWAY_DATABASE',
     ),
 }
 
+#read replicas
+# DATABASE_REPLICA_URLS="postgres://...,postgres://..." with optional DATABASE_REPLICA_WEIGHTS="3,1"
+# Locally two sqlite files work too: DATABASE_REPLICA_URLS="sqlite:///replica.sqlite3"
+_replica_urls = [url for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url]
+_replica_weights = [int(w) for w in os.environ.get('DATABASE_REPLICA_WEIGHTS', '').split(',') if w]
+DATABASE_REPLICAS = {}
+for _index, _url in enumerate(_replica_urls, start=1):
+    _alias = f'replica{_index}'
+    DATABASES[_alias] = _database(_url, 'DATABASE_REPLICA')
+    DATABASES[_alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS[_alias] = _replica_weights[_index - 1] if _index <= len(_replica_weights) else 1
+
+DATABASE_ROUTERS = ['main_app.db_routers.RailwayRouter']
+REPLICA_MAX_LAG_SECONDS = 10  # replicas further behind than this are skipped
+REPLICA_LAG_CHECK_SECONDS = 5
+REPLICA_PIN_SECONDS = 5  # read-your-writes window after a user writes
+
+# Reporting views whose GET requests may read from a replica
+REPLICA_READ_VIEWS = [
+    'admin_home', 'staff_home', 'student_home', 'principal_home', 'educator_home',
+    'circuit_manager_home', 'parent_home', 'member_home', 'school_dashboard',
+    'principal_view_results', 'circuit_manager_view_results', 'educator_view_results',
+    'student_view_result', 'result_sheet_pdf_view', 'grade_results', 'ass_results',
+    'general_search_view', 'search_students', 'prospectors_search',
+    'questionpaperlist',
+]
+
 
 #aws database
 
@@ -220,13 +356,93 @@ STORAGES = {
             "region_name": AWS_S3_REGION_NAME,
         },
     },
+    # Deduplicated uploads, stored once per unique content in "default"
+    "content_addressed": {
+        "BACKEND": "main_app.storage_backends.ContentAddressedStorage",
+        "OPTIONS": {
+            "backend": "default",
+        },
+    },
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     },
 }
 
+# Hash uploads while they stream in (used by ContentAddressedStorage)
+FILE_UPLOAD_HANDLERS = [
+    "main_app.upload_handlers.HashingMemoryFileUploadHandler",
+    "main_app.upload_handlers.HashingTemporaryFileUploadHandler",
+]
+
 MEDIA_URL = f"https://{AWS_STORAGE_BUCKET_NAME}.s3.{AWS_S3_REGION_NAME}.amazonaws.com/media/"
 
+#outbound http (see main_app/http_client.py)
+OUTBOUND_HTTP_TIMEOUT = 15
+
+#deepseek (see main_app/ai_gateway.py)
+DEEPSEEK_API_KEY = os.environ.get('DEEPSEEK_API_KEY', '')
+DEEPSEEK_API_URL = os.environ.get('DEEPSEEK_API_URL', 'https://api.deepseek.com/v1/chat/completions')
+DEEPSEEK_TIMEOUT = 60  # read timeout, seconds
+AI_CONNECT_TIMEOUT = 5
+AI_CACHE_SIZE = 512  # answers kept in memory per process
+AI_CACHE_SECONDS = 24 * 3600  # how long an answer is reused, from memory or AIChatLog
+AI_SNIPPET_SECONDS = 3600  # college/bursary prompt snippets, also dropped when those change
+# "deepseek", or "fake" to stream canned answers offline (see main_app/ai_stream.py)
+AI_STREAM_BACKEND = os.environ.get('AI_STREAM_BACKEND', 'deepseek')
+AI_STREAM_MAX_TOKENS = 2048
+
+#ai rate limits and budgets (see main_app/ai_limits.py)
+# Token buckets: `capacity` requests in a burst, refilled at `per_minute`
+AI_RATE_LIMITS = {
+    'user': {'capacity': 5, 'per_minute': 6},
+    'ip': {'capacity': 20, 'per_minute': 30},
+    'school': {'capacity': 40, 'per_minute': 60},
+}
+AI_DAILY_TOKEN_BUDGET = int(os.environ.get('AI_DAILY_TOKEN_BUDGET', 500000))  # per school (or user without one)
+AI_ANON_DAILY_TOKEN_BUDGET = int(os.environ.get('AI_ANON_DAILY_TOKEN_BUDGET', 20000))  # per IP
+AI_MAX_CONCURRENT = 4  # upstream calls per worker process, shared fairly between schools
+AI_QUEUE_TIMEOUT = 30  # longest a request waits for its turn before being refused
+
+#role profiles (see main_app/profiles.py)
+# How long request.profile is cached; saving the profile or user drops it sooner
+PROFILE_CACHE_SECONDS = 60
+
+#bulk enrollment (see main_app/enrollment.py)
+# Processes used to hash passwords; 0 means one per CPU
+ENROLLMENT_HASH_WORKERS = int(os.environ.get('ENROLLMENT_HASH_WORKERS', 0))
+
+#report data tables (see main_app/datatables.py)
+DATATABLE_PAGE_SIZE = 50
+DATATABLE_MAX_PAGE_SIZE = 200  # largest ?limit= a client may ask for
+
+#bulk exports (see main_app/exports.py)
+EXPORT_CHUNK_SIZE = 2000  # rows read per query or cursor fetch
+
+#school performance (see main_app/performance.py)
+PERFORMANCE_SUMMARY_SECONDS = 600  # chart data cache; a new evaluation drops it sooner
+
+#circuit analytics (see main_app/analytics.py); refresh with manage.py refresh_analytics
+ANALYTICS_CACHE_SECONDS = 3600  # query answers; a refresh starts new keys
+
+#timetables (see main_app/timetables.py)
+TIMETABLE_CACHE_SECONDS = 3600  # weekly grid per user; a timetable edit starts new keys
+
+#videos (see main_app/video_processing.py)
+# Transcoding runs in the Procfile worker; set VIDEO_PROCESSING_IN_WEB=true
+# only where no worker runs, to transcode on a thread of the web process
+VIDEO_PROCESSING_IN_WEB = os.environ.get('VIDEO_PROCESSING_IN_WEB', 'false').lower() == 'true'
+VIDEO_HLS_URL_EXPIRY = 3600  # signed segment URLs last the video's duration plus this
+
+#question paper downloads (see questpaper/downloads.py)
+# Signed S3 URLs expire after this many seconds
+QUESTION_PAPER_URL_EXPIRY = int(os.environ.get("QUESTION_PAPER_URL_EXPIRY", 300))
+# "nginx" (X-Accel-Redirect), "xsendfile" (X-Sendfile) or "" to stream from Django
+QUESTION_PAPER_SENDFILE = os.environ.get("QUESTION_PAPER_SENDFILE", "")
+QUESTION_PAPER_SENDFILE_URL = "/protected/"
+QUESTION_PAPER_CACHE_SECONDS = 3600
+QUESTION_PAPER_COUNTER_FLUSH_EVERY = 50
+QUESTION_PAPER_COUNTER_FLUSH_INTERVAL = 30
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -265,6 +481,12 @@ USE_TZ = True
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 AUTH_USER_MODEL = 'main_app.CustomUser'
 AUTHENTICATION_BACKENDS = ['main_app.EmailBackend.EmailBackend']
+# Failed logins allowed per (attempts, window in seconds) before that email or IP must wait
+LOGIN_FAILURE_LIMITS = {
+    'email': (5, 300),
+    'ip': (50, 300),
+}
+AUTH_USER_CACHE_SECONDS = 60  # get_user cache; saving the user drops it sooner
 TIME_ZONE = 'Africa/Johannesburg'
 
 STUDENT_ID_PREFIX = config("STUDENT_ID_PREFIX", default="ugr")
@@ -272,7 +494,8 @@ EDUCATOR_ID_PREFIX = config("EDUCATOR_ID_PREFIX", default="lec")
 
 STATIC_URL = 'static/'
 #django databse settings
-django_heroku.settings(locals())
+# DATABASES is configured above; letting django_heroku rebuild it would drop the pool settings
+django_heroku.settings(locals(), databases=False)
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 #MEDIA_URL = '/mediafiles/'
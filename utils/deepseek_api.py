@@ -1,35 +0,0 @@
-import os
-import requests
-from dotenv import load_dotenv
-from django.conf import settings
-
-load_dotenv()
-
-DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY', '')
-DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"  # Check current API URL
-
-def get_deepseek_response(prompt, model="deepseek-chat", max_tokens=2048):
-    """
-    Get response from DeepSeek Chat API
-    """
-    headers = {
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": max_tokens,
-        "temperature": 0.7
-    }
-    
-    try:
-        response = requests.post(DEEPSEEK_API_URL, json=payload, headers=headers)
-        response.raise_for_status()
-        return response.json()['choices'][0]['message']['content']
-    except requests.exceptions.RequestException as e:
-        print(f"API Error: {e}")
-        return "Sorry, I'm currently unable to process your request."
\ No newline at end of file
@@ -1,42 +1,13 @@
-import json
-import requests
-from django.conf import settings
-from django.utils import timezone
-from questpaper.models import *
-from main_app.models import *
+"""Prompts for the DeepSeek assistant; the calls themselves go through main_app.ai_stream."""
+from main_app.ai_gateway import context_snippet
 
-def get_deepseek_response(prompt, model="deepseek-chat", max_tokens=2048):
-    """
-    Get response from DeepSeek Chat API
-    """
-    headers = {
-        "Authorization": f"Bearer {settings.DEEPSEEK_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": max_tokens,
-        "temperature": 0.7
-    }
-    
-    try:
-        response = requests.post(settings.DEEPSEEK_API_URL, json=payload, headers=headers)
-        response.raise_for_status()
-        return response.json()['choices'][0]['message']['content']
-    except requests.exceptions.RequestException as e:
-        print(f"DeepSeek API Error: {e}")
-        return "I'm currently unable to process your request. Please try again later."
 
 def get_education_context(question_type, question, request=None):
     """Generate context-aware prompts for educational queries"""
     
-    base_context = f"""
+    # No per-user details here, so answers can be shared through the gateway cache
+    base_context = """
     You are DeepSeek-Edu, the AI assistant for thecms.co.za's Circuit Management System.
-    Current user: {request.user.username if request.user.is_authenticated else 'Guest'}
     """
     
     if question_type == 'career':
@@ -54,13 +25,12 @@ def get_education_context(question_type, question, request=None):
         """
     
     elif question_type == 'prospector':
-        colleges = CollegeAndUniversities.objects.using('cms_db').values_list('name', flat=True)
         return f"""
         {base_context}
         As an undergraduate prospector advisor, provide information on:
         - Admission requirements
         - Application deadlines
-        - Available programs at: {', '.join(colleges)[:500]}
+        - Available programs at: {context_snippet('prospector')}
         - NSFAS and funding options
         - Campus life preparation
         
@@ -68,10 +38,9 @@ def get_education_context(question_type, question, request=None):
         """
     
     elif question_type == 'bursary':
-        active_bursaries = Bursary.objects.using('cms_db').filter(deadline__gte=timezone.now())
         return f"""
         {base_context}
-        Current active bursaries: {', '.join(b.name for b in active_bursaries)[:300]}
+        Current active bursaries: {context_snippet('bursary')}
         
         Provide information about:
         - Bursary eligibility
@@ -109,4 +78,4 @@ def get_education_context(question_type, question, request=None):
         - Reporting features in ElimCircuit
         
         Question: {question}
-        """
\ No newline at end of file
+        """